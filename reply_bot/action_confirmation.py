@@ -0,0 +1,209 @@
+"""
+「いいね」と返信の完了確認
+投稿後の固定sleepの代わりに、ページ内の fetch / XMLHttpRequest をフックして
+CreateTweet / FavoriteTweet のレスポンスを待ち、届かない場合は画面の変化（返信欄が空になる・
+「いいね」ボタンが unlike に切り替わる）で判定する。返信は新しいツイートのIDを返す。
+確認できないまま時間切れになった場合はスクリーンショットを保存する。
+"""
+
+import logging
+import os
+import time
+from datetime import datetime
+
+from selenium import webdriver
+from selenium.webdriver.remote.webelement import WebElement
+
+from .config import TARGET_USER, ACTION_CONFIRM_TIMEOUT_SECONDS, ACTION_FAILURE_SCREENSHOT_DIR
+
+_POLL_SECONDS = 0.1
+
+# GraphQLのレスポンスを window.__replyBotActions に記録するフック（何度実行しても1回だけ組み込まれる）
+_HOOK_SCRIPT = """
+if (!window.__replyBotHooked) {
+    window.__replyBotHooked = true;
+    window.__replyBotActions = [];
+    const pattern = /\\/graphql\\/[^/]+\\/(CreateTweet|FavoriteTweet)(?:[/?]|$)/;
+    const record = (url, status, body) => {
+        const match = pattern.exec(url || '');
+        if (!match) return;
+        const entry = {op: match[1], status: status, ok: false, tweetId: null, error: null};
+        try {
+            const json = JSON.parse(body);
+            if (json.errors && json.errors.length) {
+                entry.error = json.errors.map((e) => e.message).join('; ');
+            } else if (match[1] === 'CreateTweet') {
+                const result = json.data.create_tweet.tweet_results.result;
+                entry.tweetId = result.rest_id || (result.tweet && result.tweet.rest_id) || null;
+                entry.ok = !!entry.tweetId;
+            } else {
+                entry.ok = json.data.favorite_tweet === 'Done';
+            }
+        } catch (e) {
+            entry.error = entry.error || ('unparsable response: ' + status);
+        }
+        window.__replyBotActions.push(entry);
+    };
+    const originalFetch = window.fetch;
+    window.fetch = function (input, init) {
+        const url = typeof input === 'string' ? input : (input && input.url);
+        return originalFetch.apply(this, arguments).then((response) => {
+            if (pattern.test(url || '')) {
+                response.clone().text().then((body) => record(url, response.status, body)).catch(() => {});
+            }
+            return response;
+        });
+    };
+    const originalOpen = XMLHttpRequest.prototype.open;
+    XMLHttpRequest.prototype.open = function (method, url) {
+        this.__replyBotUrl = String(url);
+        return originalOpen.apply(this, arguments);
+    };
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        if (pattern.test(this.__replyBotUrl || '')) {
+            this.addEventListener('loadend', () => {
+                let body = '';
+                try { body = this.responseType === 'json' ? JSON.stringify(this.response) : this.responseText; } catch (e) {}
+                record(this.__replyBotUrl, this.status, body);
+            });
+        }
+        return originalSend.apply(this, arguments);
+    };
+}
+window.__replyBotActions = [];
+"""
+
+_TAKE_ACTIONS_SCRIPT = """
+const actions = (window.__replyBotActions || []).filter((entry) => entry.op === arguments[0]);
+window.__replyBotActions = (window.__replyBotActions || []).filter((entry) => entry.op !== arguments[0]);
+return actions;
+"""
+
+# 返信欄が空になった（またはDOMから外れた）か、エラーのトーストが出ていないかを確認する
+_COMPOSER_STATE_SCRIPT = """
+const composer = arguments[0];
+const toast = document.querySelector('[data-testid="toast"]');
+const cleared = !composer || !composer.isConnected || !composer.innerText.trim();
+return {cleared: cleared, toast: toast ? toast.innerText : null};
+"""
+
+# 対象ツイートより後に表示されている TARGET_USER のツイートの中で最も新しいIDを返す
+_NEW_REPLY_ID_SCRIPT = """
+const tweetId = BigInt(arguments[0]);
+const pattern = new RegExp('^/' + arguments[1] + '/status/(\\\\d+)(?:[/?#]|$)', 'i');
+let newest = null;
+for (const link of document.querySelectorAll('article[data-testid="tweet"] a[href*="/status/"]')) {
+    const match = pattern.exec(link.getAttribute('href'));
+    if (match && BigInt(match[1]) > tweetId && (newest === null || BigInt(match[1]) > BigInt(newest))) {
+        newest = match[1];
+    }
+}
+return newest;
+"""
+
+
+def _result(confirmed: bool, source: str, tweet_id: str | None = None, error: str | None = None) -> dict:
+    """確認結果（source は 'network' / 'dom' / 'timeout' / 'error'）"""
+    return {"confirmed": confirmed, "source": source, "tweet_id": tweet_id, "error": error}
+
+def describe(confirmation: dict) -> str:
+    """行動ジャーナルに記録する確認結果の文字列"""
+    detail = confirmation["tweet_id"] if confirmation["confirmed"] else confirmation["error"]
+    return f"{confirmation['source']}:{detail}" if detail else confirmation["source"]
+
+
+def arm(driver: webdriver.Chrome):
+    """アクションの直前に呼び、ページにフックを組み込んで過去の記録を消去します。"""
+    try:
+        driver.execute_script(_HOOK_SCRIPT)
+    except Exception as e:
+        logging.debug(f"ネットワークフックを組み込めませんでした（画面の変化で確認します）: {e}")
+
+def _take_actions(driver: webdriver.Chrome, op: str) -> list:
+    try:
+        return driver.execute_script(_TAKE_ACTIONS_SCRIPT, op) or []
+    except Exception:
+        return []
+
+def save_failure_screenshot(driver: webdriver.Chrome, tweet_id, kind: str = "post") -> str | None:
+    """確認に失敗したときの画面を {kind}_failure_{日時}_{tweet_id}.png として保存します。"""
+    try:
+        os.makedirs(ACTION_FAILURE_SCREENSHOT_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(ACTION_FAILURE_SCREENSHOT_DIR, f"{kind}_failure_{timestamp}_{tweet_id}.png")
+        driver.save_screenshot(path)
+        logging.info(f"現在の画面のスクリーンショットを {path} に保存しました。")
+        return path
+    except Exception as e:
+        logging.warning(f"スクリーンショットの保存中にエラー: {e}")
+        return None
+
+def wait_for_reply_posted(driver: webdriver.Chrome, tweet_id, composer: WebElement | None = None,
+                          timeout: float = ACTION_CONFIRM_TIMEOUT_SECONDS) -> dict:
+    """
+    返信の投稿を確認します。CreateTweet のレスポンスが届けばその新しいツイートIDを、
+    届かない場合は返信欄が空になったことで成功とみなし、ページ上から新しい返信のIDを探します。
+    返信欄の状態を確認できない場合は、ページ上に新しい返信が見つからない限り時間切れ（'timeout'）になります。
+    """
+    deadline = time.monotonic() + timeout
+    cleared_at = None
+    while True:
+        for action in _take_actions(driver, "CreateTweet"):
+            if action.get("ok"):
+                return _result(True, "network", tweet_id=str(action["tweetId"]))
+            return _fail(driver, tweet_id, "post", _result(False, "error", error=action.get("error") or f"HTTP {action.get('status')}"))
+
+        try:
+            state = driver.execute_script(_COMPOSER_STATE_SCRIPT, composer)
+        except Exception as e:
+            # 返信欄の状態が分からない場合は成功とみなさず、画面上に新しい返信が見つかったときだけ成功とする
+            # （見つからなければ時間切れとなり、intent のまま次回の実行開始時に確認される）
+            logging.debug(f"返信欄の状態を確認できませんでした: {e}")
+            new_id = _find_new_reply_id(driver, tweet_id)
+            if new_id:
+                return _result(True, "dom", tweet_id=new_id)
+            state = {"cleared": False, "toast": None}
+        if state.get("toast") and not state.get("cleared"):
+            return _fail(driver, tweet_id, "post", _result(False, "error", error=state["toast"]))
+        if state.get("cleared"):
+            # レスポンスの記録を少しだけ待ってから、画面上の新しい返信を探す
+            cleared_at = cleared_at or time.monotonic()
+            new_id = _find_new_reply_id(driver, tweet_id)
+            if new_id or time.monotonic() - cleared_at >= 1.0:
+                return _result(True, "dom", tweet_id=new_id)
+
+        if time.monotonic() >= deadline:
+            return _fail(driver, tweet_id, "post", _result(False, "timeout"))
+        time.sleep(_POLL_SECONDS)
+
+def wait_for_like(driver: webdriver.Chrome, tweet_id, is_liked, timeout: float = ACTION_CONFIRM_TIMEOUT_SECONDS) -> dict:
+    """
+    「いいね」を確認します。FavoriteTweet のレスポンス、またはボタンの unlike への切り替わり
+    （is_liked() がTrueを返す）のどちらか早い方で成功とみなします。
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        for action in _take_actions(driver, "FavoriteTweet"):
+            if action.get("ok"):
+                return _result(True, "network")
+            return _fail(driver, tweet_id, "like", _result(False, "error", error=action.get("error") or f"HTTP {action.get('status')}"))
+        try:
+            if is_liked():
+                return _result(True, "dom")
+        except Exception:
+            pass
+        if time.monotonic() >= deadline:
+            return _fail(driver, tweet_id, "like", _result(False, "timeout"))
+        time.sleep(_POLL_SECONDS)
+
+def _find_new_reply_id(driver: webdriver.Chrome, tweet_id) -> str | None:
+    try:
+        return driver.execute_script(_NEW_REPLY_ID_SCRIPT, str(tweet_id), TARGET_USER)
+    except Exception:
+        return None
+
+def _fail(driver: webdriver.Chrome, tweet_id, kind: str, confirmation: dict) -> dict:
+    logging.warning(f"tweet_id: {tweet_id} の{'返信' if kind == 'post' else '「いいね」'}を確認できませんでした ({describe(confirmation)})。")
+    save_failure_screenshot(driver, tweet_id, kind)
+    return confirmation
@@ -0,0 +1,106 @@
+"""
+「いいね」と返信の行動ジャーナル（先行書き込みログ）
+アクションの直前に intent を、完了を確認した時点で done（失敗時は failed）をSQLiteに1件ずつ記録し、
+再実行時には完了済みのアクションをページを開かずにスキップする。
+intent のまま終わった（途中でクラッシュした）アクションは、ページ上の状態を確認して解決する。
+"""
+
+import json
+import logging
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from .db import (
+    add_journal_entry, update_journal_entry, get_journal_done, get_journal_pending,
+    get_journal_unreconciled_replies, mark_replied
+)
+
+ACTION_LIKE = "like"
+ACTION_REPLY = "reply"
+
+def record_intent(tweet_id, action: str, **payload) -> int | None:
+    """アクションを実行する直前に記録します。記録に失敗した場合はNoneを返します。"""
+    try:
+        return add_journal_entry(str(tweet_id), action, "intent", json.dumps(payload, ensure_ascii=False))
+    except Exception as e:
+        logging.warning(f"行動ジャーナルへの記録中にエラー (tweet_id: {tweet_id}, {action}): {e}")
+        return None
+
+def record_result(entry_id: int | None, done: bool, result: str = ""):
+    """アクションの結果（done / failed）を記録します。"""
+    if entry_id is None:
+        return
+    try:
+        update_journal_entry(entry_id, "done" if done else "failed", result)
+    except Exception as e:
+        logging.warning(f"行動ジャーナルの更新中にエラー (id: {entry_id}): {e}")
+
+def record_done(tweet_id, action: str, result: str = "", **payload):
+    """既に完了していたことが分かったアクションを、done として直接記録します。"""
+    record_result(record_intent(tweet_id, action, **payload), True, result)
+
+def completed_actions(tweet_ids) -> set:
+    """完了済みの (tweet_id, action) の組を返します。"""
+    try:
+        return get_journal_done([str(tweet_id) for tweet_id in tweet_ids])
+    except Exception as e:
+        logging.warning(f"行動ジャーナルの読み込み中にエラー: {e}")
+        return set()
+
+def _mark_replied_from_payload(tweet_id: str, payload: str):
+    data = json.loads(payload or "{}")
+    mark_replied(tweet_id, data.get("user_id", ""), data.get("text", ""), bool(data.get("is_my_thread", False)))
+
+def reconcile_replied() -> int:
+    """完了済みの返信を replied テーブルに反映し、反映した件数を返します。"""
+    count = 0
+    try:
+        for tweet_id, payload in get_journal_unreconciled_replies():
+            _mark_replied_from_payload(tweet_id, payload)
+            count += 1
+    except Exception as e:
+        logging.warning(f"返信済み記録の突き合わせ中にエラー: {e}")
+    if count:
+        logging.info(f"行動ジャーナルから {count} 件の返信を返信済みとして記録しました。")
+    return count
+
+def resolve_pending(driver: webdriver.Chrome) -> dict:
+    """
+    intent のまま残っているアクションを、ツイートページの状態を見て done / failed に解決します。
+    返信は対象ツイートの後に TARGET_USER の返信があれば完了、「いいね」はボタンが unlike なら完了とみなします。
+    ページを開くのはこの未解決のアクションだけです。
+    """
+    from .thread_probe import probe_thread
+    from .timeline_like import like_state
+
+    counts = {"done": 0, "failed": 0}
+    try:
+        pending = get_journal_pending()
+    except Exception as e:
+        logging.warning(f"行動ジャーナルの読み込み中にエラー: {e}")
+        return counts
+    if not pending:
+        return counts
+    logging.warning(f"前回の実行で完了を確認できなかったアクションが {len(pending)} 件あります。ページの状態を確認します。")
+
+    for entry_id, tweet_id, action, payload in pending:
+        try:
+            driver.get(f"https://x.com/any/status/{tweet_id}")
+            WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.CSS_SELECTOR, '[data-testid="tweetText"]')))
+            if action == ACTION_REPLY:
+                probe = probe_thread(driver, tweet_id)
+                done = bool(probe and probe["replied_by_target_user"])
+                if done:
+                    _mark_replied_from_payload(tweet_id, payload)
+            else:
+                done = like_state(driver, tweet_id) == "liked"
+        except Exception as e:
+            logging.warning(f"未解決のアクションの確認中にエラー (tweet_id: {tweet_id}, {action}): {e}")
+            done = False
+        record_result(entry_id, done, "resolved_on_resume")
+        counts["done" if done else "failed"] += 1
+        logging.info(f"  -> tweet_id: {tweet_id} の {action} は {'完了していました' if done else '未完了のため再実行対象です'}。")
+    return counts
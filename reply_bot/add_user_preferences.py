@@ -1,4 +1,4 @@
-from reply_bot.db import init_db, add_user_preference
+from reply_bot.db import init_db, add_user_preferences_many
 
 def add_preferences_to_db():
     init_db() # データベースが初期化されていることを確認
@@ -50,8 +50,9 @@ def add_preferences_to_db():
         ("zero_divide_00", "ゆみちゃん", "ja", ""),
     ]
 
+    # 1つのトランザクションでまとめて登録する（CSV/JSONからの登録は python -m reply_bot.preference_store --import）
+    add_user_preferences_many(preferences)
     for user_id, nickname, language, basic_response in preferences:
-        add_user_preference(user_id, nickname, language, basic_response)
         print(f"Added/Updated: @{user_id}, {nickname}, {language}")
 
     print("All user preferences have been added/updated.")
@@ -5,6 +5,7 @@ Twitter Profile Authentication using shared_modules
 
 import sys
 import os
+import shutil
 from pathlib import Path
 from typing import Optional
 import logging
@@ -127,6 +128,41 @@ class TwitterProfileAuth:
             finally:
                 self._current_driver = None
     
+    def get_secondary_driver(self, profile_name: str = "twitter_main", headless: bool = True):
+        """
+        メインのDriverと並行して使う2つ目のDriverを起動
+        メインのプロファイルは起動中のChromeがロックしているため、Cookie等の必要最小限を
+        一時プロファイルに複製して起動する（ログイン状態は引き継がれる）
+        
+        Returns:
+            (WebDriverインスタンス, 複製したプロファイルのパス)
+        """
+        profile_path = self.profile_manager._create_unique_temp_profile(profile_name)
+        chrome_options = {
+            'headless': headless,
+            'no_sandbox': True,
+            'disable_dev_shm_usage': True,
+            'disable_gpu': headless,
+            'window_size': '1920,1080'
+        }
+        try:
+            driver = self.profile_manager.launch_with_profile(profile_path, **chrome_options)
+        except Exception:
+            shutil.rmtree(profile_path, ignore_errors=True)
+            raise
+        self.logger.info(f"2つ目のDriverを複製プロファイル {profile_path} で起動しました")
+        return driver, profile_path
+    
+    def close_secondary_driver(self, driver, profile_path: Optional[str] = None):
+        """get_secondary_driver で起動したDriverを終了し、複製したプロファイルを削除"""
+        try:
+            if driver:
+                driver.quit()
+        except Exception as e:
+            self.logger.warning(f"2つ目のWebDriver終了時に警告: {e}")
+        if profile_path:
+            shutil.rmtree(profile_path, ignore_errors=True)
+    
     def setup_initial_profile(self, profile_name: str = "twitter_main") -> bool:
         """
         初回Profile設定（手動ログイン用）
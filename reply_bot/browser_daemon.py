@@ -0,0 +1,315 @@
+"""
+定期実行で使い回す常駐ブラウザ
+認証済みプロファイルのChromeをリモートデバッグのポート付きで起動したまま常駐させ、各実行の
+utils.setup_driver は起動の代わりにそのChromeへ接続する（ChromeDriverを1つ起動するだけで済む）。
+常駐プロセスは定期的に応答を確認し、応答しない場合は再起動、メモリ使用量や起動からの時間が
+上限を超えた場合は、実行中の接続（リース）が無いときに再起動する。
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+import psutil
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.chrome.service import Service
+
+from .config import (
+    PROFILES_DIR, TWITTER_PROFILE_NAME, BROWSER_DAEMON_PORT, BROWSER_DAEMON_HEADLESS, BROWSER_DAEMON_CHECK_SECONDS,
+    BROWSER_DAEMON_MAX_MEMORY_MB, BROWSER_DAEMON_MAX_AGE_HOURS
+)
+
+STATE_FILE = Path(PROFILES_DIR) / "browser_daemon.json"
+LEASE_FILE = Path(PROFILES_DIR) / "browser_daemon.lease"
+STOP_FILE = Path(PROFILES_DIR) / "browser_daemon.stop"
+
+# fixed_chrome（ProfiledChromeManager と同じ配置）
+_FIXED_CHROME = Path("fixed_chrome") / "chrome" / "chrome-win64" / "chrome.exe"
+_FIXED_CHROMEDRIVER = Path("fixed_chrome") / "chromedriver" / "chromedriver-win64" / "chromedriver.exe"
+_CHROME_NAMES = ("chrome", "google-chrome", "google-chrome-stable", "chromium", "chromium-browser")
+
+_START_TIMEOUT_SECONDS = 30
+
+
+def _chrome_binary() -> str:
+    """起動するChromeの実行ファイル（fixed_chrome を優先）"""
+    if _FIXED_CHROME.exists():
+        return str(_FIXED_CHROME)
+    for name in _CHROME_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    if platform.system() == 'Windows':
+        for base in (os.environ.get("PROGRAMFILES", ""), os.environ.get("PROGRAMFILES(X86)", ""), os.environ.get("LOCALAPPDATA", "")):
+            path = Path(base) / "Google" / "Chrome" / "Application" / "chrome.exe"
+            if base and path.exists():
+                return str(path)
+    raise FileNotFoundError("Chromeの実行ファイルが見つかりません")
+
+def _profile_path() -> str:
+    return os.path.abspath(os.path.join(PROFILES_DIR, TWITTER_PROFILE_NAME))
+
+def _read_json(path: Path) -> dict | None:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _pid_alive(pid) -> bool:
+    try:
+        return bool(pid) and psutil.pid_exists(int(pid))
+    except (TypeError, ValueError):
+        return False
+
+def is_healthy(port: int = BROWSER_DAEMON_PORT, timeout: float = 1.0) -> bool:
+    """リモートデバッグのエンドポイントが応答するかを確認します。"""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/json/version", timeout=timeout) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+def chrome_memory_mb(pid: int) -> float:
+    """Chromeのプロセスツリー全体のメモリ使用量（MB）"""
+    try:
+        process = psutil.Process(pid)
+        processes = [process] + process.children(recursive=True)
+    except psutil.Error:
+        return 0.0
+    total = 0
+    for child in processes:
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / 1024 / 1024
+
+
+# --- 実行側: 常駐ブラウザへの接続とリース ---
+
+def get_state() -> dict | None:
+    """常駐プロセスが動いていて、Chromeが応答する場合はその状態を返します。"""
+    state = _read_json(STATE_FILE)
+    if not state or not _pid_alive(state.get("daemon_pid")) or not is_healthy(state.get("port", BROWSER_DAEMON_PORT)):
+        return None
+    return state
+
+def acquire_lease():
+    """実行中であることを常駐プロセスに知らせます（この間はメモリ・経過時間による再起動を行いません）。"""
+    _write_json(LEASE_FILE, {"pid": os.getpid(), "since": datetime.now().isoformat()})
+
+def release_lease():
+    lease = _read_json(LEASE_FILE)
+    if lease and lease.get("pid") == os.getpid():
+        try:
+            LEASE_FILE.unlink()
+        except OSError:
+            pass
+
+def lease_active() -> bool:
+    lease = _read_json(LEASE_FILE)
+    return bool(lease) and _pid_alive(lease.get("pid"))
+
+def attach_driver() -> webdriver.Chrome | None:
+    """
+    常駐ブラウザにWebDriverを接続します。常駐ブラウザが無い場合はNoneを返します。
+    接続したWebDriverは detach_driver で切り離してください（quit するとブラウザの状態が失われます）。
+    """
+    state = get_state()
+    if not state:
+        return None
+    started = time.perf_counter()
+    options = ChromeOptions()
+    options.add_experimental_option("debuggerAddress", f"127.0.0.1:{state['port']}")
+    service = Service(str(_FIXED_CHROMEDRIVER)) if _FIXED_CHROMEDRIVER.exists() else Service()
+    # 接続中に再起動されないよう、接続前に利用中の印を付ける
+    acquire_lease()
+    try:
+        driver = webdriver.Chrome(service=service, options=options)
+    except Exception:
+        release_lease()
+        raise
+    logging.info(f"常駐ブラウザ (port {state['port']}) に接続しました ({time.perf_counter() - started:.2f} 秒)。")
+    return driver
+
+def detach_driver(driver: webdriver.Chrome):
+    """ChromeDriverだけを終了し、常駐ブラウザは残します。"""
+    try:
+        driver.service.stop()
+    except Exception as e:
+        logging.warning(f"常駐ブラウザからの切り離し中にエラー: {e}")
+    finally:
+        release_lease()
+
+
+# --- 常駐プロセス ---
+
+class BrowserDaemon:
+    """認証済みChromeを常駐させ、応答確認と再起動を行う"""
+
+    def __init__(self, port: int = BROWSER_DAEMON_PORT, headless: bool = BROWSER_DAEMON_HEADLESS):
+        self.port = port
+        self.headless = headless
+        self.process: subprocess.Popen | None = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self._stopping = False
+
+    def _kill_profile_chrome(self):
+        """同じプロファイルを使っている残りのChromeを終了し、ロックファイルを削除します。"""
+        from .utils import _get_auth_manager
+        manager = _get_auth_manager().profile_manager
+        manager._kill_existing_chrome_processes(_profile_path())
+        manager._cleanup_profile_locks(_profile_path())
+
+    def start(self):
+        self._kill_profile_chrome()
+        args = [
+            _chrome_binary(),
+            f"--remote-debugging-port={self.port}",
+            f"--user-data-dir={_profile_path()}",
+            "--profile-directory=Default",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--disable-blink-features=AutomationControlled",
+            "--disable-background-timer-throttling",
+            "--disable-renderer-backgrounding",
+            "--disable-backgrounding-occluded-windows",
+            "--window-size=1920,1080",
+        ]
+        if self.headless:
+            args += ["--headless=new", "--disable-gpu"]
+        self.process = subprocess.Popen(args + ["about:blank"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + _START_TIMEOUT_SECONDS
+        while not is_healthy(self.port):
+            if self.process.poll() is not None or time.monotonic() >= deadline:
+                raise RuntimeError(f"常駐ブラウザを起動できませんでした (exitcode={self.process.poll()})")
+            time.sleep(0.2)
+        self.started_at = time.monotonic()
+        _write_json(STATE_FILE, {
+            "daemon_pid": os.getpid(), "chrome_pid": self.process.pid, "port": self.port,
+            "headless": self.headless, "started_at": datetime.now().isoformat(),
+        })
+        logging.info(f"常駐ブラウザを起動しました (pid {self.process.pid}, port {self.port})。")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            try:
+                for child in psutil.Process(self.process.pid).children(recursive=True):
+                    child.terminate()
+            except psutil.Error:
+                pass
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def restart(self, reason: str):
+        logging.info(f"常駐ブラウザを再起動します（{reason}）。")
+        self.stop()
+        self.start()
+        self.restarts += 1
+
+    def check(self):
+        """応答確認と、メモリ・経過時間による再起動を1回行います。"""
+        if self.process is None or self.process.poll() is not None or not is_healthy(self.port):
+            self.restart("応答なし")
+            return
+        if lease_active():
+            return
+        memory_mb = chrome_memory_mb(self.process.pid)
+        age_hours = (time.monotonic() - self.started_at) / 3600
+        if memory_mb > BROWSER_DAEMON_MAX_MEMORY_MB:
+            self.restart(f"メモリ使用量 {memory_mb:.0f} MB")
+        elif age_hours > BROWSER_DAEMON_MAX_AGE_HOURS:
+            self.restart(f"起動から {age_hours:.1f} 時間")
+
+    def _wait(self, seconds: float):
+        """seconds 秒待ちます。終了の指示（STOP_FILE・SIGTERM）があれば途中で戻ります。"""
+        deadline = time.monotonic() + seconds
+        while not self._stopping and time.monotonic() < deadline:
+            if STOP_FILE.exists():
+                STOP_FILE.unlink(missing_ok=True)
+                self._stopping = True
+                break
+            time.sleep(1)
+
+    def serve(self):
+        """Ctrl+C・SIGTERM・stop_daemon() まで常駐します。"""
+        signal.signal(signal.SIGTERM, lambda *args: setattr(self, "_stopping", True))
+        STOP_FILE.unlink(missing_ok=True)
+        self.start()
+        try:
+            while not self._stopping:
+                self._wait(BROWSER_DAEMON_CHECK_SECONDS)
+                if self._stopping:
+                    break
+                try:
+                    self.check()
+                except Exception as e:
+                    logging.error(f"常駐ブラウザの確認中にエラー: {e}", exc_info=True)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            state = _read_json(STATE_FILE)
+            if state and state.get("daemon_pid") == os.getpid():
+                STATE_FILE.unlink(missing_ok=True)
+            logging.info("常駐ブラウザを終了しました。")
+
+def stop_daemon(timeout: float = 30) -> bool:
+    """動いている常駐プロセスに終了を伝え、終了するまで待ちます。"""
+    state = _read_json(STATE_FILE)
+    if not state or not _pid_alive(state.get("daemon_pid")):
+        return False
+    STOP_FILE.parent.mkdir(parents=True, exist_ok=True)
+    STOP_FILE.touch()
+    deadline = time.monotonic() + timeout
+    while _pid_alive(state["daemon_pid"]) and time.monotonic() < deadline:
+        time.sleep(0.5)
+    return True
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="定期実行で使い回す常駐ブラウザ")
+    parser.add_argument("--serve", action='store_true', help="常駐ブラウザを起動して常駐します")
+    parser.add_argument("--stop", action='store_true', help="常駐プロセスを終了します")
+    parser.add_argument("--headless", action=argparse.BooleanOptionalAction, default=BROWSER_DAEMON_HEADLESS, help="ヘッドレスモードで起動します")
+    parser.add_argument("--port", type=int, default=BROWSER_DAEMON_PORT, help="リモートデバッグのポート")
+    args = parser.parse_args()
+
+    if args.serve:
+        if get_state():
+            sys.exit("常駐ブラウザは既に起動しています。")
+        BrowserDaemon(args.port, args.headless).serve()
+    elif args.stop:
+        print("終了を伝えました。" if stop_daemon() else "常駐プロセスは起動していません。")
+    else:
+        state = get_state()
+        if state:
+            memory = chrome_memory_mb(state["chrome_pid"])
+            print(f"起動中: pid {state['daemon_pid']} / Chrome pid {state['chrome_pid']}, port {state['port']}, "
+                  f"起動 {state['started_at'][:19]}, メモリ {memory:.0f} MB, 実行中: {'あり' if lease_active() else 'なし'}")
+        else:
+            print("常駐ブラウザは起動していません。")
@@ -106,3 +106,197 @@ LEGACY_COOKIE_SUPPORT = False            # Cookie認証のサポート（将来
 # プロファイル設定
 PROFILES_DIR = "./profiles"  # Chromeプロファイル保存ディレクトリ
 TWITTER_PROFILE_NAME = "twitter_main"  # 使用するTwitterプロファイル名
+
+# 返信生成キャッシュ設定
+REPLY_CACHE_ENABLED = True       # 生成済み返信の再利用を有効にするか (True/False)
+REPLY_CACHE_TTL_HOURS = 72       # キャッシュの有効期間（時間）
+REPLY_CACHE_MIN_VARIANTS = 2     # 再利用に必要な候補数（同じ返信ばかりにならないための下限）
+REPLY_CACHE_MAX_VARIANTS = 5     # 1つのキーに保存する返信候補の最大数
+
+# 定型返信（インテント判定）設定
+INTENT_MAX_RESIDUAL_CHARS = 12   # 定型表現以外の文字がこの数以下なら定型返信とみなす
+INTENT_MARKER_MAX_RESIDUAL_CHARS = 1  # 「笑」「w」「草」だけが一致した場合に許す、それ以外の文字数（文末の笑い記号付きの本文はAIで返信する）
+INTENT_REPLY_PHRASES = {
+    "morning": {
+        "ja": ["おはよう❤️", "おはよう🩷"],
+        "en": ["Good morning🩷", "Morning❤️"],
+        "es": ["Buenos días🩷", "¡Buen día!❤️"],
+        "in": ["Selamat pagi🩷", "Pagi❤️"],
+        "pt": ["Bom dia🩷", "Bom dia!❤️"],
+        "tr": ["Günaydın🩷", "Günaydın!❤️"],
+        "fr": ["Bonjour🩷", "Bonjour!❤️"],
+        "de": ["Guten Morgen🩷", "Morgen!❤️"],
+        "zh": ["早上好🩷", "早安❤️"],
+        "ko": ["좋은 아침🩷", "좋은 아침이에요❤️"],
+    },
+    "hello": {
+        "ja": ["こんにちは❤️", "こんにちは🩷"],
+        "en": ["Hi🩷", "Hello❤️"],
+        "es": ["Hola🩷", "¡Hola!❤️"],
+        "in": ["Halo🩷", "Hai❤️"],
+        "pt": ["Olá🩷", "Oi!❤️"],
+        "tr": ["Merhaba🩷", "Selam❤️"],
+        "fr": ["Salut🩷", "Coucou❤️"],
+        "de": ["Hallo🩷", "Hi!❤️"],
+        "zh": ["你好🩷", "嗨❤️"],
+        "ko": ["안녕하세요🩷", "안녕❤️"],
+    },
+    "evening": {
+        "ja": ["こんばんは❤️", "こんばんは🩷"],
+        "en": ["Good evening🩷", "Evening❤️"],
+        "es": ["Buenas tardes🩷", "¡Buenas!❤️"],
+        "in": ["Selamat malam🩷", "Malam❤️"],
+        "pt": ["Boa tarde🩷", "Boa noite❤️"],
+        "tr": ["İyi akşamlar🩷", "İyi akşamlar!❤️"],
+        "fr": ["Bonsoir🩷", "Bonsoir!❤️"],
+        "de": ["Guten Abend🩷", "Abend!❤️"],
+        "zh": ["晚上好🩷", "晚上好!❤️"],
+        "ko": ["좋은 저녁🩷", "좋은 저녁이에요❤️"],
+    },
+    "good_night": {
+        "ja": ["おやすみ🩷", "おやすみなさい🩷", "いい夢見てね🩷"],
+        "en": ["Good night🩷", "Sweet dreams❤️"],
+        "es": ["Buenas noches🩷", "Dulces sueños❤️"],
+        "in": ["Selamat tidur🩷", "Mimpi indah❤️"],
+        "pt": ["Boa noite🩷", "Bons sonhos❤️"],
+        "tr": ["İyi geceler🩷", "Tatlı rüyalar❤️"],
+        "fr": ["Bonne nuit🩷", "Fais de beaux rêves❤️"],
+        "de": ["Gute Nacht🩷", "Schlaf gut❤️"],
+        "zh": ["晚安🩷", "好梦❤️"],
+        "ko": ["잘 자요🩷", "좋은 꿈 꿔요❤️"],
+    },
+    "thanks": {
+        "ja": ["どういたしまして🩷", "こちらこそありがとう🩷", "えへへ🩷"],
+    },
+    "laughter": {
+        "ja": ["えへへ🩷", "ふふっ🩷", "うふふ🩷"],
+        "en": ["Hehe🩷", "Haha❤️"],
+        "es": ["Jeje🩷", "Jaja❤️"],
+        "in": ["Hehe🩷", "Wkwk❤️"],
+        "pt": ["Hehe🩷", "Kkk❤️"],
+        "tr": ["Hehe🩷", "Haha❤️"],
+        "fr": ["Hihi🩷", "Haha❤️"],
+        "de": ["Hehe🩷", "Haha❤️"],
+        "zh": ["嘻嘻🩷", "哈哈❤️"],
+        "ko": ["헤헤🩷", "ㅎㅎ❤️"],
+    },
+}
+
+# 表現の繰り返し防止（禁止フレーズ）設定
+PHRASE_INDEX_WINDOW_SIZE = 300   # 頻出表現の抽出に使う直近の返信数（実行をまたいでDBに保持）
+PHRASE_INDEX_SEED_WINDOW = 20    # 定番表現（下記）を禁止する判定に使う直近の返信数
+PHRASE_INDEX_MIN_COUNT = 4       # 何件の返信で使われたら頻出表現とみなすか
+PHRASE_INDEX_NGRAM_RANGE = (3, 10)  # 抽出する表現の文字数の範囲
+PHRASE_INDEX_MAX_PHRASES = 15    # 自動抽出した表現のうち禁止対象にする最大数
+PHRASE_INDEX_SEED_PHRASES = ["照れる", "照れちゃう", "嬉しい", "嬉しいな", "ありがとう", "頑張る", "ドキドキ", "すごい", "素敵"]
+PHRASE_INDEX_MAX_REGENERATIONS = 1  # 禁止フレーズが含まれていた場合に、その表現を避けるよう指示して再生成する回数
+
+# 過去の返信との類似チェック（MinHash）設定
+NEAR_DUP_ENABLED = True          # 過去に投稿した返信とほぼ同じ返信を再生成するか (True/False)
+NEAR_DUP_LOOKBACK_DAYS = 30      # 何日前までの投稿済み返信と比較するか
+NEAR_DUP_THRESHOLD = 0.6         # この類似度（推定Jaccard係数）以上を重複とみなす
+NEAR_DUP_NUM_PERM = 64           # MinHash署名の長さ
+NEAR_DUP_BANDS = 16              # LSHのバンド数（NEAR_DUP_NUM_PERMを割り切れる値）
+NEAR_DUP_SHINGLE_SIZE = 3        # 文字シングルの長さ
+NEAR_DUP_MIN_CHARS = 10          # これより短い返信は類似チェックの対象外
+NEAR_DUP_MAX_REGENERATIONS = 1   # 重複と判定された場合の再生成回数
+
+# プロンプトテンプレート設定
+PROMPT_CONTEXT_CACHE_ENABLED = True       # ペルソナ・ルール部分をGeminiのコンテキストキャッシュに載せるか (True/False)
+PROMPT_CONTEXT_CACHE_TTL_MINUTES = 60     # コンテキストキャッシュの有効期間（分）
+PROMPT_CONTEXT_CACHE_MIN_TOKENS = 1024    # これ未満のトークン数ではキャッシュを作成しない（APIの最小サイズ）
+
+# 投稿スケジューラ設定（返信の最小間隔は POST_INTERVAL_SECONDS）
+REPLIES_PER_HOUR = 200               # 1時間あたりの返信数の上限
+REPLY_BURST = 5                      # 連続して返信できる最大数（トークンバケットの容量）
+LIKE_MIN_INTERVAL_SECONDS = 7        # 「いいね」同士の最小間隔（秒）
+LIKES_PER_HOUR = 300                 # 1時間あたりの「いいね」数の上限
+LIKE_BURST = 5                       # 連続して「いいね」できる最大数
+ACTION_MIN_GAP_SECONDS = 7           # 種類を問わず、アクション（いいね・返信）同士の最小間隔（秒）
+SCHEDULER_LOOKAHEAD_SECONDS = 3      # この秒数以内に実行可能なタスクは、ページ移動と待ち時間を重ねて先に処理する
+
+# 返信欄へのテキスト入力設定
+TEXT_INSERTION_BACKEND = "cdp"                # "cdp"（DevToolsのInput.insertText）または "clipboard"（pyperclip + Ctrl+V）
+TEXT_INSERTION_FALLBACK_TO_CLIPBOARD = False  # cdpで入力できなかった場合にクリップボードで再試行するか（OSのクリップボードは共有されるため、
+                                              # 並列・常駐実行やヘッドレスでは使わないこと。デスクトップで1セッションだけ実行する場合のみTrue可）
+TEXT_INSERTION_TIMEOUT_SECONDS = 3            # 入力内容の確認を待つ最大時間（秒）
+
+# タイムライン上での「いいね」設定
+TIMELINE_LIKE_ENABLED = False     # ステップ1のスクロール中に通知タイムライン上で「いいね」するか (True/False)
+                                  # （スレッド解析・返信生成の前に「いいね」するため、ステップ3では「いいね」しない行にも「いいね」が付く）
+TIMELINE_LIKE_VERIFY_SECONDS = 3  # 「いいね」ボタンが unlike に切り替わるのを待つ最大時間（秒）
+
+# アクションの完了確認設定
+ACTION_CONFIRM_TIMEOUT_SECONDS = 8          # CreateTweet / FavoriteTweet のレスポンスや画面の変化を待つ最大時間（秒）
+ACTION_FAILURE_SCREENSHOT_DIR = "log/screenshots"  # 確認できなかった場合のスクリーンショットの保存先
+
+# ステップ1の事前フィルタ設定
+STAGE1_PREFILTER_ENABLED = True   # 返信済み・返信対象外と判定済みのリプライをステップ1でCSVから除外するか (True/False)
+SKIP_LIST_TTL_HOURS = 72          # 返信対象外と判定したリプライを何時間除外し続けるか
+
+# ユーザー設定インデックス設定
+PREFERENCE_REFRESH_SECONDS = 30   # ユーザー設定の変更（PRAGMA data_version）を確認する間隔（秒）。それ以外の参照はメモリのみ
+
+# DBの保持期間・圧縮設定
+RETENTION_ENABLED = True               # パイプラインの実行後に保持期間の処理を行うか (True/False)
+RETENTION_INTERVAL_HOURS = 24          # 保持期間の処理を行う間隔（時間）
+REPLIED_RETENTION_DAYS = 90            # 返信済みツイートを replied に残す日数（過ぎたものは replied_archive に移す）
+ARCHIVE_RETENTION_DAYS = 365           # replied_archive に残す日数
+JOURNAL_RETENTION_DAYS = 14            # 完了・失敗した行動ジャーナルを残す日数（未解決のものは削除しない）
+PREFERENCE_CHANGES_KEEP = 1000         # ユーザー設定の変更履歴を残す件数（古いものを読み終えていないプロセスは全件を読み直す）
+RETENTION_BATCH_SIZE = 1000            # 1トランザクションで移動・削除する最大行数
+INCREMENTAL_VACUUM_PAGES = 2000        # 1回の処理で解放する空きページ数の上限
+
+# ランストア設定（ステージ間のリプライの受け渡し）
+RUN_STORE_EXPORT_CSV = True    # 各ステップの結果を従来のCSV（extracted_tweets_*/processed_replies_*）にも書き出すか (True/False)
+RUN_RETENTION_DAYS = 14        # ランストアの行を残す日数（DBの保持期間の処理で削除）
+
+# ストリーミング設定（ステップ1と2の並行実行）
+STREAMING_ENABLED = False      # ステップ1の収集中に、2つ目のブラウザで新しいリプライから順にスレッド解析・返信生成を始めるか (True/False)
+STREAM_QUEUE_SIZE = 50         # ステップ1からステップ2へ渡すキューの上限（溢れた分は収集後にランストアから処理）
+
+# タブプール設定（スレッド解析）
+THREAD_TAB_POOL_SIZE = 3       # ステップ2のスレッド解析に使うタブ数（ページ読み込みの待ち時間をタブ間で重ねる）。1の場合は1タブで順に処理
+
+# ワーカープール設定（バックログの一括処理）
+WORKER_POOL_SIZE = 3             # --workers を省略した場合のワーカープロセス数（各プロセスがプロファイルを複製してChromeを1つ起動）
+WORKER_POOL_MAX_PROCESSES = 4    # 同時に起動するワーカープロセス数の上限
+WORKER_START_TIMEOUT_SECONDS = 120   # ワーカーのChromeの起動を待つ最大時間（秒）
+WORKER_SHUTDOWN_TIMEOUT_SECONDS = 30 # 終了時にワーカーの終了を待つ最大時間（秒）。過ぎた場合は強制終了して複製したプロファイルを削除
+
+# 常駐ブラウザ設定（python -m reply_bot.browser_daemon --serve）
+BROWSER_DAEMON_ENABLED = True        # 常駐ブラウザが起動している場合、setup_driver はChromeを起動せずに接続するか (True/False)
+BROWSER_DAEMON_PORT = 9333           # 常駐ブラウザのリモートデバッグのポート（127.0.0.1 のみ）
+BROWSER_DAEMON_HEADLESS = True       # 常駐ブラウザをヘッドレスモードで起動するか
+BROWSER_DAEMON_CHECK_SECONDS = 60    # 応答・メモリ使用量を確認する間隔（秒）
+BROWSER_DAEMON_MAX_MEMORY_MB = 1500  # Chrome全体のメモリ使用量がこれを超えたら、実行中でないときに再起動
+BROWSER_DAEMON_MAX_AGE_HOURS = 24    # 起動からこの時間を過ぎたら、実行中でないときに再起動
+
+# 常駐モード設定（python -m reply_bot.main --daemon）
+DAEMON_POLL_MIN_SECONDS = 60         # 新着が続くときのポーリング間隔の下限（秒）
+DAEMON_POLL_MAX_SECONDS = 900        # 新着が無いときのポーリング間隔の上限（秒）
+DAEMON_POLL_BACKOFF = 1.5            # 新着が無かったときに間隔を何倍に延ばすか（新着があれば半分に縮める）
+DAEMON_KNOWN_IDS = 500               # チェックポイントに残す既知の reply_id の数
+DAEMON_STATE_FILE = "output/mention_daemon.json"  # チェックポイント（最新の既知のリプライ・処理中のラン・間隔）
+DAEMON_STOP_FILE = "output/mention_daemon.stop"   # このファイルを作ると、処理中のサイクルを終えてから終了する
+
+# リソースのブロック設定（DevToolsの Network.setBlockedURLs。python -m reply_bot.resource_policy --bench で効果を計測）
+RESOURCE_BLOCK_ENABLED = True  # 使わない画像・動画・フォント・計測用のリクエストをブロックするか (True/False)
+RESOURCE_BLOCK_PATTERNS = {    # カテゴリごとのブロックするURLのパターン（* はワイルドカード）
+    "media": [
+        "*://pbs.twimg.com/media/*", "*://pbs.twimg.com/profile_images/*", "*://pbs.twimg.com/profile_banners/*",
+        "*://pbs.twimg.com/card_img/*", "*://pbs.twimg.com/ext_tw_video_thumb/*", "*://pbs.twimg.com/amplify_video_thumb/*",
+        "*://pbs.twimg.com/tweet_video_thumb/*",
+    ],
+    "video": ["*://video.twimg.com/*"],
+    "font": ["*.woff2", "*.woff2?*", "*.woff", "*.woff?*", "*.ttf", "*.otf"],
+    "analytics": [
+        "*/1.1/jot/*", "*://analytics.twitter.com/*", "*://static.ads-twitter.com/*", "*://ads-api.x.com/*",
+        "*://www.google-analytics.com/*", "*://www.googletagmanager.com/*",
+    ],
+}
+RESOURCE_BLOCK_STAGES = {      # ステージごとにブロックするカテゴリ
+    "collect": ["media", "video", "font", "analytics"],  # ステップ1（通知ページ）
+    "analyze": ["media", "video", "font", "analytics"],  # ステップ2（スレッドページ）
+    "post": ["video", "analytics"],                      # ステップ3（返信欄を使うため画像・フォントは読み込む）
+}
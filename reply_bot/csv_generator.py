@@ -18,7 +18,14 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from selenium import webdriver
 
 from .config import TARGET_USER, MAX_SCROLLS, LOGIN_TIMEOUT_ENABLED, LOGIN_TIMEOUT_SECONDS, PAGE_LOAD_TIMEOUT_SECONDS, SCROLL_PIXELS
+from .config import STAGE1_PREFILTER_ENABLED, SKIP_LIST_TTL_HOURS, RUN_STORE_EXPORT_CSV
+from .action_journal import ACTION_LIKE, ACTION_REPLY, completed_actions
+from .db import init_db, is_replied_many, get_skipped_many
 from .utils import setup_driver # 共通のWebDriverセットアップをインポート
+from .post_scheduler import PostScheduler
+from .resource_policy import apply_policy
+from .run_store import start_run, add_rows
+from .timeline_like import like_visible_replies
 
 # ロギング設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -26,6 +33,8 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # JSTタイムゾーンを定義
 jst = pytz.timezone('Asia/Tokyo')
 
+MENTIONS_URL = "https://x.com/notifications/mentions"
+
 def extract_text_with_emoji(element) -> str:
     """
     BeautifulSoup要素からテキストとimgタグのalt属性（絵文字）を含めて抽出する
@@ -164,7 +173,141 @@ def _extract_tweet_info(tweet_article: BeautifulSoup) -> dict | None:
         logging.error(f"ツイート情報の抽出中にエラーが発生しました: {e}")
         return None
 
-def main_process(driver: webdriver.Chrome, output_csv_path: str, max_scrolls: int = MAX_SCROLLS, scroll_pixels: int = SCROLL_PIXELS, hours_to_collect: int | None = None) -> str | None:
+CSV_FIELDNAMES = ["UserID", "Name", "date_time", "reply_id", "reply_to", "contents", "reply_num", "like_num", "is_my_thread", "lang", "liked"]
+
+def _append_rows(output_csv_path: str, rows: list, header_written: bool) -> bool:
+    """リプライ情報をCSVに追記し、ヘッダーを書き込み済みかどうかを返します。"""
+    if not rows:
+        return header_written
+    fieldnames = CSV_FIELDNAMES
+    if header_written:
+        # 既存のCSV（liked列の無い旧形式を含む）に追記する場合は、そのヘッダーの列順に合わせる
+        with open(output_csv_path, 'r', encoding='utf-8') as f:
+            fieldnames = next(csv.reader(f), None) or CSV_FIELDNAMES
+    with open(output_csv_path, 'a', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+        if not header_written:
+            writer.writeheader()
+            header_written = True
+        writer.writerows(rows)
+    return header_written
+
+def _store_rows(run_id: str | None, output_csv_path: str, rows: list, header_written: bool) -> bool:
+    """ページごとのリプライをランストアに追加し、CSVにも追記します（ランストアのみの設定の場合はCSVを書きません）。"""
+    if run_id:
+        add_rows(run_id, rows)
+        if not RUN_STORE_EXPORT_CSV:
+            return header_written
+    return _append_rows(output_csv_path, rows, header_written)
+
+def _prefilter_rows(rows: list, counts: dict) -> list:
+    """
+    返信済み（repliedテーブル・行動ジャーナル）のリプライを除外します。
+    最近のスレッド解析で返信対象外と判定されたリプライは、「いいね」済みなら除外し、そうでなければ
+    解析済み（analyzed=True）として残します（解析は省き、タイムラインやステップ3の「いいね」の対象にする）。
+    除外・解析省略の件数は理由ごとに counts に加算します。
+    """
+    if not STAGE1_PREFILTER_ENABLED or not rows:
+        return rows
+    ids = [row["reply_id"] for row in rows]
+    try:
+        replied = is_replied_many(ids)
+        completed = completed_actions(ids)
+        journaled = {tweet_id for tweet_id, action in completed if action == ACTION_REPLY}
+        liked = {tweet_id for tweet_id, action in completed if action == ACTION_LIKE}
+        since = (datetime.now() - timedelta(hours=SKIP_LIST_TTL_HOURS)).isoformat()
+        skipped = get_skipped_many(ids, since)
+    except Exception as e:
+        logging.warning(f"返信済みリプライの事前フィルタ中にエラー（フィルタせずに続行します）: {e}")
+        return rows
+
+    kept = []
+    for row in rows:
+        reply_id = row["reply_id"]
+        if reply_id in replied:
+            counts["replied"] += 1
+        elif reply_id in journaled:
+            counts["journal"] += 1
+        elif reply_id in skipped and reply_id in liked:
+            counts["skip_list"] += 1
+        else:
+            # ドライランで記録された判定でも「いいね」が漏れないよう、未「いいね」の行は解析だけ省く
+            row["analyzed"] = reply_id in skipped
+            counts["like_only"] += int(row["analyzed"])
+            kept.append(row)
+    return kept
+
+def _excluded_count(counts: dict) -> int:
+    """事前フィルタで除外した件数（解析だけ省いて残した like_only は含めない）を返します。"""
+    return sum(count for reason, count in counts.items() if reason != "like_only")
+
+def _like_rows_on_timeline(driver: webdriver.Chrome, rows: list, scheduler: PostScheduler | None, dry_run: bool):
+    """表示中の通知タイムライン上で各リプライに「いいね」し、結果を liked 列に記録します。"""
+    for row in rows:
+        row.setdefault("liked", False)
+    if scheduler is None or not rows:
+        return
+    results = like_visible_replies(driver, [row["reply_id"] for row in rows], scheduler, dry_run)
+    for row in rows:
+        row["liked"] = results.get(row["reply_id"], False)
+    logging.info(f"タイムライン上で {sum(results.values())}/{len(rows)} 件のリプライが「いいね」済みになりました。")
+
+def poll_mentions(driver: webdriver.Chrome, known_ids: set, since: datetime | None = None,
+                  max_scrolls: int = MAX_SCROLLS) -> tuple[list, str | None]:
+    """
+    常駐モード用の軽い収集: 通知（メンション）ページを再読み込みして先頭から読み、known_ids に含まれるリプライか
+    since より古いリプライに達するまでの新着を集めます（初回の特別なナビゲーションや長い待機は行いません）。
+    新着が続く間だけスクロールし、見つけた reply_id は known_ids に追加します。
+
+    Returns:
+        (事前フィルタ後の新着リプライのリスト（新しい順）, 見つけた中で最新の date_time。新着が無ければ None)
+    """
+    apply_policy(driver, "collect")
+    if driver.current_url.startswith(MENTIONS_URL):
+        driver.refresh()
+    else:
+        driver.get(MENTIONS_URL)
+    WebDriverWait(driver, PAGE_LOAD_TIMEOUT_SECONDS * 2).until(
+        EC.presence_of_element_located((By.XPATH, '//article[@data-testid="tweet"]'))
+    )
+    time.sleep(random.uniform(1.5, 2.5))
+
+    rows, seen, reached_known = [], set(), False
+    for scroll_count in range(max_scrolls + 1):
+        if scroll_count:
+            last_height = driver.execute_script("return document.body.scrollHeight")
+            driver.execute_script(f"window.scrollBy(0, {SCROLL_PIXELS});")
+            time.sleep(random.uniform(2, 3))
+            if driver.execute_script("return document.body.scrollHeight") == last_height:
+                break
+        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        for tweet_article in soup.find_all('article', {'data-testid': 'tweet'}):
+            extracted_info = _extract_tweet_info(tweet_article)
+            reply_id = extracted_info.get("reply_id") if extracted_info else None
+            if not reply_id or reply_id in seen:
+                continue
+            if reply_id in known_ids or (since and datetime.fromisoformat(extracted_info["date_time"]) < since):
+                reached_known = True
+                break
+            seen.add(reply_id)
+            rows.append(extracted_info)
+        if reached_known:
+            break
+
+    known_ids.update(seen)
+    newest = max((row["date_time"] for row in rows), default=None)
+    filtered_counts = {"replied": 0, "journal": 0, "skip_list": 0, "like_only": 0}
+    rows = _prefilter_rows(rows, filtered_counts)
+    if seen:
+        logging.info(
+            f"通知（メンション）ページで {len(seen)} 件の新着を見つけました"
+            f"（処理対象 {len(rows)} 件, 事前フィルタで除外 {_excluded_count(filtered_counts)} 件, "
+            f"「いいね」のみ {filtered_counts['like_only']} 件）。"
+        )
+    return rows, newest
+
+def main_process(driver: webdriver.Chrome, output_csv_path: str, max_scrolls: int = MAX_SCROLLS, scroll_pixels: int = SCROLL_PIXELS, hours_to_collect: int | None = None,
+                 like_in_timeline: bool = False, dry_run: bool = True, run_id: str | None = None, on_rows=None) -> str | None:
     """
     Seleniumを使用して、指定ユーザーのツイートに対するリプライを取得し、CSVリストを生成します。
     Twitterの通知ページからリプライ一覧を抽出し、スクロールしながらHTMLを保存し、
@@ -176,6 +319,10 @@ def main_process(driver: webdriver.Chrome, output_csv_path: str, max_scrolls: in
         max_scrolls: 最大スクロール回数
         scroll_pixels: 1回のスクロール量（ピクセル数）
         hours_to_collect: 何時間前までのリプライを収集するか。Noneの場合は制限なし。
+        like_in_timeline: Trueの場合、スクロール中に通知タイムライン上で各リプライに「いいね」し、結果をliked列に記録する。
+        dry_run: Trueの場合、タイムライン上の「いいね」を実際には行わない。
+        run_id: 指定した場合、リプライをランストアのこのランに追加する（CSVは RUN_STORE_EXPORT_CSV=True の場合のみ書き込む）。
+        on_rows: 指定した場合、ページごとに保存したリプライのリスト（新しい順）を渡して呼び出す（ステップ2へのストリーミング用）。
     
     Returns:
         str | None: 生成されたCSVファイルのパス。失敗した場合はNone。
@@ -205,10 +352,18 @@ def main_process(driver: webdriver.Chrome, output_csv_path: str, max_scrolls: in
                 csv_header_written = True
 
     stop_processing = False # 処理停止フラグ
+    page_rows = [] # 現在のページで新たに見つかったリプライ
+    like_scheduler = PostScheduler() if like_in_timeline else None
+    if run_id:
+        start_run(run_id, source="csv_generator")
+    filtered_counts = {"replied": 0, "journal": 0, "skip_list": 0, "like_only": 0}
+    if STAGE1_PREFILTER_ENABLED:
+        init_db()
     try:
         if not driver:
             logging.error("有効なWebDriverインスタンスが渡されませんでした。")
             return None
+        apply_policy(driver, "collect")
 
         # ユーザーの指示に基づき、強制的に最新情報を取得するナビゲーションシーケンス
         logging.info("--- 最新情報を確実に取得するため、特別なナビゲーションを開始します ---")
@@ -351,18 +506,18 @@ def main_process(driver: webdriver.Chrome, output_csv_path: str, max_scrolls: in
                 if reply_id and reply_id not in processed_reply_ids:
                     replies_data.append(extracted_info)
                     processed_reply_ids.add(reply_id)
-
-                    # CSVに書き込む (追記モード)
-                    fieldnames = ["UserID", "Name", "date_time", "reply_id", "reply_to", "contents", "reply_num", "like_num", "is_my_thread", "lang"]
-                    with open(output_csv_path, 'a', newline='', encoding='utf-8') as csvfile:
-                        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                        if not csv_header_written:
-                            writer.writeheader()
-                            csv_header_written = True
-                        writer.writerow(extracted_info)
+                    page_rows.append(extracted_info)
                 elif reply_id:
                     logging.info(f"重複するリプライIDをスキップしました: {reply_id}")
 
+        # 処理済みのリプライを除外し、表示中のタイムライン上で「いいね」してから、CSVに書き込む (追記モード)
+        page_rows = _prefilter_rows(page_rows, filtered_counts)
+        _like_rows_on_timeline(driver, page_rows, like_scheduler, dry_run)
+        csv_header_written = _store_rows(run_id, output_csv_path, page_rows, csv_header_written)
+        if on_rows and page_rows:
+            on_rows(page_rows)
+        page_rows = []
+
         logging.info("0ページ目のデータ取得が完了しました。")
 
         # ページを下にスクロールしてすべてのツイートをロード
@@ -398,17 +553,17 @@ def main_process(driver: webdriver.Chrome, output_csv_path: str, max_scrolls: in
                     if reply_id and reply_id not in processed_reply_ids:
                         replies_data.append(extracted_info)
                         processed_reply_ids.add(reply_id)
-
-                        # CSVに書き込む (追記モード)
-                        fieldnames = ["UserID", "Name", "date_time", "reply_id", "reply_to", "contents", "reply_num", "like_num", "is_my_thread", "lang"]
-                        with open(output_csv_path, 'a', newline='', encoding='utf-8') as csvfile:
-                            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                            if not csv_header_written:
-                                writer.writeheader()
-                                csv_header_written = True
-                            writer.writerow(extracted_info)
+                        page_rows.append(extracted_info)
                     elif reply_id:
                         logging.info(f"重複するリプライIDをスキップしました: {reply_id}")
+
+            # 処理済みのリプライを除外し、表示中のタイムライン上で「いいね」してから、CSVに書き込む (追記モード)
+            page_rows = _prefilter_rows(page_rows, filtered_counts)
+            _like_rows_on_timeline(driver, page_rows, like_scheduler, dry_run)
+            csv_header_written = _store_rows(run_id, output_csv_path, page_rows, csv_header_written)
+            if on_rows and page_rows:
+                on_rows(page_rows)
+            page_rows = []
             
             if stop_processing:
                 logging.info("指定期間外のリプライに到達したため、スクロールを停止します。")
@@ -433,6 +588,13 @@ def main_process(driver: webdriver.Chrome, output_csv_path: str, max_scrolls: in
             logging.info(f"最大スクロール回数({max_scrolls}回)に達したため、スクロールを停止します。")
         
         logging.info("すべてのスクロールと抽出が完了しました。")
+        if STAGE1_PREFILTER_ENABLED:
+            logging.info(
+                f"事前フィルタで {_excluded_count(filtered_counts)} 件のリプライをCSVから除外しました "
+                f"(返信済み: {filtered_counts['replied']}, 行動ジャーナル上で返信済み: {filtered_counts['journal']}, "
+                f"返信対象外と判定済み: {filtered_counts['skip_list']})。返信対象外と判定済みで未「いいね」の "
+                f"{filtered_counts['like_only']} 件は解析を省き、「いいね」のみ行います。"
+            )
 
     except Exception as e:
         logging.error(f"リプライ取得処理中に予期せぬエラーが発生しました: {e}", exc_info=True)
@@ -440,7 +602,7 @@ def main_process(driver: webdriver.Chrome, output_csv_path: str, max_scrolls: in
 
     # 最終的なCSV書き込み
     if replies_data:
-        logging.info(f"合計 {len(replies_data)} 件の新しいリプライを {output_csv_path} に保存しました。")
+        logging.info(f"合計 {len(replies_data) - _excluded_count(filtered_counts)} 件の新しいリプライを {output_csv_path} に保存しました。")
         logging.info(f"最終的に {len(processed_reply_ids)} 件のユニークなリプライが処理されました。")
         return output_csv_path
     else:
@@ -478,6 +640,16 @@ if __name__ == "__main__":
         action='store_true',
         help="このフラグを立てると、ブラウザをヘッドレスモード（非表示）で起動します。"
     )
+    parser.add_argument(
+        "--like-in-timeline",
+        action='store_true',
+        help="このフラグを立てると、スクロール中に通知タイムライン上で各リプライに「いいね」します。"
+    )
+    parser.add_argument(
+        "--live-run",
+        action='store_true',
+        help="このフラグを立てると、タイムライン上の「いいね」を実際に行います（ドライランを無効化）。"
+    )
     args = parser.parse_args()
 
     # 出力パスが指定されていない場合、タイムスタンプ付きのパスを生成
@@ -499,7 +671,9 @@ if __name__ == "__main__":
                 output_csv_path=output_path, 
                 max_scrolls=args.scrolls, 
                 scroll_pixels=args.pixels, 
-                hours_to_collect=args.hours
+                hours_to_collect=args.hours,
+                like_in_timeline=args.like_in_timeline,
+                dry_run=not args.live_run
             )
     finally:
         if driver:
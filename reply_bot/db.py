@@ -1,82 +1,832 @@
+import argparse
+import logging
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 
 DB_PATH = Path(__file__).parent / 'replies.db'
 
+# SQLiteのパラメータ数の上限（古いSQLiteでは999）を超えないよう IN 句を分割する件数
+_CHUNK_SIZE = 500
+
+# このプロセスから user_preferences に書き込んだ回数（自分の接続の書き込みは data_version に現れないため）
+_preference_writes = 0
+
+# スレッドごとに1本の接続を保持する（ワーカースレッドからも安全に使えるように接続は共有しない）
+_local = threading.local()
+
+def _configure(conn: sqlite3.Connection):
+    """WALモードと、書き込みの多いバッチ処理向けのプラグマを設定"""
+    # 新しいDBは最初から INCREMENTAL にする（WALへの切り替えより前でないと反映されない。既存のDBには影響しない）
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=5000')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-16000')
+
+def _current_path() -> Path:
+    return getattr(_local, 'path', None) or DB_PATH
+
+@contextmanager
+def using_db_path(path):
+    """
+    このスレッドの中だけ、DB_PATH の代わりに path のDBを使います（他のスレッドの接続には影響しません）。
+    抜けるときにこのパスの接続を閉じます。
+    """
+    previous = getattr(_local, 'path', None)
+    _local.path = Path(path)
+    try:
+        yield _local.path
+    finally:
+        close_connection()
+        _local.path = previous
+
+def get_connection() -> sqlite3.Connection:
+    """
+    現在のスレッド用の接続を返します（なければ作成）。
+    DB_PATH（または using_db_path() で指定したパス）が変更された場合やプロセスがforkされた場合は新しく接続し直します。
+    プリペアドステートメントは接続ごとに cached_statements 件までキャッシュされます。
+    """
+    path = _current_path()
+    key = (str(path), os.getpid())
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'key', None) != key:
+        if conn is not None and _local.key[1] == os.getpid():
+            conn.close()
+        conn = sqlite3.connect(path, timeout=5, cached_statements=256)
+        _configure(conn)
+        _local.conn, _local.key = conn, key
+    return conn
+
+def close_connection():
+    """現在のスレッドの接続を閉じます。"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = _local.key = None
+
+def _chunks(items: list, size: int = _CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute('''
-      CREATE TABLE IF NOT EXISTS replied (
-        tweet_id       TEXT PRIMARY KEY,
-        user_id        TEXT,
-        reply_text     TEXT,
-        is_my_thread   BOOLEAN DEFAULT FALSE,
-        timestamp      TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-      )
-    ''')
-    conn.execute('''
-      CREATE TABLE IF NOT EXISTS user_preferences (
-        user_id      TEXT PRIMARY KEY,
-        nickname     TEXT,
-        language     TEXT,
-        basic_response TEXT
-      )
-    ''')
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS replied (
+            tweet_id       TEXT PRIMARY KEY,
+            user_id        TEXT,
+            reply_text     TEXT,
+            is_my_thread   BOOLEAN DEFAULT FALSE,
+            timestamp      TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+          )
+        ''')
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS user_preferences (
+            user_id      TEXT PRIMARY KEY,
+            nickname     TEXT,
+            language     TEXT,
+            basic_response TEXT
+          )
+        ''')
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS reply_cache (
+            cache_key    TEXT,
+            reply_body   TEXT,
+            hit_count    INTEGER DEFAULT 0,
+            created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (cache_key, reply_body)
+          )
+        ''')
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS reply_phrase_history (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            reply_body   TEXT,
+            created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+          )
+        ''')
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS reply_minhash (
+            tweet_id     TEXT PRIMARY KEY,
+            signature    BLOB
+          )
+        ''')
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS action_journal (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            tweet_id     TEXT,
+            action       TEXT,
+            status       TEXT,
+            payload      TEXT,
+            result       TEXT,
+            created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+          )
+        ''')
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS skip_list (
+            tweet_id     TEXT PRIMARY KEY,
+            reason       TEXT,
+            skipped_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+          )
+        ''')
+        # user_preferences の変更履歴（メモリ上のインデックスを差分だけ更新するためにトリガーで記録する）
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS user_preference_changes (
+            seq          INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id      TEXT
+          )
+        ''')
+        conn.execute('''
+          CREATE TRIGGER IF NOT EXISTS trg_user_preferences_insert AFTER INSERT ON user_preferences
+          BEGIN INSERT INTO user_preference_changes (user_id) VALUES (NEW.user_id); END
+        ''')
+        conn.execute('''
+          CREATE TRIGGER IF NOT EXISTS trg_user_preferences_update AFTER UPDATE ON user_preferences
+          BEGIN
+            INSERT INTO user_preference_changes (user_id) VALUES (OLD.user_id);
+            INSERT INTO user_preference_changes (user_id) VALUES (NEW.user_id);
+          END
+        ''')
+        conn.execute('''
+          CREATE TRIGGER IF NOT EXISTS trg_user_preferences_delete AFTER DELETE ON user_preferences
+          BEGIN INSERT INTO user_preference_changes (user_id) VALUES (OLD.user_id); END
+        ''')
+        # 保持期間を過ぎた返信済みツイート（過去の返信との類似チェックには引き続き使う）
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS replied_archive (
+            tweet_id       TEXT PRIMARY KEY,
+            user_id        TEXT,
+            reply_text     TEXT,
+            is_my_thread   BOOLEAN DEFAULT FALSE,
+            timestamp      TIMESTAMP,
+            archived_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+          )
+        ''')
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS maintenance (
+            task         TEXT PRIMARY KEY,
+            last_run     TIMESTAMP
+          )
+        ''')
+        # ステージ間で受け渡すリプライ（run_id ごと。CSVは任意の出力物）
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS runs (
+            run_id       TEXT PRIMARY KEY,
+            source       TEXT,
+            created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+          )
+        ''')
+        conn.execute('''
+          CREATE TABLE IF NOT EXISTS run_rows (
+            run_id            TEXT,
+            reply_id          TEXT,
+            seq               INTEGER,
+            UserID            TEXT,
+            Name              TEXT,
+            date_time         TEXT,
+            reply_to          TEXT,
+            contents          TEXT,
+            reply_num         INTEGER DEFAULT 0,
+            like_num          INTEGER DEFAULT 0,
+            is_my_thread      BOOLEAN DEFAULT FALSE,
+            lang              TEXT,
+            liked             BOOLEAN DEFAULT FALSE,
+            analyzed          BOOLEAN DEFAULT FALSE,
+            generated_reply   TEXT DEFAULT '',
+            selfcheck_failed  BOOLEAN DEFAULT FALSE,
+            posted            BOOLEAN DEFAULT FALSE,
+            updated_at        TIMESTAMP,
+            PRIMARY KEY (run_id, reply_id)
+          )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_run_rows_seq ON run_rows (run_id, seq)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_replied_timestamp ON replied (timestamp)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_replied_archive_timestamp ON replied_archive (timestamp)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_reply_cache_created ON reply_cache (created_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_skip_list_skipped ON skip_list (skipped_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_action_journal_tweet ON action_journal (tweet_id, action)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_action_journal_status ON action_journal (status)')
 
 def is_replied(tweet_id: str) -> bool:
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     exists = conn.execute(
         'SELECT 1 FROM replied WHERE tweet_id = ?', (tweet_id,)
     ).fetchone() is not None
-    conn.close()
     return exists
 
 def mark_replied(tweet_id: str, user_id: str, reply_text: str, is_my_thread: bool = False):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
-        '''
-        INSERT OR IGNORE INTO replied(tweet_id, user_id, reply_text, is_my_thread, timestamp) 
-        VALUES (?, ?, ?, ?, ?)
-        ''', (tweet_id, user_id, reply_text, is_my_thread, datetime.now().isoformat())
-    )
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            '''
+            INSERT OR IGNORE INTO replied(tweet_id, user_id, reply_text, is_my_thread, timestamp) 
+            VALUES (?, ?, ?, ?, ?)
+            ''', (tweet_id, user_id, reply_text, is_my_thread, datetime.now().isoformat())
+        )
+
+def is_replied_many(tweet_ids) -> set[str]:
+    """指定したツイートIDのうち返信済みのものを集合で返します。"""
+    tweet_ids = [str(tweet_id) for tweet_id in tweet_ids]
+    conn = get_connection()
+    replied = set()
+    # 同じIDを2つのテーブルに問い合わせるため、パラメータ数が上限を超えないよう半分ずつ
+    for chunk in _chunks(tweet_ids, _CHUNK_SIZE // 2):
+        placeholders = ','.join('?' * len(chunk))
+        replied.update(row[0] for row in conn.execute(
+            f'''
+            SELECT tweet_id FROM replied WHERE tweet_id IN ({placeholders})
+            UNION SELECT tweet_id FROM replied_archive WHERE tweet_id IN ({placeholders})
+            ''', chunk + chunk
+        ))
+    return replied
+
+def mark_replied_many(rows):
+    """(tweet_id, user_id, reply_text, is_my_thread) の組をまとめて返信済みとして記録します。"""
+    now = datetime.now().isoformat()
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            '''
+            INSERT OR IGNORE INTO replied(tweet_id, user_id, reply_text, is_my_thread, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+            ''', ((str(tweet_id), user_id, reply_text, is_my_thread, now) for tweet_id, user_id, reply_text, is_my_thread in rows)
+        )
 
 def get_thread_info(tweet_id: str):
     """スレッド情報を取得"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     result = conn.execute(
         'SELECT is_my_thread FROM replied WHERE tweet_id = ?', (tweet_id,)
     ).fetchone()
-    conn.close()
     return result[0] if result else None
 
-def purge_old(hours: int = 24):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
-      "DELETE FROM replied WHERE timestamp < datetime('now', '-{} hours')".format(hours)
-    )
-    conn.commit()
-    conn.close()
+def purge_old(hours: int = 24, batch_size: int = 1000) -> int:
+    """指定時間より前に返信したツイートを replied_archive に移し、移した件数を返します。"""
+    cutoff = datetime.fromtimestamp(time.time() - hours * 3600).isoformat()
+    total = 0
+    while True:
+        moved = archive_replied_before(cutoff, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+
+def archive_replied_before(cutoff: str, limit: int) -> int:
+    """cutoff より前の返信済みツイートを最大 limit 件 replied_archive に移し、移した件数を返します。"""
+    conn = get_connection()
+    with conn:
+        ids = [row[0] for row in conn.execute(
+            'SELECT tweet_id FROM replied WHERE timestamp < ? ORDER BY timestamp LIMIT ?', (cutoff, limit)
+        )]
+        if not ids:
+            return 0
+        placeholders = ','.join('?' * len(ids))
+        conn.execute(
+            f'''
+            INSERT OR REPLACE INTO replied_archive (tweet_id, user_id, reply_text, is_my_thread, timestamp, archived_at)
+            SELECT tweet_id, user_id, reply_text, is_my_thread, timestamp, ? FROM replied WHERE tweet_id IN ({placeholders})
+            ''', [datetime.now().isoformat(), *ids]
+        )
+        conn.execute(f'DELETE FROM replied WHERE tweet_id IN ({placeholders})', ids)
+    return len(ids)
+
+# 保持期間で削除できるテーブルと日時の列（テーブル名・列名は固定値のみ）
+_RETENTION_COLUMNS = {
+    "replied_archive": "timestamp",
+    "reply_cache": "created_at",
+    "skip_list": "skipped_at",
+    "action_journal": "updated_at",
+    "run_rows": "updated_at",
+    "runs": "created_at",
+}
+
+def delete_rows_before(table: str, cutoff: str, limit: int) -> int:
+    """
+    保持期間を過ぎた行を最大 limit 件削除し、削除した件数を返します。
+    行動ジャーナルは未解決（intent）の記録を残します。
+    """
+    column = _RETENTION_COLUMNS[table]
+    extra = " AND status != 'intent'" if table == "action_journal" else ""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            f'DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {column} < ?{extra} LIMIT ?)',
+            (cutoff, limit)
+        )
+    return cursor.rowcount
+
+def delete_orphan_signatures() -> int:
+    """返信済み・アーカイブのどちらにも無いツイートのMinHash署名を削除し、件数を返します。"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            '''
+            DELETE FROM reply_minhash WHERE tweet_id NOT IN (SELECT tweet_id FROM replied)
+              AND tweet_id NOT IN (SELECT tweet_id FROM replied_archive)
+            '''
+        )
+    return cursor.rowcount
+
+def get_last_maintenance(task: str) -> str | None:
+    conn = get_connection()
+    result = conn.execute('SELECT last_run FROM maintenance WHERE task = ?', (task,)).fetchone()
+    return result[0] if result else None
+
+def set_last_maintenance(task: str):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO maintenance (task, last_run) VALUES (?, ?)', (task, datetime.now().isoformat())
+        )
+
+def enable_incremental_vacuum() -> bool:
+    """
+    auto_vacuum を INCREMENTAL に切り替えます（切り替えた場合は True）。
+    既存のDBではVACUUMでファイル全体を書き直し、その間は他の接続の書き込みを止めるため、
+    定期処理からは呼ばず、ボットを止めた状態で一度だけ実行します。
+    """
+    conn = get_connection()
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return False
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('VACUUM')
+    return True
+
+def incremental_vacuum(pages: int) -> int:
+    """
+    空きページを最大 pages ページ解放し、解放したページ数を返します。
+    auto_vacuum が INCREMENTAL でないDBでは何もせず 0 を返します（enable_incremental_vacuum() で切り替えます）。
+    """
+    conn = get_connection()
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        logging.info(
+            "auto_vacuum が INCREMENTAL でないため空きページの解放をスキップします"
+            "（python -m reply_bot.retention --enable-incremental-vacuum で切り替えられます）。"
+        )
+        return 0
+    before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+    after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+    return before - after
+
+def get_db_stats() -> dict:
+    """DBファイルのサイズ・ページ数と、テーブルごとの行数を返します。"""
+    conn = get_connection()
+    path = Path(_current_path())
+    wal_path = Path(f"{path}-wal")
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    return {
+        "path": str(path),
+        "size_bytes": path.stat().st_size if path.exists() else 0,
+        "wal_bytes": wal_path.stat().st_size if wal_path.exists() else 0,
+        "page_size": conn.execute('PRAGMA page_size').fetchone()[0],
+        "page_count": conn.execute('PRAGMA page_count').fetchone()[0],
+        "freelist_count": conn.execute('PRAGMA freelist_count').fetchone()[0],
+        "auto_vacuum": conn.execute('PRAGMA auto_vacuum').fetchone()[0],
+        "tables": {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables},
+    }
 
 def add_user_preference(user_id: str, nickname: str, language: str, basic_response: str):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
-        '''
-        INSERT OR REPLACE INTO user_preferences (user_id, nickname, language, basic_response)
-        VALUES (?, ?, ?, ?)
-        ''', (user_id, nickname, language, basic_response)
-    )
-    conn.commit()
-    conn.close()
+    add_user_preferences_many([(user_id, nickname, language, basic_response)])
+
+def add_user_preferences_many(rows) -> int:
+    """(user_id, nickname, language, basic_response) の組を1つのトランザクションでまとめて登録し、件数を返します。"""
+    global _preference_writes
+    conn = get_connection()
+    with conn:
+        cursor = conn.executemany(
+            '''
+            INSERT OR REPLACE INTO user_preferences (user_id, nickname, language, basic_response)
+            VALUES (?, ?, ?, ?)
+            ''', rows
+        )
+    _preference_writes += 1
+    return cursor.rowcount
+
+def get_all_user_preferences() -> dict:
+    """{user_id: (nickname, language, basic_response)} を全件返します。"""
+    conn = get_connection()
+    return {
+        user_id: (nickname, language, basic_response)
+        for user_id, nickname, language, basic_response in conn.execute(
+            'SELECT user_id, nickname, language, basic_response FROM user_preferences'
+        )
+    }
+
+def get_preference_change_seq() -> int:
+    """user_preferences の変更履歴の最新の通番を返します。"""
+    conn = get_connection()
+    return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM user_preference_changes').fetchone()[0]
+
+def get_preference_changes(since_seq: int) -> tuple[set[str], int]:
+    """指定した通番より後に変更された user_id の集合と、最新の通番を返します。"""
+    conn = get_connection()
+    rows = conn.execute(
+        'SELECT seq, user_id FROM user_preference_changes WHERE seq > ? ORDER BY seq', (since_seq,)
+    ).fetchall()
+    return {user_id for _, user_id in rows}, (rows[-1][0] if rows else since_seq)
+
+def get_oldest_preference_change_seq() -> int | None:
+    """残っている変更履歴のうち最も古い通番を返します（無ければNone）。"""
+    conn = get_connection()
+    return conn.execute('SELECT MIN(seq) FROM user_preference_changes').fetchone()[0]
+
+def delete_old_preference_changes(keep: int, limit: int) -> int:
+    """
+    最新の keep 件より古い変更履歴を最大 limit 件削除し、削除した件数を返します。
+    削除した範囲を読み終えていないインデックスは、次の更新確認で全件を読み直します。
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            '''
+            DELETE FROM user_preference_changes WHERE seq IN (
+              SELECT seq FROM user_preference_changes
+              WHERE seq <= (SELECT MAX(seq) FROM user_preference_changes) - ? ORDER BY seq LIMIT ?
+            )
+            ''', (keep, limit)
+        )
+    return cursor.rowcount
+
+def get_change_marker() -> tuple[int, int]:
+    """
+    DBが変更されたかどうかを判定する目印を返します。
+    PRAGMA data_version は他の接続（別プロセス・別スレッド）のコミットで変わり、
+    このプロセスの書き込み回数はこの接続で書き込んだ場合の検出に使います。
+    """
+    conn = get_connection()
+    return conn.execute('PRAGMA data_version').fetchone()[0], _preference_writes
 
 def get_user_preference(user_id: str):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     preference = conn.execute(
         'SELECT nickname, language, basic_response FROM user_preferences WHERE user_id = ?', (user_id,)
     ).fetchone()
-    conn.close()
-    return preference 
\ No newline at end of file
+    return preference
+
+def get_user_preferences_many(user_ids) -> dict:
+    """{user_id: (nickname, language, basic_response)} を登録済みのユーザー分だけ返します。"""
+    user_ids = list(dict.fromkeys(user_ids))
+    conn = get_connection()
+    preferences = {}
+    for chunk in _chunks(user_ids):
+        placeholders = ','.join('?' * len(chunk))
+        for user_id, *preference in conn.execute(
+            f'SELECT user_id, nickname, language, basic_response FROM user_preferences WHERE user_id IN ({placeholders})',
+            chunk
+        ):
+            preferences[user_id] = tuple(preference)
+    return preferences
+
+def get_cached_replies(cache_key: str, since: str) -> list[str]:
+    """指定時刻以降に保存されたキャッシュ済み返信本文を取得"""
+    conn = get_connection()
+    rows = conn.execute(
+        'SELECT reply_body FROM reply_cache WHERE cache_key = ? AND created_at >= ? ORDER BY hit_count ASC',
+        (cache_key, since)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+def add_cached_reply(cache_key: str, reply_body: str):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            '''
+            INSERT OR IGNORE INTO reply_cache (cache_key, reply_body, hit_count, created_at)
+            VALUES (?, ?, 0, ?)
+            ''', (cache_key, reply_body, datetime.now().isoformat())
+        )
+
+def touch_cached_reply(cache_key: str, reply_body: str):
+    """キャッシュの利用回数を加算"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            'UPDATE reply_cache SET hit_count = hit_count + 1 WHERE cache_key = ? AND reply_body = ?',
+            (cache_key, reply_body)
+        )
+
+def add_reply_history(reply_body: str, keep: int):
+    """返信本文を履歴に追加し、直近 keep 件より古いものを削除"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            'INSERT INTO reply_phrase_history (reply_body, created_at) VALUES (?, ?)',
+            (reply_body, datetime.now().isoformat())
+        )
+        conn.execute(
+            'DELETE FROM reply_phrase_history WHERE id <= (SELECT MAX(id) FROM reply_phrase_history) - ?',
+            (keep,)
+        )
+
+def get_recent_reply_history(limit: int) -> list[str]:
+    """直近 limit 件の返信本文を古い順に取得"""
+    conn = get_connection()
+    rows = conn.execute(
+        'SELECT reply_body FROM reply_phrase_history ORDER BY id DESC LIMIT ?', (limit,)
+    ).fetchall()
+    return [row[0] for row in reversed(rows)]
+
+def get_replies_without_signature(since: str) -> list[tuple]:
+    """MinHash署名が未計算の返信済みツイートの (tweet_id, reply_text, 返信相手のニックネーム) を取得"""
+    conn = get_connection()
+    rows = conn.execute(
+        '''
+        SELECT r.tweet_id, r.reply_text, p.nickname FROM (
+          SELECT tweet_id, user_id, reply_text, timestamp FROM replied
+          UNION ALL SELECT tweet_id, user_id, reply_text, timestamp FROM replied_archive
+        ) r
+        LEFT JOIN reply_minhash m ON m.tweet_id = r.tweet_id
+        LEFT JOIN user_preferences p ON p.user_id = r.user_id COLLATE NOCASE
+        WHERE m.tweet_id IS NULL AND r.timestamp >= ? AND r.reply_text IS NOT NULL
+        ''', (since,)
+    ).fetchall()
+    return rows
+
+def clear_reply_signatures() -> int:
+    """保存済みのMinHash署名を全て削除し、件数を返します（正規化の方法を変えた時の再計算用）。"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute('DELETE FROM reply_minhash')
+    return cursor.rowcount
+
+def add_reply_signatures(rows: list[tuple]):
+    """(tweet_id, signature) の組をまとめて保存"""
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO reply_minhash (tweet_id, signature) VALUES (?, ?)', rows
+        )
+
+def get_reply_signatures(since: str) -> list[tuple]:
+    """指定時刻以降に返信したツイートの (tweet_id, signature) を取得"""
+    conn = get_connection()
+    rows = conn.execute(
+        '''
+        SELECT m.tweet_id, m.signature FROM reply_minhash m
+        JOIN replied r ON r.tweet_id = m.tweet_id
+        WHERE r.timestamp >= ?
+        UNION ALL
+        SELECT m.tweet_id, m.signature FROM reply_minhash m
+        JOIN replied_archive a ON a.tweet_id = m.tweet_id
+        WHERE a.timestamp >= ?
+        ''', (since, since)
+    ).fetchall()
+    return rows
+
+def get_reply_text(tweet_id: str) -> str | None:
+    conn = get_connection()
+    result = conn.execute(
+        '''
+        SELECT reply_text FROM replied WHERE tweet_id = ?
+        UNION ALL SELECT reply_text FROM replied_archive WHERE tweet_id = ?
+        ''', (tweet_id, tweet_id)
+    ).fetchone()
+    return result[0] if result else None
+
+def add_journal_entry(tweet_id: str, action: str, status: str, payload: str = '') -> int:
+    """行動ジャーナルに記録を追加し、そのIDを返します。"""
+    now = datetime.now().isoformat()
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            '''
+            INSERT INTO action_journal (tweet_id, action, status, payload, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', (tweet_id, action, status, payload, now, now)
+        )
+    return cursor.lastrowid
+
+def update_journal_entry(entry_id: int, status: str, result: str = ''):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            'UPDATE action_journal SET status = ?, result = ?, updated_at = ? WHERE id = ?',
+            (status, result, datetime.now().isoformat(), entry_id)
+        )
+
+def get_journal_done(tweet_ids: list[str]) -> set[tuple]:
+    """完了済み (tweet_id, action) の組を取得"""
+    if not tweet_ids:
+        return set()
+    conn = get_connection()
+    done = set()
+    for chunk in _chunks(tweet_ids):
+        placeholders = ','.join('?' * len(chunk))
+        done.update(conn.execute(
+            f"SELECT tweet_id, action FROM action_journal WHERE status = 'done' AND tweet_id IN ({placeholders})",
+            chunk
+        ).fetchall())
+    return done
+
+def get_journal_pending() -> list[tuple]:
+    """完了も失敗も記録されていない (id, tweet_id, action, payload) を取得"""
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT id, tweet_id, action, payload FROM action_journal WHERE status = 'intent' ORDER BY id"
+    ).fetchall()
+    return rows
+
+def get_journal_unreconciled_replies() -> list[tuple]:
+    """完了済みの返信のうち replied テーブルに無いもの (tweet_id, payload) を取得"""
+    conn = get_connection()
+    rows = conn.execute(
+        '''
+        SELECT j.tweet_id, j.payload FROM action_journal j
+        LEFT JOIN replied r ON r.tweet_id = j.tweet_id
+        WHERE j.action = 'reply' AND j.status = 'done' AND r.tweet_id IS NULL
+          AND j.tweet_id NOT IN (SELECT tweet_id FROM replied_archive)
+        '''
+    ).fetchall()
+    return rows
+
+def add_skipped_tweet(tweet_id: str, reason: str):
+    """スレッド解析で返信対象外と判定したツイートを記録（再判定した場合は日時を更新）"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO skip_list (tweet_id, reason, skipped_at) VALUES (?, ?, ?)',
+            (str(tweet_id), reason, datetime.now().isoformat())
+        )
+
+def get_skipped_many(tweet_ids, since: str) -> set[str]:
+    """指定時刻以降に返信対象外と判定されたツイートIDを集合で返します。"""
+    tweet_ids = [str(tweet_id) for tweet_id in tweet_ids]
+    conn = get_connection()
+    skipped = set()
+    for chunk in _chunks(tweet_ids):
+        placeholders = ','.join('?' * len(chunk))
+        skipped.update(row[0] for row in conn.execute(
+            f'SELECT tweet_id FROM skip_list WHERE skipped_at >= ? AND tweet_id IN ({placeholders})',
+            [since, *chunk]
+        ))
+    return skipped
+
+# run_rows の列（reply_id・seq 以外で、読み書きできるもの）
+RUN_ROW_COLUMNS = (
+    "UserID", "Name", "date_time", "reply_to", "contents", "reply_num", "like_num", "is_my_thread", "lang",
+    "liked", "analyzed", "generated_reply", "selfcheck_failed", "posted",
+)
+
+def add_run(run_id: str, source: str = ''):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            'INSERT OR IGNORE INTO runs (run_id, source, created_at) VALUES (?, ?, ?)',
+            (run_id, source, datetime.now().isoformat())
+        )
+
+def get_runs(limit: int = 20) -> list[tuple]:
+    """新しい順に (run_id, source, created_at, 行数) を取得"""
+    conn = get_connection()
+    return conn.execute(
+        '''
+        SELECT r.run_id, r.source, r.created_at, COUNT(rr.reply_id) FROM runs r
+        LEFT JOIN run_rows rr ON rr.run_id = r.run_id
+        GROUP BY r.run_id ORDER BY r.created_at DESC LIMIT ?
+        ''', (limit,)
+    ).fetchall()
+
+def run_exists(run_id: str) -> bool:
+    conn = get_connection()
+    return conn.execute('SELECT 1 FROM runs WHERE run_id = ?', (run_id,)).fetchone() is not None
+
+def add_run_rows(run_id: str, rows: list[dict]) -> int:
+    """リプライを収集順に追加し（既にある reply_id は無視）、追加した件数を返します。"""
+    columns = [column for column in RUN_ROW_COLUMNS if any(column in row for row in rows)]
+    conn = get_connection()
+    with conn:
+        next_seq = conn.execute(
+            'SELECT COALESCE(MAX(seq), 0) + 1 FROM run_rows WHERE run_id = ?', (run_id,)
+        ).fetchone()[0]
+        now = datetime.now().isoformat()
+        cursor = conn.executemany(
+            f'''
+            INSERT OR IGNORE INTO run_rows (run_id, reply_id, seq, updated_at, {', '.join(columns)})
+            VALUES (?, ?, ?, ?, {', '.join('?' * len(columns))})
+            ''',
+            ((run_id, row["reply_id"], next_seq + i, now, *(row.get(column) for column in columns)) for i, row in enumerate(rows))
+        )
+    return cursor.rowcount
+
+def update_run_row(run_id: str, reply_id: str, fields: dict):
+    """指定したリプライの列を更新します（列名は RUN_ROW_COLUMNS のもののみ）。"""
+    unknown = set(fields) - set(RUN_ROW_COLUMNS)
+    if unknown:
+        raise ValueError(f"run_rows に存在しない列です: {sorted(unknown)}")
+    if not fields:
+        return
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            f'''
+            UPDATE run_rows SET {', '.join(f'{column} = ?' for column in fields)}, updated_at = ?
+            WHERE run_id = ? AND reply_id = ?
+            ''', (*fields.values(), datetime.now().isoformat(), run_id, str(reply_id))
+        )
+
+def get_run_rows_page(run_id: str, after_seq: int, page_size: int, conditions: dict) -> list[tuple]:
+    """
+    seq が after_seq より大きいリプライを最大 page_size 件、収集順に取得します。
+    conditions は {列名: 値} の等価条件です。返す列は (seq, reply_id, *RUN_ROW_COLUMNS) の順です。
+    """
+    unknown = set(conditions) - set(RUN_ROW_COLUMNS)
+    if unknown:
+        raise ValueError(f"run_rows に存在しない列です: {sorted(unknown)}")
+    where = ''.join(f' AND {column} = ?' for column in conditions)
+    conn = get_connection()
+    return conn.execute(
+        f'''
+        SELECT seq, reply_id, {', '.join(RUN_ROW_COLUMNS)} FROM run_rows
+        WHERE run_id = ? AND seq > ?{where} ORDER BY seq LIMIT ?
+        ''', (run_id, after_seq, *conditions.values(), page_size)
+    ).fetchall()
+
+def get_run_counts(run_id: str) -> dict:
+    """ステージごとの進捗（行数・解析済み・返信あり・セルフチェック失敗・いいね済み・投稿済み）"""
+    conn = get_connection()
+    row = conn.execute(
+        '''
+        SELECT COUNT(*), COALESCE(SUM(analyzed), 0), COALESCE(SUM(generated_reply != ''), 0),
+               COALESCE(SUM(selfcheck_failed), 0), COALESCE(SUM(liked), 0), COALESCE(SUM(posted), 0)
+        FROM run_rows WHERE run_id = ?
+        ''', (run_id,)
+    ).fetchone()
+    return dict(zip(("rows", "analyzed", "with_reply", "selfcheck_failed", "liked", "posted"), row))
+
+def benchmark(rows: int = 5000) -> dict:
+    """
+    一時DBで、従来の「1回ごとに接続して閉じる」方式と、保持した接続・まとめて処理するAPIの
+    1件あたりの処理時間（マイクロ秒）を比較します。
+    """
+    import tempfile
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, using_db_path(Path(tmp) / 'bench.db') as path:
+        init_db()
+        data = [(f"{10**18 + i}", f"user{i % 300}", f"返信 {i}", i % 2 == 0) for i in range(rows)]
+        ids = [row[0] for row in data]
+
+        start = time.perf_counter()
+        for tweet_id, user_id, reply_text, is_my_thread in data:
+            legacy = sqlite3.connect(path)
+            legacy.execute(
+                'INSERT OR IGNORE INTO replied(tweet_id, user_id, reply_text, is_my_thread) VALUES (?, ?, ?, ?)',
+                (tweet_id, user_id, reply_text, is_my_thread)
+            )
+            legacy.commit()
+            legacy.close()
+        results["legacy_mark_replied_us"] = (time.perf_counter() - start) / rows * 1e6
+
+        start = time.perf_counter()
+        for tweet_id in ids:
+            legacy = sqlite3.connect(path)
+            legacy.execute('SELECT 1 FROM replied WHERE tweet_id = ?', (tweet_id,)).fetchone()
+            legacy.close()
+        results["legacy_is_replied_us"] = (time.perf_counter() - start) / rows * 1e6
+
+        with get_connection() as conn:
+            conn.execute('DELETE FROM replied')
+
+        start = time.perf_counter()
+        for tweet_id, user_id, reply_text, is_my_thread in data:
+            mark_replied(tweet_id, user_id, reply_text, is_my_thread)
+        results["mark_replied_us"] = (time.perf_counter() - start) / rows * 1e6
+
+        start = time.perf_counter()
+        for tweet_id in ids:
+            is_replied(tweet_id)
+        results["is_replied_us"] = (time.perf_counter() - start) / rows * 1e6
+
+        with get_connection() as conn:
+            conn.execute('DELETE FROM replied')
+
+        start = time.perf_counter()
+        mark_replied_many(data)
+        results["mark_replied_many_us"] = (time.perf_counter() - start) / rows * 1e6
+
+        start = time.perf_counter()
+        found = is_replied_many(ids)
+        results["is_replied_many_us"] = (time.perf_counter() - start) / rows * 1e6
+        assert len(found) == rows
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="返信済みDBの初期化とベンチマーク")
+    parser.add_argument("--bench", type=int, metavar="N", help="N件のダミーデータで1件あたりの処理時間を計測します")
+    args = parser.parse_args()
+
+    if args.bench:
+        for name, value in benchmark(args.bench).items():
+            print(f"{name:>24}: {value:8.1f} µs/件")
+    else:
+        init_db()
+        print(f"データベースを初期化しました: {DB_PATH}")
@@ -0,0 +1,219 @@
+"""
+絵文字コードポイント表と線形走査による絵文字判定
+emojiライブラリを使わずに、ZWJシーケンス・異体字セレクタ・肌色修飾子・
+国旗・キーキャップ・タグシーケンスを1文字ずつの走査で検出する
+"""
+
+import argparse
+import csv
+import glob
+import re
+import time
+from typing import Iterable, Iterator, List, Tuple
+
+# 絵文字の基底文字になり得るコードポイント範囲（Extended_Pictographic相当）
+_PICTOGRAPHIC_RANGES = [
+    (0x00A9, 0x00A9), (0x00AE, 0x00AE), (0x203C, 0x203C), (0x2049, 0x2049),
+    (0x2122, 0x2122), (0x2139, 0x2139), (0x2194, 0x2199), (0x21A9, 0x21AA),
+    (0x231A, 0x231B), (0x2328, 0x2328), (0x2388, 0x2388), (0x23CF, 0x23CF),
+    (0x23E9, 0x23F3), (0x23F8, 0x23FA), (0x24C2, 0x24C2), (0x25AA, 0x25AB),
+    (0x25B6, 0x25B6), (0x25C0, 0x25C0), (0x25FB, 0x25FE), (0x2600, 0x27BF),
+    (0x2934, 0x2935), (0x2B05, 0x2B07), (0x2B1B, 0x2B1C), (0x2B50, 0x2B50),
+    (0x2B55, 0x2B55), (0x3030, 0x3030), (0x303D, 0x303D), (0x3297, 0x3297),
+    (0x3299, 0x3299), (0x1F000, 0x1F1E5), (0x1F200, 0x1F3FA), (0x1F400, 0x1FAFF),
+    (0x1FC00, 0x1FFFD),
+]
+
+ZWJ = 0x200D
+VARIATION_SELECTORS = frozenset((0xFE0E, 0xFE0F))
+KEYCAP = 0x20E3
+KEYCAP_BASES = frozenset(ord(c) for c in "0123456789#*")
+SKIN_TONE_MODIFIERS = frozenset(range(0x1F3FB, 0x1F400))
+REGIONAL_INDICATORS = frozenset(range(0x1F1E6, 0x1F200))
+TAG_CHARACTERS = frozenset(range(0xE0020, 0xE007F))
+TAG_CANCEL = 0xE007F
+
+# 起動時に一度だけ展開する基底文字の表
+PICTOGRAPHIC = frozenset(
+    code for start, end in _PICTOGRAPHIC_RANGES for code in range(start, end + 1)
+)
+
+# 返信文で使用を許可する絵文字（返信ルールで指定されているハートのみ）
+ALLOWED_REPLY_EMOJI = frozenset(("❤️", "❤", "🩷"))
+
+def _consume_element(codes: List[int], i: int) -> int:
+    """基底文字に続く異体字セレクタ・肌色修飾子・タグを読み進め、次の位置を返します。"""
+    n = len(codes)
+    if i < n and codes[i] in VARIATION_SELECTORS:
+        i += 1
+    if i < n and codes[i] in SKIN_TONE_MODIFIERS:
+        i += 1
+    if i < n and codes[i] in TAG_CHARACTERS:
+        j = i
+        while j < n and codes[j] in TAG_CHARACTERS:
+            j += 1
+        if j < n and codes[j] == TAG_CANCEL:
+            i = j + 1
+    return i
+
+def _match_at(codes: List[int], i: int) -> int:
+    """位置iから始まる絵文字シーケンスの終端を返します。絵文字でなければiを返します。"""
+    n = len(codes)
+    code = codes[i]
+
+    # キーキャップ: [0-9#*] (FE0F) 20E3
+    if code in KEYCAP_BASES:
+        j = i + 1
+        if j < n and codes[j] == 0xFE0F:
+            j += 1
+        if j < n and codes[j] == KEYCAP:
+            return j + 1
+        return i
+
+    # 国旗: 地域指示子2文字
+    if code in REGIONAL_INDICATORS:
+        if i + 1 < n and codes[i + 1] in REGIONAL_INDICATORS:
+            return i + 2
+        return i + 1
+
+    # 単独の肌色修飾子も絵文字として扱う
+    if code in SKIN_TONE_MODIFIERS:
+        return i + 1
+
+    if code not in PICTOGRAPHIC:
+        return i
+
+    j = _consume_element(codes, i + 1)
+    # ZWJシーケンス: 要素 (200D 要素)*
+    while j + 1 < n and codes[j] == ZWJ and codes[j + 1] in PICTOGRAPHIC:
+        j = _consume_element(codes, j + 2)
+    return j
+
+def iter_emoji_spans(text: str) -> Iterator[Tuple[int, int]]:
+    """本文中の絵文字シーケンスの (開始位置, 終了位置) を先頭から順に返します。"""
+    if not text:
+        return
+    codes = [ord(char) for char in text]
+    i = 0
+    n = len(codes)
+    while i < n:
+        end = _match_at(codes, i)
+        if end > i:
+            yield i, end
+            i = end
+        else:
+            i += 1
+
+def split_emoji(text: str) -> List[Tuple[str, bool]]:
+    """本文を (文字列, 絵文字かどうか) の断片に分割します。"""
+    segments = []
+    last = 0
+    for start, end in iter_emoji_spans(text):
+        if start > last:
+            segments.append((text[last:start], False))
+        segments.append((text[start:end], True))
+        last = end
+    if last < len(text or ""):
+        segments.append((text[last:], False))
+    return segments
+
+def find_emoji(text: str) -> List[str]:
+    return [text[start:end] for start, end in iter_emoji_spans(text)]
+
+def is_emoji_only(text: str) -> bool:
+    """
+    絵文字（と記号・空白）のみで構成されているかを判定します。
+    文字・数字が絵文字シーケンスの外に1つでもあればFalseです。
+    """
+    if not text or not isinstance(text, str) or not text.strip():
+        return False
+    for segment, is_emoji in split_emoji(text):
+        if not is_emoji and re.search(r'\w', segment):
+            return False
+    return True
+
+def strip_emoji(text: str, keep: Iterable[str] = ()) -> str:
+    """keep に含まれるもの以外の絵文字シーケンスを除去します。"""
+    keep = set(keep)
+    return "".join(
+        segment for segment, is_emoji in split_emoji(text)
+        if not is_emoji or segment in keep
+    )
+
+def trailing_emoji(text: str) -> str | None:
+    """末尾（空白を除く）が絵文字で終わっていればその絵文字シーケンスを返します。"""
+    stripped = (text or "").rstrip()
+    last = None
+    for start, end in iter_emoji_spans(stripped):
+        last = (start, end)
+    if last and last[1] == len(stripped):
+        return stripped[last[0]:last[1]]
+    return None
+
+# --- ベンチマーク ---
+
+def _legacy_is_emoji_only(text: str) -> bool:
+    """emoji.demojize を使った従来の実装（比較用）"""
+    import emoji
+    if not text or not isinstance(text, str): return False
+    text_without_symbols = re.sub(r'[^\w\s]', '', text)
+    demojized_text = emoji.demojize(text_without_symbols).strip()
+    if not demojized_text: return True
+    return all(re.fullmatch(r':[a-zA-Z0-9_+-]+:', word) for word in demojized_text.split())
+
+_SAMPLE_TEXTS = [
+    "❤️", "🩷🩷🩷", "おはよう☀️", "👍🏻", "👨‍👩‍👧‍👦", "🇯🇵", "1️⃣", "🏴󠁧󠁢󠁳󠁣󠁴󠁿",
+    "かわいい😍", "Thank you Maya!! 💕", "素敵な写真ですね✨今日も頑張ってください",
+    "www", "!!", "🙏✨", "Good morning 🌞🌸",
+]
+
+def _load_texts(csv_paths: List[str]) -> List[str]:
+    texts = []
+    for path in csv_paths:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                if row.get('contents'):
+                    texts.append(row['contents'])
+    return texts
+
+def benchmark(texts: List[str], repeat: int = 5) -> dict:
+    """従来実装と本実装の is_emoji_only を同じ本文で比較計測します。"""
+    start = time.perf_counter()
+    import emoji  # noqa: F401  インポート時間も計測対象
+    import_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        legacy = [_legacy_is_emoji_only(text) for text in texts]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        current = [is_emoji_only(text) for text in texts]
+    current_seconds = time.perf_counter() - start
+
+    calls = max(len(texts) * repeat, 1)
+    return {
+        "texts": len(texts),
+        "emoji_import_ms": import_seconds * 1000,
+        "legacy_us_per_call": legacy_seconds / calls * 1e6,
+        "table_us_per_call": current_seconds / calls * 1e6,
+        "disagreements": [text for text, a, b in zip(texts, legacy, current) if a != b],
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="絵文字判定の従来実装とコードポイント表実装を比較計測します。")
+    parser.add_argument("csv_files", nargs='*', help="本文を読み込むCSV（指定しない場合は output/*.csv、無ければ組み込みサンプル）")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数")
+    args = parser.parse_args()
+
+    paths = args.csv_files or sorted(glob.glob("output/*.csv"))
+    sample = _load_texts(paths) or _SAMPLE_TEXTS
+    result = benchmark(sample, repeat=args.repeat)
+    print(f"対象本文: {result['texts']}件")
+    print(f"emojiライブラリのインポート時間: {result['emoji_import_ms']:.1f} ms")
+    print(f"従来実装: {result['legacy_us_per_call']:.2f} µs/回")
+    print(f"コードポイント表: {result['table_us_per_call']:.2f} µs/回")
+    print(f"判定の不一致: {len(result['disagreements'])}件")
+    for text in result['disagreements'][:20]:
+        print(f"  {text!r}")
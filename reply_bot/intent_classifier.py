@@ -0,0 +1,315 @@
+"""
+定型リプライのインテント判定
+挨拶・感謝・笑い・おやすみ・絵文字のみのリアクションを、AIを呼ばずに判定して
+config.py の定型フレーズに対応付ける
+"""
+
+import argparse
+import csv
+import glob
+import logging
+import random
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List
+
+from .config import INTENT_MAX_RESIDUAL_CHARS, INTENT_MARKER_MAX_RESIDUAL_CHARS, INTENT_REPLY_PHRASES, THANK_YOU_PHRASES
+from .emoji_table import is_emoji_only, strip_emoji
+from .reply_cache import normalize_reply_text
+from .text_automaton import AhoCorasick
+
+# (パターン, インテント, 言語, 文中のどこにあっても判定するか)
+# パターンは normalize_reply_text() 後の表記（NFKC・小文字）で記述する
+INTENT_PATTERNS = [
+    # 日本語の挨拶は従来通り文中のどこにあっても定型返信とする（ニックネーム登録済みのユーザーを除く）
+    ("おはよう", "morning", "ja", True),
+    ("おはよー", "morning", "ja", True),
+    ("こんにちは", "hello", "ja", True),
+    ("こんばんは", "evening", "ja", True),
+    ("おやすみ", "good_night", "ja", False),
+    ("ありがと", "thanks", "ja", False),
+    ("あざす", "thanks", "ja", False),
+    ("感謝", "thanks", "ja", False),
+    ("笑", "laughter", "ja", False),
+    ("ww", "laughter", "ja", False),
+    ("草", "laughter", "ja", False),
+    # 英語
+    ("good morning", "morning", "en", False),
+    ("morning", "morning", "en", False),
+    ("gm", "morning", "en", False),
+    ("hello", "hello", "en", False),
+    ("hi", "hello", "en", False),
+    ("hii", "hello", "en", False),
+    ("hey", "hello", "en", False),
+    ("good evening", "evening", "en", False),
+    ("good night", "good_night", "en", False),
+    ("goodnight", "good_night", "en", False),
+    ("gn", "good_night", "en", False),
+    ("sweet dreams", "good_night", "en", False),
+    ("thank you", "thanks", "en", False),
+    ("thanks", "thanks", "en", False),
+    ("thx", "thanks", "en", False),
+    ("ty", "thanks", "en", False),
+    ("lol", "laughter", "en", False),
+    ("lmao", "laughter", "en", False),
+    ("haha", "laughter", "en", False),
+    ("hehe", "laughter", "en", False),
+    # スペイン語
+    ("buenos dias", "morning", "es", False),
+    ("buenos días", "morning", "es", False),
+    ("buen dia", "morning", "es", False),
+    ("buen día", "morning", "es", False),
+    ("hola", "hello", "es", False),
+    ("buenas tardes", "evening", "es", False),
+    ("buenas noches", "good_night", "es", False),
+    ("gracias", "thanks", "es", False),
+    ("jaja", "laughter", "es", False),
+    ("jeje", "laughter", "es", False),
+    # インドネシア語
+    ("selamat pagi", "morning", "in", False),
+    ("halo", "hello", "in", False),
+    ("hai", "hello", "in", False),
+    ("selamat malam", "evening", "in", False),
+    ("selamat tidur", "good_night", "in", False),
+    ("terima kasih", "thanks", "in", False),
+    ("makasih", "thanks", "in", False),
+    ("wkwk", "laughter", "in", False),
+    # ポルトガル語
+    ("bom dia", "morning", "pt", False),
+    ("olá", "hello", "pt", False),
+    ("ola", "hello", "pt", False),
+    ("oi", "hello", "pt", False),
+    ("boa tarde", "evening", "pt", False),
+    ("boa noite", "good_night", "pt", False),
+    ("obrigado", "thanks", "pt", False),
+    ("obrigada", "thanks", "pt", False),
+    ("kkk", "laughter", "pt", False),
+    # トルコ語
+    ("günaydın", "morning", "tr", False),
+    ("gunaydin", "morning", "tr", False),
+    ("merhaba", "hello", "tr", False),
+    ("selam", "hello", "tr", False),
+    ("iyi akşamlar", "evening", "tr", False),
+    ("iyi geceler", "good_night", "tr", False),
+    ("teşekkürler", "thanks", "tr", False),
+    ("teşekkür ederim", "thanks", "tr", False),
+    ("sağ ol", "thanks", "tr", False),
+    # フランス語
+    ("bonjour", "morning", "fr", False),
+    ("salut", "hello", "fr", False),
+    ("coucou", "hello", "fr", False),
+    ("bonsoir", "evening", "fr", False),
+    ("bonne nuit", "good_night", "fr", False),
+    ("merci", "thanks", "fr", False),
+    ("mdr", "laughter", "fr", False),
+    # ドイツ語
+    ("guten morgen", "morning", "de", False),
+    ("hallo", "hello", "de", False),
+    ("guten abend", "evening", "de", False),
+    ("gute nacht", "good_night", "de", False),
+    ("danke", "thanks", "de", False),
+    # 中国語
+    ("早上好", "morning", "zh", False),
+    ("早安", "morning", "zh", False),
+    ("你好", "hello", "zh", False),
+    ("晚上好", "evening", "zh", False),
+    ("晚安", "good_night", "zh", False),
+    ("谢谢", "thanks", "zh", False),
+    ("哈哈", "laughter", "zh", False),
+    # 韓国語
+    ("좋은 아침", "morning", "ko", False),
+    ("안녕하세요", "hello", "ko", False),
+    ("안녕", "hello", "ko", False),
+    ("좋은 저녁", "evening", "ko", False),
+    ("잘자", "good_night", "ko", False),
+    ("잘 자", "good_night", "ko", False),
+    ("감사합니다", "thanks", "ko", False),
+    ("고마워", "thanks", "ko", False),
+    ("ㅋㅋ", "laughter", "ko", False),
+    ("ㅎㅎ", "laughter", "ko", False),
+]
+
+# 本文の末尾に付くことの多い笑い記号。これだけが一致した場合は、ほぼ記号のみのリプライに限って定型返信とする
+# （「素敵な写真ですね笑」のような本文付きのリプライはAIで返信する）
+MARKER_PATTERNS = {"笑", "ww", "草"}
+
+# 複数のインテントに一致した場合の優先順位
+INTENT_PRIORITY = ["good_night", "morning", "evening", "hello", "thanks", "laughter"]
+
+_automaton: AhoCorasick | None = None
+
+def _get_automaton() -> AhoCorasick:
+    """パターン表からオートマトンを1度だけ構築します。"""
+    global _automaton
+    if _automaton is None:
+        automaton = AhoCorasick()
+        for pattern, intent, lang, anywhere in INTENT_PATTERNS:
+            automaton.add(pattern, (intent, lang, anywhere))
+        _automaton = automaton.build()
+    return _automaton
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() and ord(char) < 0x3000
+
+def _is_filler_char(char: str) -> bool:
+    """記号・空白など、本文の意味を持たない文字かどうか"""
+    return unicodedata.category(char)[0] in ('S', 'P', 'Z', 'M', 'C')
+
+def _prepare_text(text: str) -> str:
+    normalized = normalize_reply_text(text)
+    # 「hahaha」「jajaja」のような2文字単位の繰り返しを2回に揃える
+    return re.sub(r'(\w\w)\1+', r'\1\1', normalized)
+
+def classify_intent(text: str, lang: str | None = None, has_nickname: bool = False) -> Dict | None:
+    """
+    リプライ本文のインテントを判定します。
+    ニックネーム登録済みのユーザー（has_nickname=True）は、従来通り文中の挨拶だけでは定型返信とせず、
+    他のインテントと同じく定型表現以外の文字が INTENT_MAX_RESIDUAL_CHARS 以下の場合に限ります。
+
+    Returns:
+        Dict | None: {"intent", "lang", "matched", "residual"}。定型と判定できなければNone。
+    """
+    if not text or not isinstance(text, str):
+        return None
+    if is_emoji_only(text):
+        return {"intent": "emoji_reaction", "lang": "qme", "matched": [], "residual": 0}
+    # 絵文字は判定に使わないため、照合前に取り除く
+    prepared = _prepare_text(strip_emoji(text))
+    if not prepared:
+        return None
+
+    covered = [False] * len(prepared)
+    hits = []
+    for start, end, pattern, (intent, pattern_lang, anywhere) in _get_automaton().iter_matches(prepared):
+        # ラテン文字のパターンは単語境界でのみ一致させる
+        if pattern[0].isascii() and start > 0 and _is_word_char(prepared[start - 1]):
+            continue
+        if pattern[-1].isascii() and end < len(prepared) and _is_word_char(prepared[end]):
+            continue
+        hits.append((intent, pattern_lang, anywhere, pattern))
+        for i in range(start, end):
+            covered[i] = True
+
+    residual = sum(
+        1 for char, is_covered in zip(prepared, covered)
+        if not is_covered and not _is_filler_char(char)
+    )
+    if not hits:
+        return None
+
+    is_question = '?' in prepared
+    short_enough = residual <= INTENT_MAX_RESIDUAL_CHARS and not is_question
+    marker_only = residual <= INTENT_MARKER_MAX_RESIDUAL_CHARS and not is_question
+    eligible = [
+        hit for hit in hits
+        if (hit[2] and not has_nickname) or (marker_only if hit[3] in MARKER_PATTERNS else short_enough)
+    ]
+    if not eligible:
+        return None
+
+    eligible.sort(key=lambda hit: INTENT_PRIORITY.index(hit[0]))
+    intent, pattern_lang, _, _ = eligible[0]
+    # 対象言語のパターンが一致していればそちらを優先する
+    for hit in eligible:
+        if hit[0] == intent and hit[1] == lang:
+            pattern_lang = lang
+            break
+    return {
+        "intent": intent,
+        "lang": pattern_lang,
+        "matched": [hit[3] for hit in eligible],
+        "residual": residual,
+    }
+
+def choose_intent_reply(intent_result: Dict, lang: str, nickname: str | None = None) -> str | None:
+    """
+    インテントに対応する定型フレーズを選択します。
+    ニックネーム登録済みのユーザーには、通常の返信と同じくニックネームを冒頭に付けます。
+    """
+    intent = intent_result["intent"]
+    if intent == "emoji_reaction":
+        phrases = THANK_YOU_PHRASES.get("qme")
+    else:
+        pool = INTENT_REPLY_PHRASES.get(intent, {})
+        phrases = pool.get(lang) or pool.get(intent_result["lang"])
+        if not phrases and intent == "thanks":
+            phrases = THANK_YOU_PHRASES.get(lang) or THANK_YOU_PHRASES.get(intent_result["lang"])
+    if not phrases:
+        return None
+    phrase = random.choice(phrases)
+    return f"{nickname}\n{phrase}" if nickname else phrase
+
+# --- 過去データに対するカバレッジ集計 ---
+
+def _clean_reply_text(text: str) -> str:
+    """generate_reply と同じ前処理（メンション・先頭記号の除去）"""
+    cleaned = re.sub(r'@[\w_]+', '', text).strip()
+    return re.sub(r'^[…,:・、。]', '', cleaned).strip()
+
+def _legacy_fast_path(text: str, lang: str, has_nickname: bool) -> bool:
+    """インテント判定導入前の generate_reply の定型返信条件"""
+    if not has_nickname and any(k in text for k in ("おはよう", "おはよー", "こんにちは", "こんばんは")):
+        return True
+    if is_emoji_only(text) or (lang != "ja" and len(text) <= 15):
+        return True
+    return lang == "ja" and not has_nickname and len(text) <= 15
+
+def coverage_report(csv_paths: List[str]) -> Dict:
+    """
+    過去の processed_replies_*.csv を対象に、インテント判定で削減できたAI呼び出し数を集計します。
+    言語はCSVの lang 列（ツイートのlang属性）を使うため、実行時の言語判定とは若干異なる場合があります。
+    """
+    from .db import get_user_preferences_many
+
+    report = {
+        "files": 0, "target_rows": 0, "legacy_fast_path": 0,
+        "legacy_llm_calls": 0, "saved_llm_calls": 0, "by_intent": Counter(),
+    }
+    for path in csv_paths:
+        report["files"] += 1
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            rows = [
+                row for row in csv.DictReader(f)
+                if str(row.get('is_my_thread', '')).strip().lower() in ('true', '1')
+            ]
+        # ニックネーム登録の有無はファイルごとにまとめて問い合わせる
+        try:
+            registered = get_user_preferences_many((row.get('UserID') or '').lower() for row in rows)
+        except Exception:
+            registered = {}
+        for row in rows:
+            text = _clean_reply_text(row.get('contents') or '')
+            lang = row.get('lang') or 'und'
+            has_nickname = (row.get('UserID') or '').lower() in registered
+
+            report["target_rows"] += 1
+            if _legacy_fast_path(text, lang, has_nickname):
+                report["legacy_fast_path"] += 1
+                continue
+            report["legacy_llm_calls"] += 1
+            result = classify_intent(text, lang, has_nickname)
+            if result:
+                report["saved_llm_calls"] += 1
+                report["by_intent"][result["intent"]] += 1
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="定型リプライ判定で削減できるAI呼び出し数を過去のCSVから集計します。")
+    parser.add_argument("csv_files", nargs='*', help="集計対象のCSV（指定しない場合は output/processed_replies_*.csv）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    paths = args.csv_files or sorted(glob.glob("output/processed_replies_*.csv"))
+    if not paths:
+        logging.error("集計対象のCSVファイルが見つかりません。")
+    else:
+        result = coverage_report(paths)
+        legacy_calls = result["legacy_llm_calls"]
+        saved = result["saved_llm_calls"]
+        rate = (saved / legacy_calls * 100) if legacy_calls else 0.0
+        print(f"対象ファイル数: {result['files']}")
+        print(f"返信生成対象: {result['target_rows']}件 (従来の定型返信: {result['legacy_fast_path']}件)")
+        print(f"従来のAI呼び出し: {legacy_calls}件 -> 削減可能: {saved}件 ({rate:.1f}%)")
+        for intent, count in result["by_intent"].most_common():
+            print(f"  {intent}: {count}件")
@@ -7,68 +7,140 @@ import argparse # argparseをインポート
 from .csv_generator import main_process as csv_generator_main
 from .reply_processor import main_process as reply_processor_main
 from .post_reply import main_process as post_reply_main
-from .config import HOURS_TO_COLLECT, POST_INTERVAL_SECONDS
+from .single_visit import main_process as single_visit_main
+from .config import HOURS_TO_COLLECT, POST_INTERVAL_SECONDS, TIMELINE_LIKE_ENABLED, STREAMING_ENABLED
+from .db import init_db, run_exists
+from .retention import run_retention_if_due
+from .run_store import import_csv, get_summary
+from .stream_pipeline import run_streaming
+from .worker_pool import analyze_run
+from .mention_daemon import run_daemon
 from .utils import setup_driver, close_driver
 
 # ロギング設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def main(timestamp_str: str | None = None, hours_arg: int | None = None, live_run: bool = False, headless: bool = False):
+def _resume_run(run_id: str, from_stage: int) -> str | None:
+    """
+    途中のステップから再実行するランを用意します。ランストアに無い場合は、
+    同じタイムスタンプの extracted_tweets / processed_replies のCSVを取り込みます。
+    """
+    init_db()
+    if run_exists(run_id):
+        return run_id
+    candidates = [os.path.join('output', f'extracted_tweets_{run_id}.csv')]
+    if from_stage >= 3:
+        candidates.insert(0, os.path.join('output', f'processed_replies_{run_id}.csv'))
+    for path in candidates:
+        if os.path.exists(path):
+            return import_csv(path)
+    return None
+
+def main(timestamp_str: str | None = None, hours_arg: int | None = None, live_run: bool = False, headless: bool = False,
+         single_visit: bool = False, from_stage: int = 1, stream: bool = STREAMING_ENABLED, workers: int = 0):
     """
     自動返信システムのメイン処理フローを制御します。
+    ステップ間のリプライはランストア（run_id はタイムスタンプ）で受け渡します。
+    single_visit=True の場合、ステップ2と3を1回のページ訪問でまとめて行います。
+    from_stage=2/3 の場合、timestamp_str のランのそのステップから再実行します。
+    stream=True の場合、ステップ1の収集中に2つ目のブラウザでステップ2を並行して進めます。
+    workers>1 の場合、ステップ2をその数のワーカープロセス（プロファイルの複製で起動したChrome）で行います。
     """
     logging.info("=== 自動返信システムを開始します ===")
     
     driver = None
     try:
-        # 最初にWebDriverを一度だけセットアップ
-        driver = setup_driver(headless=headless)
-        if not driver:
-            logging.error("WebDriverの初期化に失敗しました。処理を中断します。")
-            return
-
-        # --------------------------------------------------------------------------
-        # ステップ1: 通知ページからリプライを取得し、CSVを生成
-        # --------------------------------------------------------------------------
-        logging.info("--- [ステップ1/3] リプライの取得とCSV生成を開始します ---")
-        
-        # タイムスタンプの決定ロジック
+        # タイムスタンプ（= run_id）の決定ロジック
         if timestamp_str:
             timestamp = timestamp_str
             logging.info(f"指定されたタイムスタンプを使用します: {timestamp}")
+        elif from_stage > 1:
+            logging.error("--from-stage を指定する場合は --timestamp で再実行するランを指定してください。")
+            return
         else:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             logging.info(f"新しいタイムスタンプを生成しました: {timestamp}")
 
-        initial_csv_path_template = os.path.join('output', f'extracted_tweets_{timestamp}.csv')
-        
-        # 引数で時間が指定されていればそれを使い、なければconfigから読み込む
-        hours_to_use = hours_arg if hours_arg is not None else HOURS_TO_COLLECT
-        logging.info(f"データ収集期間: 過去 {hours_to_use} 時間")
+        # 最初にWebDriverを一度だけセットアップ
+        driver = setup_driver(headless=headless)
+        if not driver:
+            logging.error("WebDriverの初期化に失敗しました。処理を中断します。")
+            return
+
+        if from_stage <= 1:
+            # ----------------------------------------------------------------------
+            # ステップ1: 通知ページからリプライを取得し、ランストア（とCSV）に保存
+            # ----------------------------------------------------------------------
+            logging.info("--- [ステップ1/3] リプライの取得とCSV生成を開始します ---")
+            initial_csv_path_template = os.path.join('output', f'extracted_tweets_{timestamp}.csv')
+
+            # 引数で時間が指定されていればそれを使い、なければconfigから読み込む
+            hours_to_use = hours_arg if hours_arg is not None else HOURS_TO_COLLECT
+            logging.info(f"データ収集期間: 過去 {hours_to_use} 時間")
 
-        initial_csv_path = csv_generator_main(
-            driver=driver,
-            output_csv_path=initial_csv_path_template, 
-            hours_to_collect=hours_to_use
-        )
+            if stream and not single_visit and workers <= 1:
+                # ステップ1の収集中に、2つ目のブラウザでステップ2を新しいリプライから順に進める
+                logging.info("--- [ステップ1-2/3] 収集とスレッド解析・返信生成を並行して実行します ---")
+                run_id = run_streaming(
+                    driver, timestamp, initial_csv_path_template, hours_to_collect=hours_to_use,
+                    like_in_timeline=TIMELINE_LIKE_ENABLED, dry_run=not live_run, headless=headless
+                )
+                if not run_id:
+                    logging.error("ステップ1-2の処理に失敗しました。処理を中断します。")
+                    return
+                logging.info(f"スレッド解析と返信生成の結果をラン {run_id} に保存しました: {get_summary(run_id)}")
+                from_stage = 3
+            else:
+                initial_csv_path = csv_generator_main(
+                    driver=driver,
+                    output_csv_path=initial_csv_path_template, 
+                    hours_to_collect=hours_to_use,
+                    like_in_timeline=TIMELINE_LIKE_ENABLED,
+                    dry_run=not live_run,
+                    run_id=timestamp
+                )
+
+                if not initial_csv_path:
+                    logging.error("ステップ1でリプライを取得できませんでした。処理を中断します。")
+                    return
+                run_id = timestamp
+                logging.info(f"リプライ一覧をラン {run_id} に保存しました: {get_summary(run_id)}")
+        else:
+            run_id = _resume_run(timestamp, from_stage)
+            if not run_id:
+                logging.error(f"再実行するラン {timestamp} が見つかりません。処理を中断します。")
+                return
+            logging.info(f"ラン {run_id} のステップ{from_stage}から再実行します: {get_summary(run_id)}")
         
-        if not initial_csv_path or not os.path.exists(initial_csv_path):
-            logging.error("ステップ1でCSVファイルが生成されませんでした。処理を中断します。")
+        if single_visit and from_stage <= 2:
+            # ----------------------------------------------------------------------
+            # ステップ2+3: 1回のページ訪問で解析・返信生成・いいね・返信投稿
+            # ----------------------------------------------------------------------
+            logging.info("--- [ステップ2-3/3] 1回訪問モードで解析・返信生成・投稿を開始します ---")
+            if live_run:
+                logging.warning("*** LIVE-RUN モードで実行します。実際に投稿・いいねが行われます ***")
+            else:
+                logging.info("ドライランモードで実行します。実際の投稿・いいねは行われません。")
+            if single_visit_main(driver, dry_run=not live_run, interval=POST_INTERVAL_SECONDS, run_id=run_id):
+                logging.info(f"処理結果をラン {run_id} に保存しました: {get_summary(run_id)}")
+            logging.info("=== 全ての処理が正常に完了しました ===")
             return
-        logging.info(f"リプライ一覧を {initial_csv_path} に保存しました。")
-        
-        
-        # --------------------------------------------------------------------------
-        # ステップ2: スレッド解析と返信生成
-        # --------------------------------------------------------------------------
-        logging.info("--- [ステップ2/3] スレッド解析と返信生成を開始します ---")
-        processed_csv_path = reply_processor_main(driver, initial_csv_path)
         
-        if not processed_csv_path or not os.path.exists(processed_csv_path):
-            logging.warning("ステップ2で処理済みCSVファイルが生成されませんでした。後続処理をスキップします。")
-            logging.info("=== 自動返信システムを終了します ===")
-            return
-        logging.info(f"スレッド解析と返信生成の結果を {processed_csv_path} に保存しました。")
+        if from_stage <= 2:
+            # ----------------------------------------------------------------------
+            # ステップ2: スレッド解析と返信生成
+            # ----------------------------------------------------------------------
+            logging.info("--- [ステップ2/3] スレッド解析と返信生成を開始します ---")
+            if workers > 1:
+                logging.info(f"{workers} 個のワーカープロセスでスレッドを解析します。")
+                stage2_run_id = analyze_run(driver, run_id, workers=workers, headless=headless)
+            else:
+                stage2_run_id = reply_processor_main(driver, run_id=run_id)
+            if not stage2_run_id:
+                logging.warning("ステップ2の処理に失敗しました。後続処理をスキップします。")
+                logging.info("=== 自動返信システムを終了します ===")
+                return
+            logging.info(f"スレッド解析と返信生成の結果をラン {run_id} に保存しました: {get_summary(run_id)}")
             
 
         # --------------------------------------------------------------------------
@@ -81,7 +153,7 @@ def main(timestamp_str: str | None = None, hours_arg: int | None = None, live_ru
             logging.warning("*** LIVE-RUN モードで実行します。実際に投稿・いいねが行われます ***")
         else:
             logging.info("ドライランモードで実行します。実際の投稿・いいねは行われません。")
-        post_reply_main(driver, processed_csv_path, dry_run=is_dry_run, interval=POST_INTERVAL_SECONDS)
+        post_reply_main(driver, dry_run=is_dry_run, interval=POST_INTERVAL_SECONDS, run_id=run_id)
         
         logging.info("=== 全ての処理が正常に完了しました ===")
     
@@ -91,6 +163,8 @@ def main(timestamp_str: str | None = None, hours_arg: int | None = None, live_ru
         # 全ての処理が終了したら、WebDriverを閉じる
         logging.info("WebDriverを終了します。")
         close_driver()
+        # 前回から RETENTION_INTERVAL_HOURS 以上経っていれば、DBのアーカイブ・削除・圧縮を行う
+        run_retention_if_due()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Twitter自動返信システムのメインコントローラー")
@@ -116,6 +190,40 @@ if __name__ == "__main__":
         action='store_true',
         help="このフラグを立てると、ブラウザをヘッドレスモード（非表示）で起動します。"
     )
+    parser.add_argument(
+        "--single-visit",
+        action='store_true',
+        help="このフラグを立てると、スレッド解析と投稿を1回のページ訪問で行います（ステップ2と3の統合）。"
+    )
+    parser.add_argument(
+        "--from-stage",
+        type=int,
+        choices=[1, 2, 3],
+        default=1,
+        help="指定したステップから再実行します（2: スレッド解析から、3: 投稿から）。--timestamp で対象のランを指定してください。"
+    )
+    parser.add_argument(
+        "--stream",
+        action=argparse.BooleanOptionalAction,
+        default=STREAMING_ENABLED,
+        help="ステップ1の収集中に、2つ目のブラウザで新しいリプライから順にスレッド解析・返信生成を行います。"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="ステップ2のスレッド解析を指定した数のブラウザプロセスで並列に行います（停止明けのバックログ処理向け。--stream とは併用しません）。"
+    )
+    parser.add_argument(
+        "--daemon",
+        action='store_true',
+        help="常駐モードで起動します。ブラウザを保持したまま通知をポーリングし、新着のリプライをその都度解析・返信します（--hours は初回起動時の収集期間）。"
+    )
     args = parser.parse_args()
 
-    main(timestamp_str=args.timestamp, hours_arg=args.hours, live_run=args.live_run, headless=args.headless)
\ No newline at end of file
+    if args.daemon:
+        run_daemon(hours_to_collect=args.hours, live_run=args.live_run, headless=args.headless)
+    else:
+        main(timestamp_str=args.timestamp, hours_arg=args.hours, live_run=args.live_run, headless=args.headless,
+             single_visit=args.single_visit, from_stage=args.from_stage, stream=args.stream,
+             workers=args.workers)
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""
+常駐モード（python -m reply_bot.main --daemon）
+WebDriver・DB接続・AIのモデルを保持したまま通知（メンション）ページをポーリングし、新着のリプライを
+その都度1つのランにして、スレッド解析・返信生成（ステップ2）といいね・返信（ステップ3）まで進める。
+ポーリングの間隔は新着があれば縮め、無ければ延ばす。最新の既知のリプライと処理中のランをチェックポイントに
+記録し、再起動時は処理中のランの続きから再開する。常駐ブラウザに接続している場合は、常駐ブラウザの再起動を
+妨げないよう待機中だけ接続を切り離す。Ctrl+C・SIGTERM・DAEMON_STOP_FILE で、処理中のサイクルを
+終えてから終了する。
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import signal
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import psutil
+import pytz
+
+from .config import (
+    HOURS_TO_COLLECT, POST_INTERVAL_SECONDS, DAEMON_POLL_MIN_SECONDS, DAEMON_POLL_MAX_SECONDS, DAEMON_POLL_BACKOFF,
+    DAEMON_KNOWN_IDS, DAEMON_STATE_FILE, DAEMON_STOP_FILE
+)
+from .csv_generator import poll_mentions
+from .db import init_db
+from .post_reply import main_process as post_reply_main
+from .reply_processor import main_process as reply_processor_main
+from .retention import run_retention_if_due
+from .run_store import start_run, add_rows, new_run_id, get_summary, iter_rows
+from .utils import setup_driver, close_driver, is_daemon_driver
+
+STATE_FILE = Path(DAEMON_STATE_FILE)
+STOP_FILE = Path(DAEMON_STOP_FILE)
+
+_MAX_RUN_ATTEMPTS = 3  # 処理中のランを再試行する回数（超えたらチェックポイントから外し、abandoned_runs に記録する）
+
+jst = pytz.timezone('Asia/Tokyo')
+
+def load_state() -> dict:
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state: dict):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = STATE_FILE.with_suffix(STATE_FILE.suffix + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+def is_running(state: dict | None = None) -> bool:
+    state = load_state() if state is None else state
+    pid = state.get("pid")
+    return bool(pid) and pid != os.getpid() and psutil.pid_exists(pid)
+
+def next_interval(interval: float, found: int) -> float:
+    """新着があれば間隔を半分に、無ければ DAEMON_POLL_BACKOFF 倍にします（上下限の範囲内）。"""
+    interval = interval / 2 if found else interval * DAEMON_POLL_BACKOFF
+    return min(DAEMON_POLL_MAX_SECONDS, max(DAEMON_POLL_MIN_SECONDS, interval))
+
+
+class MentionDaemon:
+    """
+    通知（メンション）ページのポーリングと、新着のリプライのステップ2・3を繰り返す常駐プロセス
+    """
+
+    def __init__(self, hours_to_collect: int | None = None, live_run: bool = False, headless: bool = False):
+        self.hours_to_collect = hours_to_collect if hours_to_collect is not None else HOURS_TO_COLLECT
+        self.live_run = live_run
+        self.headless = headless
+        self.driver = None
+        self.state = load_state()
+        self.known_ids = set(self.state.get("known_ids", []))
+        self._stopping = False
+
+    def _request_stop(self, *args):
+        if self._stopping:
+            raise KeyboardInterrupt
+        self._stopping = True
+        logging.info("終了の指示を受けました。処理中のサイクルを終えてから終了します（もう一度 Ctrl+C で中断します）。")
+
+    def _stop_requested(self) -> bool:
+        if STOP_FILE.exists():
+            STOP_FILE.unlink(missing_ok=True)
+            self._request_stop()
+        return self._stopping
+
+    def _wait(self, seconds: float):
+        """seconds 秒待ちます。終了の指示があれば途中で戻ります。"""
+        deadline = time.monotonic() + seconds
+        while not self._stop_requested() and time.monotonic() < deadline:
+            time.sleep(1)
+
+    def _checkpoint(self):
+        # tweet_id は時刻順に増えるため、大きいものから DAEMON_KNOWN_IDS 件を残す
+        known = sorted(self.known_ids, key=int)[-DAEMON_KNOWN_IDS:]
+        self.known_ids = set(known)
+        self.state["known_ids"] = known
+        save_state(self.state)
+
+    def _ensure_driver(self) -> bool:
+        """WebDriverが応答しなければ起動し直します。"""
+        if self.driver:
+            try:
+                _ = self.driver.current_url
+                return True
+            except Exception as e:
+                logging.warning(f"WebDriverが応答しないため起動し直します: {e}")
+                try:
+                    close_driver()
+                except Exception as close_error:
+                    logging.warning(f"WebDriverの終了中にエラー: {close_error}")
+                self.driver = None
+        self.driver = setup_driver(headless=self.headless)
+        return self.driver is not None
+
+    def _release_driver(self):
+        """
+        常駐ブラウザに接続している場合は、ポーリングの待機中に切り離して利用中の印（リース）を外します。
+        リースを持ったままだと、常駐ブラウザのメモリ使用量・起動時間による再起動が行われないためです。
+        次のサイクルの _ensure_driver で接続し直します。自前で起動したWebDriverはそのまま保持します。
+        """
+        if not self.driver or not is_daemon_driver():
+            return
+        try:
+            close_driver()
+        except Exception as e:
+            logging.warning(f"常駐ブラウザからの切り離し中にエラー: {e}")
+        self.driver = None
+
+    def _since(self) -> datetime:
+        last_seen_at = self.state.get("last_seen_at")
+        if last_seen_at:
+            return datetime.fromisoformat(last_seen_at)
+        return datetime.now(jst) - timedelta(hours=self.hours_to_collect)
+
+    def process_run(self, run_id: str):
+        """ランのステップ2・3を行い、終わったらチェックポイントから外します。"""
+        attempts = self.state.get("pending_attempts", 0) + 1
+        self.state["pending_attempts"] = attempts
+        self._checkpoint()
+        logging.info(f"--- ラン {run_id} のスレッド解析・返信生成を開始します ({attempts} 回目): {get_summary(run_id)} ---")
+        if not reply_processor_main(self.driver, run_id=run_id):
+            if attempts >= _MAX_RUN_ATTEMPTS:
+                self._abandon_run(run_id, attempts)
+            return
+        if self._stop_requested():
+            logging.info(f"ラン {run_id} のいいね・返信は次回の起動時に行います。")
+            return
+        logging.info(f"--- ラン {run_id} のいいね・返信を開始します ---")
+        post_reply_main(self.driver, dry_run=not self.live_run, interval=POST_INTERVAL_SECONDS, run_id=run_id)
+        self.state.update(pending_run_id=None, pending_attempts=0)
+        self.state["processed_runs"] = self.state.get("processed_runs", 0) + 1
+        self._checkpoint()
+        logging.info(f"ラン {run_id} の処理が完了しました: {get_summary(run_id)}")
+
+    def _abandon_run(self, run_id: str, attempts: int):
+        """
+        再試行の上限に達したランをチェックポイントから外します。ランの行はランストアに残るため、
+        abandoned_runs に記録して手動で再実行できるようにします。
+        """
+        reply_ids = [row["reply_id"] for row in iter_rows(run_id)]
+        logging.error(
+            f"ラン {run_id} の処理に {attempts} 回失敗したため、チェックポイントから外します。"
+            f"対象のリプライ ({len(reply_ids)} 件): {', '.join(reply_ids)}"
+        )
+        logging.error(f"  -> 再実行する場合: python -m reply_bot.main --timestamp {run_id} --from-stage 2")
+        self.state.setdefault("abandoned_runs", []).append(run_id)
+        self.state.update(pending_run_id=None, pending_attempts=0)
+        self._checkpoint()
+
+    def run_cycle(self) -> int:
+        """
+        処理中のランがあれば続きを行い、新着をポーリングして処理します。新着の件数を返します。
+        処理中のランが失敗して残っている間は、新着のランで上書きしないようポーリングを行いません。
+        """
+        pending = self.state.get("pending_run_id")
+        if pending:
+            self.process_run(pending)
+            if self._stopping:
+                return 0
+            if self.state.get("pending_run_id"):
+                logging.warning(f"ラン {pending} が未完了のため、新着のポーリングは次のサイクルで行います。")
+                return 0
+
+        rows, newest = poll_mentions(self.driver, self.known_ids, self._since())
+        if rows:
+            # 新着をランに保存してからチェックポイントを進める（途中で止まっても再起動時に続きから処理できる）
+            run_id = start_run(new_run_id(), source="mention_daemon")
+            add_rows(run_id, rows)
+            self.state.update(pending_run_id=run_id, pending_attempts=0)
+        if newest and datetime.fromisoformat(newest) > self._since():
+            self.state["last_seen_at"] = newest
+        self._checkpoint()
+        if rows:
+            self.process_run(self.state["pending_run_id"])
+        return len(rows)
+
+    def serve(self):
+        """終了の指示まで、ポーリングと処理を繰り返します。"""
+        if is_running(self.state):
+            logging.error(f"常駐モードは既に起動しています (pid {self.state['pid']})。")
+            return
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        STOP_FILE.unlink(missing_ok=True)
+        init_db()
+        interval = self.state.get("interval") or DAEMON_POLL_MIN_SECONDS
+        self.state.update(pid=os.getpid(), started_at=datetime.now().isoformat(), live_run=self.live_run)
+        self._checkpoint()
+        logging.info(
+            f"=== 常駐モードを開始します（{'LIVE-RUN' if self.live_run else 'ドライラン'}, "
+            f"ポーリング間隔 {DAEMON_POLL_MIN_SECONDS}〜{DAEMON_POLL_MAX_SECONDS} 秒） ==="
+        )
+        try:
+            while not self._stop_requested():
+                found = 0
+                if self._ensure_driver():
+                    try:
+                        found = self.run_cycle()
+                    except Exception as e:
+                        logging.error(f"常駐モードのサイクル中にエラー: {e}", exc_info=True)
+                else:
+                    logging.error("WebDriverの初期化に失敗しました。次のポーリングで再試行します。")
+                interval = next_interval(interval, found)
+                self.state.update(interval=interval, last_poll_at=datetime.now().isoformat(),
+                                  cycles=self.state.get("cycles", 0) + 1)
+                self._checkpoint()
+                run_retention_if_due()
+                if self._stopping:
+                    break
+                wait_seconds = interval * random.uniform(0.9, 1.1)
+                logging.info(f"新着 {found} 件。次のポーリングまで {wait_seconds:.0f} 秒待機します。")
+                self._release_driver()
+                self._wait(wait_seconds)
+        except KeyboardInterrupt:
+            logging.warning("常駐モードを中断しました。処理中のランは次回の起動時に続きから処理します。")
+        finally:
+            self.state["pid"] = None
+            self._checkpoint()
+            if self.driver:
+                close_driver()
+            logging.info("=== 常駐モードを終了しました ===")
+
+def run_daemon(hours_to_collect: int | None = None, live_run: bool = False, headless: bool = False):
+    MentionDaemon(hours_to_collect, live_run, headless).serve()
+
+def stop_daemon() -> bool:
+    """常駐モードに終了を伝えます（処理中のサイクルを終えてから終了します）。"""
+    if not is_running():
+        return False
+    STOP_FILE.parent.mkdir(parents=True, exist_ok=True)
+    STOP_FILE.touch()
+    return True
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="常駐モードの状態の確認と終了（起動は python -m reply_bot.main --daemon）")
+    parser.add_argument("--stop", action='store_true', help="常駐モードに終了を伝えます")
+    args = parser.parse_args()
+
+    if args.stop:
+        print("終了を伝えました。" if stop_daemon() else "常駐モードは起動していません。")
+    else:
+        state = load_state()
+        print(f"状態: {'起動中 (pid ' + str(state['pid']) + ')' if is_running(state) else '停止中'}")
+        for key in ("started_at", "last_poll_at", "last_seen_at", "interval", "cycles", "processed_runs", "pending_run_id", "abandoned_runs"):
+            print(f"  {key}: {state.get(key)}")
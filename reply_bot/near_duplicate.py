@@ -0,0 +1,299 @@
+"""
+過去の返信との類似チェック（MinHash / LSH）
+replied テーブルに記録された投稿済み返信から文字シングルのMinHash署名を作り、
+生成した返信が直近N日の返信とほぼ同じかどうかをバンド分割のLSHで高速に判定する
+"""
+
+import argparse
+import logging
+import random
+import re
+import time
+import unicodedata
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import numpy as np
+
+from .config import (
+    NEAR_DUP_ENABLED, NEAR_DUP_LOOKBACK_DAYS, NEAR_DUP_THRESHOLD, NEAR_DUP_NUM_PERM,
+    NEAR_DUP_BANDS, NEAR_DUP_SHINGLE_SIZE, NEAR_DUP_MIN_CHARS
+)
+from .db import (
+    get_replies_without_signature, add_reply_signatures, get_reply_signatures, clear_reply_signatures,
+    get_last_maintenance, set_last_maintenance
+)
+from .emoji_table import strip_emoji
+
+# ハッシュ関数族 h(x) = (a*x + b) mod p のための素数（積がint64に収まる大きさ）
+_MERSENNE_PRIME = (1 << 31) - 1
+# バンドの値を1つの整数キーにまとめるための乗数と、バンドごとにキーをずらす値
+_BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_BAND_SALT = np.uint64(0xD6E8FEB86659FD93)
+# 署名の計算方法（正規化）を変えたら更新する。保存済みの署名と異なる場合は load() で全て計算し直す
+_SIGNATURE_VERSION_TASK = "near_dup_signature_v3"
+
+def normalize_for_shingles(text: str, nickname: str | None = None) -> str:
+    """
+    類似判定用に返信本文を正規化します。
+    ニックネームの呼びかけ行（1行目が nickname と一致する場合のみ）・メンション・URL・絵文字・記号・空白を
+    取り除き、表記揺れを吸収します。本文だけを渡す場合は nickname を省略します。
+    """
+    if not text:
+        return ""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if nickname and len(lines) > 1 and lines[0].strip() == nickname.strip():
+        lines = lines[1:]
+    normalized = unicodedata.normalize('NFKC', strip_emoji("".join(lines))).lower()
+    normalized = re.sub(r'@[\w_]+', '', normalized)
+    normalized = re.sub(r'https?://\S+', '', normalized)
+    normalized = re.sub(r'(.)\1{2,}', r'\1\1', normalized)
+    return re.sub(r'[^\w]+', '', normalized)
+
+def _shingle_hashes(normalized: str, size: int) -> np.ndarray:
+    if len(normalized) <= size:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+    return np.fromiter(
+        (zlib.crc32(s.encode('utf-8')) & _MERSENNE_PRIME for s in shingles),
+        dtype=np.int64, count=len(shingles)
+    )
+
+
+class NearDuplicateIndex:
+    """
+    投稿済み返信のMinHash署名をLSHで索引化したインデックス
+
+    署名は NEAR_DUP_BANDS 個のバンドに分割し、各バンドを整数キーにして
+    全バンド分を1つのソート済み配列に持ちます。検索は二分探索1回で候補を集め、
+    候補の署名と一致率（推定Jaccard係数）を比べて判定します。
+    load() 以降に add() した返信は小さな辞書に保持し、一緒に検索します。
+    """
+
+    def __init__(self, num_perm: int = NEAR_DUP_NUM_PERM, bands: int = NEAR_DUP_BANDS,
+                 threshold: float = NEAR_DUP_THRESHOLD, shingle_size: int = NEAR_DUP_SHINGLE_SIZE):
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) は bands ({bands}) で割り切れる必要があります。")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+
+        rng = np.random.RandomState(1)  # 署名をDBに保存するため係数は固定
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=(num_perm, 1)).astype(np.int64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=(num_perm, 1)).astype(np.int64)
+        self._multipliers = _BAND_MULTIPLIER ** np.arange(self.rows, dtype=np.uint64)
+        self._salts = _BAND_SALT * np.arange(bands, dtype=np.uint64)[:, np.newaxis]
+
+        self._ids: List[str] = []
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._band_keys = np.empty(0, dtype=np.uint64)
+        self._band_rows = np.empty(0, dtype=np.int64)
+        self._pending_ids: List[str] = []
+        self._pending_signatures: List[np.ndarray] = []
+        self._pending_buckets: List[dict] = [{} for _ in range(bands)]
+
+    def signature(self, text: str, nickname: str | None = None) -> np.ndarray | None:
+        """本文のMinHash署名を計算します。短すぎる本文はNoneを返します。"""
+        normalized = normalize_for_shingles(text, nickname)
+        if len(normalized) < NEAR_DUP_MIN_CHARS:
+            return None
+        hashes = _shingle_hashes(normalized, self.shingle_size)
+        return ((self._a * hashes + self._b) % _MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+    def _band_keys_of(self, signatures: np.ndarray) -> np.ndarray:
+        """署名（N×num_perm）からバンドごとのキー（bands×N）を計算します。"""
+        banded = signatures.astype(np.uint64).reshape(len(signatures), self.bands, self.rows)
+        return (banded * self._multipliers).sum(axis=2, dtype=np.uint64).T + self._salts
+
+    def _build(self, ids: List[str], signatures: np.ndarray):
+        self._ids = ids
+        self._signatures = signatures
+        keys = self._band_keys_of(signatures).ravel()
+        order = np.argsort(keys, kind='stable')
+        self._band_keys = keys[order]
+        # 並べ替え後の各キーが何番目の署名のものか
+        self._band_rows = order % max(len(signatures), 1)
+        self._pending_ids = []
+        self._pending_signatures = []
+        self._pending_buckets = [{} for _ in range(self.bands)]
+
+    def load(self, days: int = NEAR_DUP_LOOKBACK_DAYS) -> "NearDuplicateIndex":
+        """直近の返信済みツイートの署名をDBから読み込みます。未計算の署名はここで計算・保存します。"""
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        try:
+            if not get_last_maintenance(_SIGNATURE_VERSION_TASK):
+                cleared = clear_reply_signatures()
+                set_last_maintenance(_SIGNATURE_VERSION_TASK)
+                if cleared:
+                    logging.info(f"類似チェック: 署名の計算方法が変わったため、{cleared} 件の署名を計算し直します。")
+            missing = get_replies_without_signature(since)
+            if missing:
+                rows = []
+                for tweet_id, reply_text, nickname in missing:
+                    signature = self.signature(reply_text, nickname)
+                    if signature is not None:
+                        rows.append((tweet_id, signature.tobytes()))
+                add_reply_signatures(rows)
+                logging.info(f"類似チェック: {len(rows)} 件の返信の署名を新たに計算しました。")
+
+            records = get_reply_signatures(since)
+            ids = [tweet_id for tweet_id, _ in records]
+            if records:
+                signatures = np.frombuffer(
+                    b"".join(blob for _, blob in records), dtype=np.uint32
+                ).reshape(len(records), self.num_perm)
+            else:
+                signatures = np.empty((0, self.num_perm), dtype=np.uint32)
+            self._build(ids, signatures)
+            logging.info(f"類似チェック: 直近 {days} 日の返信 {len(ids)} 件を読み込みました。")
+        except Exception as e:
+            logging.warning(f"類似チェック用の署名の読み込み中にエラー: {e}")
+        return self
+
+    def add(self, key: str, text: str, persist: bool = False, nickname: str | None = None):
+        """
+        返信をインデックスに追加します。
+        persist=True の場合は key をツイートIDとして署名をDBにも保存します。
+        """
+        signature = self.signature(text, nickname)
+        if signature is None:
+            return
+        index = len(self._pending_ids)
+        self._pending_ids.append(key)
+        self._pending_signatures.append(signature)
+        for band, band_key in enumerate(self._band_keys_of(signature[np.newaxis, :])[:, 0].tolist()):
+            self._pending_buckets[band].setdefault(band_key, []).append(index)
+        if persist:
+            try:
+                add_reply_signatures([(key, signature.tobytes())])
+            except Exception as e:
+                logging.warning(f"類似チェック用の署名の保存中にエラー: {e}")
+
+    def query(self, text: str) -> Tuple[str, float] | None:
+        """
+        本文と最も似ている過去の返信を探し、類似度がしきい値以上なら
+        (キー, 推定類似度) を返します。
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        keys = self._band_keys_of(signature[np.newaxis, :])[:, 0]
+
+        candidates = set()
+        lefts = np.searchsorted(self._band_keys, keys, side='left')
+        rights = np.searchsorted(self._band_keys, keys, side='right')
+        for left, right in zip(lefts.tolist(), rights.tolist()):
+            if right > left:
+                candidates.update(self._band_rows[left:right].tolist())
+        pending = set()
+        for band, band_key in enumerate(keys.tolist()):
+            pending.update(self._pending_buckets[band].get(band_key, ()))
+
+        best = None
+        if candidates:
+            indices = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            similarities = (self._signatures[indices] == signature).mean(axis=1)
+            top = int(similarities.argmax())
+            best = (self._ids[indices[top]], float(similarities[top]))
+        for index in pending:
+            similarity = float((self._pending_signatures[index] == signature).mean())
+            if best is None or similarity > best[1]:
+                best = (self._pending_ids[index], similarity)
+
+        if best and best[1] >= self.threshold:
+            return best
+        return None
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._pending_ids)
+
+
+_near_duplicate_index: NearDuplicateIndex | None = None
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """プロセス内で共有するインデックスを取得します（初回のみDBから読み込み）。"""
+    global _near_duplicate_index
+    if _near_duplicate_index is None:
+        _near_duplicate_index = NearDuplicateIndex().load()
+    return _near_duplicate_index
+
+def find_near_duplicate(text: str) -> Tuple[str, float] | None:
+    """生成した返信が直近の返信とほぼ同じであれば (キー, 類似度) を返します。"""
+    if not NEAR_DUP_ENABLED:
+        return None
+    return get_near_duplicate_index().query(text)
+
+def remember_reply(tweet_id: str, text: str, nickname: str | None = None):
+    """
+    投稿した返信をインデックスに加え、署名をDBにも保存します。
+    投稿されなかった返信（セルフチェックで破棄されたもの等）が以降の返信を妨げないよう、投稿後にだけ呼びます。
+    """
+    if not NEAR_DUP_ENABLED:
+        return
+    get_near_duplicate_index().add(str(tweet_id), text, persist=True, nickname=nickname)
+
+# --- ベンチマーク ---
+
+_BENCH_WORDS = [
+    "ありがとう", "素敵", "嬉しい", "今日も", "頑張って", "写真", "かわいい", "楽しみ",
+    "おいしそう", "また", "一緒に", "元気", "癒される", "見て", "笑った", "最高",
+    "お疲れさま", "ゆっくり", "休んでね", "おやすみ", "朝から", "気をつけて", "寒い", "暑い",
+    "お花", "空", "猫ちゃん", "ご飯", "お散歩", "週末", "旅行", "夢", "応援してる", "びっくり",
+    "なるほど", "いいね", "わかる", "大好き", "ほっこり", "きれい", "優しい", "幸せ",
+]
+
+def benchmark(size: int, queries: int = 1000) -> dict:
+    """合成した返信 size 件で索引構築と検索の時間を計測します（DBは使いません）。"""
+    rng = random.Random(0)
+    texts = ["".join(rng.choice(_BENCH_WORDS) for _ in range(rng.randint(5, 9))) for _ in range(size)]
+    texts = [text for text in texts if len(normalize_for_shingles(text)) >= NEAR_DUP_MIN_CHARS]
+    size = len(texts)
+    index = NearDuplicateIndex()
+
+    start = time.perf_counter()
+    signatures = np.stack([index.signature(text) for text in texts])
+    signature_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index._build([str(i) for i in range(size)], signatures)
+    build_seconds = time.perf_counter() - start
+
+    # 半分は既存の返信に1語足したもの（重複）、半分は新しく作った返信
+    probes = [
+        rng.choice(texts) + rng.choice(_BENCH_WORDS) if i % 2 == 0
+        else "".join(rng.choice(_BENCH_WORDS) for _ in range(rng.randint(5, 9)))
+        for i in range(queries)
+    ]
+    start = time.perf_counter()
+    hits = sum(1 for text in probes if index.query(text))
+    query_seconds = time.perf_counter() - start
+
+    return {
+        "size": size,
+        "signature_us_per_text": signature_seconds / max(size, 1) * 1e6,
+        "build_ms": build_seconds * 1000,
+        "query_us_per_call": query_seconds / max(queries, 1) * 1e6,
+        "hit_rate": hits / max(queries, 1),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="過去の返信との類似チェック（MinHash/LSH）の計測・確認を行います。")
+    parser.add_argument("--bench", type=int, metavar="N", help="合成した返信N件で構築・検索時間を計測します。")
+    parser.add_argument("--check", metavar="TEXT", help="DBの返信済みツイートと照合し、最も似ている返信を表示します。")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.bench:
+        result = benchmark(args.bench)
+        print(f"履歴件数: {result['size']}件")
+        print(f"署名計算: {result['signature_us_per_text']:.1f} µs/件")
+        print(f"索引構築: {result['build_ms']:.1f} ms")
+        print(f"検索: {result['query_us_per_call']:.1f} µs/回 (重複判定率 {result['hit_rate']:.0%})")
+    elif args.check:
+        print(get_near_duplicate_index().query(args.check))
+    else:
+        parser.print_help()
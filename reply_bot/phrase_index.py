@@ -0,0 +1,170 @@
+"""
+返信表現の繰り返し防止インデックス
+直近に投稿した返信（実行をまたいでSQLiteに保持）から頻出する表現を自動抽出し、
+生成された返信に含まれる禁止フレーズをAho–Corasickオートマトン1回の走査で検出する
+"""
+
+import logging
+import re
+from collections import Counter, deque
+from typing import Iterable, List, Set
+
+from .config import (
+    PHRASE_INDEX_WINDOW_SIZE, PHRASE_INDEX_SEED_WINDOW, PHRASE_INDEX_MIN_COUNT,
+    PHRASE_INDEX_NGRAM_RANGE, PHRASE_INDEX_MAX_PHRASES, PHRASE_INDEX_SEED_PHRASES
+)
+from .db import add_reply_history, get_recent_reply_history
+from .emoji_table import strip_emoji
+from .text_automaton import AhoCorasick
+
+_HIRAGANA_ONLY = re.compile(r'^[぀-ゟー]+$')
+
+def _extract_ngrams(reply_body: str) -> Set[str]:
+    """返信本文から文字n-gramの集合を抽出します（1返信内の重複は数えない）。"""
+    min_n, max_n = PHRASE_INDEX_NGRAM_RANGE
+    text = strip_emoji(reply_body or "")
+    ngrams = set()
+    # 句読点・記号・空白で区切った連続部分ごとにn-gramを作る
+    for run in re.split(r'[^\w]+', text):
+        for n in range(min_n, min(max_n, len(run)) + 1):
+            for i in range(len(run) - n + 1):
+                ngram = run[i:i + n]
+                # 「ちゃう」「だよね」のような短いひらがなだけの断片は文法要素なので除外
+                if len(ngram) < 4 and _HIRAGANA_ONLY.match(ngram):
+                    continue
+                ngrams.add(ngram)
+    return ngrams
+
+def _overlaps(ngram: str, chosen: str) -> bool:
+    """2つの表現が包含関係にあるか、最小n-gram長以上の端が重なっているか"""
+    if ngram in chosen or chosen in ngram:
+        return True
+    min_n = PHRASE_INDEX_NGRAM_RANGE[0]
+    for k in range(min(len(ngram), len(chosen)) - 1, min_n - 1, -1):
+        if ngram[:k] == chosen[-k:] or ngram[-k:] == chosen[:k]:
+            return True
+    return False
+
+
+class PhraseIndex:
+    """
+    直近の返信のローリングウィンドウから禁止フレーズを管理するインデックス
+
+    返信を追加するとn-gramの出現返信数を差分更新し、禁止フレーズの集合と
+    照合用オートマトンは次に参照された時点で再構築します。
+    """
+
+    def __init__(self, window_size: int = PHRASE_INDEX_WINDOW_SIZE, persist: bool = True):
+        self.window_size = window_size
+        self.persist = persist
+        self._replies: deque = deque()
+        self._ngram_counts: Counter = Counter()
+        self._banned: Set[str] = set()
+        self._automaton: AhoCorasick | None = None
+        self._dirty = True
+
+    def load(self) -> "PhraseIndex":
+        """DBから直近の返信を読み込みます。"""
+        try:
+            for reply_body in get_recent_reply_history(self.window_size):
+                self._append(reply_body)
+            logging.info(f"禁止フレーズインデックス: 直近 {len(self._replies)} 件の返信を読み込みました。")
+        except Exception as e:
+            logging.warning(f"返信履歴の読み込み中にエラー: {e}")
+        return self
+
+    def _append(self, reply_body: str):
+        ngrams = _extract_ngrams(reply_body)
+        self._replies.append((reply_body, ngrams))
+        self._ngram_counts.update(ngrams)
+        if len(self._replies) > self.window_size:
+            _, old_ngrams = self._replies.popleft()
+            self._ngram_counts.subtract(old_ngrams)
+            for ngram in old_ngrams:
+                if self._ngram_counts[ngram] <= 0:
+                    del self._ngram_counts[ngram]
+        self._dirty = True
+
+    def add(self, reply_body: str):
+        """
+        投稿した返信本文をインデックスに追加し、DBにも記録します。
+        投稿されなかった返信の表現を禁止しないよう、投稿を確認した後にだけ呼びます。
+        """
+        if not reply_body:
+            return
+        self._append(reply_body)
+        if self.persist:
+            try:
+                add_reply_history(reply_body, self.window_size)
+            except Exception as e:
+                logging.warning(f"返信履歴の保存中にエラー: {e}")
+
+    def _rebuild(self):
+        # 定番表現: 直近の返信で使われていれば禁止
+        recent_bodies = [body for body, _ in list(self._replies)[-PHRASE_INDEX_SEED_WINDOW:]]
+        banned = {
+            phrase for phrase in PHRASE_INDEX_SEED_PHRASES
+            if any(phrase in body for body in recent_bodies)
+        }
+
+        # 自動抽出: 多くの返信で使い回されているn-gram
+        # 選択済みの表現と包含関係にあるもの・端が重なるもの（同じ文の別の切り出し）は除外
+        frequent = [
+            (ngram, count) for ngram, count in self._ngram_counts.items()
+            if count >= PHRASE_INDEX_MIN_COUNT
+        ]
+        frequent.sort(key=lambda item: (item[1] * len(item[0]), len(item[0])), reverse=True)
+        selected: List[str] = []
+        for ngram, count in frequent:
+            if any(_overlaps(ngram, chosen) for chosen in selected):
+                continue
+            selected.append(ngram)
+            if len(selected) >= PHRASE_INDEX_MAX_PHRASES:
+                break
+        banned.update(selected)
+
+        self._banned = banned
+        self._automaton = AhoCorasick(banned).build()
+        self._dirty = False
+
+    def banned_phrases(self) -> Set[str]:
+        """現在の禁止フレーズの集合を返します。"""
+        if self._dirty:
+            self._rebuild()
+        return set(self._banned)
+
+    def find_banned(self, text: str) -> List[str]:
+        """本文に含まれる禁止フレーズを1回の走査で検出します。"""
+        if self._dirty:
+            self._rebuild()
+        return sorted({pattern for _, _, pattern, _ in self._automaton.iter_matches(text or "")})
+
+    def __len__(self) -> int:
+        return len(self._replies)
+
+
+_phrase_index: PhraseIndex | None = None
+
+def get_phrase_index() -> PhraseIndex:
+    """プロセス内で共有するインデックスを取得します（初回のみDBから読み込み）。"""
+    global _phrase_index
+    if _phrase_index is None:
+        _phrase_index = PhraseIndex().load()
+    return _phrase_index
+
+_matcher_cache: dict = {}
+
+def match_phrases(text: str, phrases: Iterable[str]) -> List[str]:
+    """
+    任意のフレーズ集合について、本文に含まれるものを1回の走査で検出します。
+    直前と同じ集合であれば構築済みのオートマトンを再利用します。
+    """
+    key = frozenset(phrases or ())
+    if not key:
+        return []
+    automaton = _matcher_cache.get(key)
+    if automaton is None:
+        automaton = AhoCorasick(key).build()
+        _matcher_cache.clear()
+        _matcher_cache[key] = automaton
+    return sorted({pattern for _, _, pattern, _ in automaton.iter_matches(text or "")})
@@ -1,9 +1,6 @@
-import pandas as pd
 import argparse
 import logging
-import time
 import os
-import pyperclip
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
@@ -12,17 +9,128 @@ from selenium import webdriver
 
 from .utils import setup_driver, check_memory_usage, force_restart_driver
 from .config import POST_INTERVAL_SECONDS, TARGET_USER
+from .db import init_db, mark_replied
+from .near_duplicate import remember_reply
+from .phrase_index import get_phrase_index
+from .preference_store import get_preference
+from .action_confirmation import arm as arm_confirmation, describe as describe_confirmation, wait_for_reply_posted
+from .action_journal import (
+    ACTION_LIKE, ACTION_REPLY, record_intent, record_result, completed_actions, resolve_pending, reconcile_replied
+)
+from .post_scheduler import PostScheduler
+from .resource_policy import apply_policy
+from .run_store import resolve_run, iter_rows, update_row, csv_reply_ids, sync_csv, export_stage_csv
+from .text_insertion import insert_text
+from .thread_probe import probe_thread
+from .timeline_like import like_article
 from .webdriver_stabilizer import WebDriverStabilizer, safe_execute, handle_webdriver_error
 
 # ログ設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def main_process(driver: webdriver.Chrome, input_csv: str, dry_run: bool = True, limit: int | None = None, interval: int = 15):
+def like_current_tweet(driver: webdriver.Chrome, tweet_id, dry_run: bool, wait: WebDriverWait) -> bool:
     """
-    CSVを読み込み、各リプライに対してページアクセスを1回に最適化し、
-    「いいね」と「返信」を行います。
-    処理の進捗（いいね）はCSVファイルに追記され、再実行時に完了したタスクをスキップします。
+    現在表示中のツイートページで、返信対象の記事の「いいね」を押して unlike への切り替わりを確認します。
+    「いいね」済みになった場合にTrueを返します（ドライラン時はFalse）。
+    """
+    try:
+        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, '[data-testid="like"], [data-testid="unlike"]')))
+    except Exception as e:
+        logging.warning(f"tweet_id: {tweet_id} の「いいね」ボタンが表示されませんでした: {e}")
+        return False
+    return like_article(driver, tweet_id, dry_run)
+
+def can_reply_on_current_page(driver: webdriver.Chrome, tweet_id) -> bool:
+    """
+    現在表示中のページで、返信対象のツイートより後にツイート（＝後続の返信）が無いかを確認します。
+    対象が見つからない場合やチェックに失敗した場合は、安全のためFalseを返します。
+    """
+    # 対象の位置・後続ツイート数・後続の投稿者を1回のスクリプト実行で取得
+    probe = probe_thread(driver, tweet_id)
+    if probe is None:
+        logging.error("返信の重複チェックに失敗しました。安全のため返信をスキップします。")
+        return False # 安全のため、チェックに失敗した場合は投稿しない
+
+    if probe["target_index"] == -1:
+        logging.error("ページ内で返信対象のツイートが見つかりませんでした。安全のため返信をスキップします。")
+        return False
+    logging.info(f"返信対象のツイートを {probe['target_index'] + 1}番目に発見しました。")
+
+    # 返信対象のツイートより後にツイート（＝後続の返信）があるか
+    if probe["following_count"] > 0:
+        if probe["replied_by_target_user"]:
+            logging.warning(f"対象ツイートの後に {TARGET_USER} の返信が見つかりました（返信済み）。返信をスキップします。")
+        else:
+            logging.warning(f"対象ツイートの後に {probe['following_count']} 件の返信が見つかりました。返信をスキップします。")
+        return False
+
+    logging.info("対象ツイートの後に返信はありません。返信可能です。")
+    return True
+
+def post_reply_on_current_page(driver: webdriver.Chrome, tweet_id, generated_reply: str, dry_run: bool,
+                               wait: WebDriverWait, user_id: str = '', is_my_thread: bool = False) -> bool:
+    """
+    現在表示中のツイートページの返信欄から返信を投稿し、返信済みとして記録します。
+    投稿した場合（ドライラン時は投稿したとみなせる場合）にTrueを返します。
+    """
+    entry_id = None
+    try:
+        logging.info("返信処理を開始します。")
+        reply_input_selector = '[data-testid="tweetTextarea_0"]'
+        reply_input = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, reply_input_selector)))
+
+        if dry_run:
+            logging.info(f"[DRY RUN] tweet_id: {tweet_id} に以下の内容で返信します:\n--- MOCK REPLY ---\n{generated_reply}\n--------------------")
+            return True
+
+        logging.info(f"tweet_id: {tweet_id} に返信します...")
+
+        final_reply_text = generated_reply.replace('<br>', '\n')
+        if not insert_text(driver, reply_input, final_reply_text):
+            logging.error(f"tweet_id: {tweet_id} の返信欄に返信を入力できませんでした。投稿を中止します。")
+            return False
+
+        # 投稿の直前に intent を記録（クラッシュした場合は次回の実行開始時にページ上で確認する）
+        entry_id = record_intent(tweet_id, ACTION_REPLY, text=final_reply_text, user_id=user_id, is_my_thread=is_my_thread)
+        arm_confirmation(driver)
+        reply_input.send_keys(Keys.CONTROL, Keys.ENTER)
+        confirmation = wait_for_reply_posted(driver, tweet_id, reply_input)
+        if not confirmation["confirmed"]:
+            # 時間切れの場合は投稿されたかどうか分からないため intent のまま残し、次回の実行開始時に確認する
+            if confirmation["source"] != "timeout":
+                record_result(entry_id, False, describe_confirmation(confirmation))
+            logging.error(f"tweet_id: {tweet_id} への返信の投稿を確認できませんでした。")
+            return False
+        logging.info(f"返信を投稿しました (返信ID: {confirmation['tweet_id'] or '不明'}, 確認: {confirmation['source']})。")
+
+        # 返信済みとして記録し、過去の返信との類似チェックと禁止フレーズのインデックスに加える
+        try:
+            mark_replied(str(tweet_id), user_id, final_reply_text, is_my_thread)
+            preference = (get_preference(user_id) or get_preference(user_id.lower())) if user_id else None
+            nickname = preference[0] if preference else None
+            remember_reply(str(tweet_id), final_reply_text, nickname=nickname)
+            # 禁止フレーズの抽出にはニックネームの呼びかけ行を除いた本文を使う
+            if nickname and final_reply_text.startswith(f"{nickname}\n"):
+                get_phrase_index().add(final_reply_text[len(nickname) + 1:])
+            else:
+                get_phrase_index().add(final_reply_text)
+        except Exception as e:
+            logging.warning(f"tweet_id: {tweet_id} の返信済み記録中にエラー: {e}")
+        record_result(entry_id, True, describe_confirmation(confirmation))
+        return True
+    except Exception as e:
+        record_result(entry_id, False, str(e))
+        logging.error(f"tweet_id: {tweet_id} への返信中にエラーが発生しました: {e}")
+        return False
+
+def main_process(driver: webdriver.Chrome, input_csv: str | None = None, dry_run: bool = True, limit: int | None = None,
+                 interval: int = 15, run_id: str | None = None):
+    """
+    ランストアのリプライ（run_id を指定しない場合は input_csv を取り込んだもの）に対して、
+    ページアクセスを1回に最適化し、「いいね」と「返信」を行います。
+    「いいね」・投稿の結果はランに1行ずつ書き戻され、再実行時に完了したタスクをスキップします。
     返信すべきかどうかは、実行時のスレッドの状態を見て動的に判断します。
+    処理順と待ち時間は PostScheduler が決め、interval は返信同士の最小間隔として使います。
     """
     if dry_run:
         logging.info("=== ドライランモードで実行します ===")
@@ -30,24 +138,25 @@ def main_process(driver: webdriver.Chrome, input_csv: str, dry_run: bool = True,
         logging.warning("★★★ ライブモードで実行します ★★★")
         
     try:
-        df = pd.read_csv(input_csv)
+        init_db()
+        run_id = resolve_run(input_csv, run_id)
     except FileNotFoundError:
-        logging.error(f"入力ファイルが見つかりません: {input_csv}")
+        logging.error(f"入力ファイルまたはランが見つかりません: {run_id or input_csv}")
         return
 
-    # 'liked' 列が存在しない場合はFalseで初期化（'posted'列は動的に判断するため不要）
-    if 'liked' not in df.columns:
-        df['liked'] = False
-    df['liked'] = df['liked'].fillna(False).astype(bool)
-
-    # 全ツイートを処理対象とする（いいね処理のため）
-    replies_to_process = df.copy()
+    # セルフチェックに失敗した行以外の全ツイートを処理対象とする（いいね処理のため）
+    # CSVを渡された場合は、そのCSVに含まれる行だけを対象にする
+    target_ids = set(csv_reply_ids(input_csv)) if input_csv else None
+    replies_to_process = [
+        row for row in iter_rows(run_id, selfcheck_failed=False)
+        if target_ids is None or row['reply_id'] in target_ids
+    ]
     
     if limit is not None and limit > 0:
         logging.info(f"処理件数を {limit} 件に制限します。")
-        replies_to_process = replies_to_process.head(limit)
+        replies_to_process = replies_to_process[:limit]
         
-    if replies_to_process.empty:
+    if not replies_to_process:
         logging.info("処理対象のツイートが見つかりませんでした。")
         return
         
@@ -56,16 +165,48 @@ def main_process(driver: webdriver.Chrome, input_csv: str, dry_run: bool = True,
         return
 
     something_changed = False
+    apply_policy(driver, "post")
+
+    # 行動ジャーナル: 前回中断したアクションを解決し、完了済みの返信を replied に反映する
+    if not dry_run:
+        resolve_pending(driver)
+        reconcile_replied()
+    completed = completed_actions([row['reply_id'] for row in replies_to_process])
+
+    # いいね・返信の必要なツイートを優先度順のキューに積む（どちらも不要なものはページを開かない）
+    scheduler = PostScheduler(reply_interval=interval)
+    for row in replies_to_process:
+        tweet_id = row['reply_id']
+        like_done = (tweet_id, ACTION_LIKE) in completed
+        if like_done and not row['liked']:
+            update_row(run_id, tweet_id, liked=True)
+            something_changed = True
+        scheduler.push(
+            {"tweet_id": tweet_id, "generated_reply": row['generated_reply'], "is_my_thread": row['is_my_thread'],
+             "user_id": row['UserID']},
+            needs_like=not row['liked'] and not like_done,
+            needs_reply=bool(row['generated_reply'].strip()) and (tweet_id, ACTION_REPLY) not in completed,
+            is_my_thread=row['is_my_thread'],
+            posted_at=row['date_time'],
+        )
+    skipped = len(replies_to_process) - len(scheduler)
+    if skipped:
+        logging.info(f"「いいね」・返信が完了済み（または返信の無い「いいね」済み）の {skipped} 件はページを開かずにスキップします。")
+
     try:
-        for index, row in replies_to_process.iterrows():
-            tweet_id = row['reply_id']
-            generated_reply = row['generated_reply']
-            is_my_thread = row.get('is_my_thread', False)
-            is_liked = row['liked']
+        total = len(scheduler)
+        processed = 0
+        while True:
+            task = scheduler.pop()
+            if task is None:
+                break
+            processed += 1
+            tweet_id = task['tweet_id']
+            generated_reply = task['generated_reply']
             
-            logging.info(f"--- 処理中: {df.index.get_loc(index) + 1}/{len(df)} (tweet_id: {tweet_id}) ---")
+            logging.info(f"--- 処理中: {processed}/{total} (tweet_id: {tweet_id}) ---")
             
-            # 1. ページにアクセス
+            # 1. ページにアクセス（この間に前回のアクションからの待ち時間を消化する）
             tweet_url = f"https://x.com/any/status/{tweet_id}"
             logging.info(f"ツイートページにアクセス中: {tweet_url}")
             driver.get(tweet_url)
@@ -78,101 +219,54 @@ def main_process(driver: webdriver.Chrome, input_csv: str, dry_run: bool = True,
             except Exception as e:
                 logging.warning(f"ツイート本文の読み込み中にタイムアウトしました。処理を続行しますが、失敗する可能性があります。: {e}")
 
-            # 2. 「いいね」処理 (未実施の場合)
-            if not is_liked:
-                try:
-                    like_button_selector = '[data-testid="like"]'
-                    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, like_button_selector)))
-                    if dry_run:
-                        logging.info(f"[DRY RUN] tweet_id: {tweet_id} に「いいね」をします。")
-                    else:
-                        logging.info(f"tweet_id: {tweet_id} に「いいね」をします。")
-                        like_button = driver.find_element(By.CSS_SELECTOR, like_button_selector)
-                        driver.execute_script("arguments[0].click();", like_button)
-                        df.loc[index, 'liked'] = True
-                        something_changed = True
-                        time.sleep(1)
-                except Exception as e:
-                    # 「いいね」しようとして、すでにされているなどの理由でボタンが見つからないケースは警告に留める
-                    logging.warning(f"tweet_id: {tweet_id} の「いいね」中に問題が発生しました（すでに「いいね」済みの可能性があります）: {e}")
-            else:
-                logging.info(f"tweet_id: {tweet_id} はCSV上で「いいね」済みのためスキップします。")
-
-            # 3. 返信処理 (generated_replyが存在する場合のみ実行)
-            if generated_reply and str(generated_reply).strip():
-                should_reply = True
+            # 2. 返信の重複チェック（待機の前に済ませておく）
+            should_reply = task['needs_reply']
+            if should_reply:
                 logging.info("返信コメントが存在します。返信の重複チェック（後続ツイートの有無）を行います...")
-                try:
-                    # ページ上に存在するすべてのツイート要素を取得
-                    all_tweet_elements = driver.find_elements(By.XPATH, '//article[@data-testid="tweet"]')
-                    
-                    target_tweet_index = -1
-                    # まず、URLに含まれるIDと一致する「返信対象のツイート」が何番目にあるかを探す
-                    for i, tweet_element in enumerate(all_tweet_elements):
-                        try:
-                            # ツイート内のタイムスタンプなどのリンクにIDが含まれているかチェック
-                            tweet_element.find_element(By.XPATH, f".//a[contains(@href, '/status/{tweet_id}')]")
-                            target_tweet_index = i
-                            logging.info(f"返信対象のツイートを {i + 1}番目に発見しました。")
-                            break
-                        except Exception:
-                            continue
-                    
-                    if target_tweet_index == -1:
-                        logging.error("ページ内で返信対象のツイートが見つかりませんでした。安全のため返信をスキップします。")
-                        should_reply = False
-                    else:
-                        # 返信対象のツイートより後にツイート（＝後続の返信）があるか
-                        if len(all_tweet_elements) > target_tweet_index + 1:
-                            num_replies = len(all_tweet_elements) - (target_tweet_index + 1)
-                            logging.warning(f"対象ツイートの後に {num_replies} 件の返信が見つかりました。返信をスキップします。")
-                            should_reply = False
-                        else:
-                            logging.info("対象ツイートの後に返信はありません。返信可能です。")
-
-                except Exception as e:
-                    logging.error(f"返信の重複チェック中に予期せぬエラーが発生しました: {e}", exc_info=True)
-                    should_reply = False # 安全のため、チェックに失敗した場合は投稿しない
-
-                if should_reply:
-                    try:
-                        logging.info("返信処理を開始します。")
-                        reply_input_selector = '[data-testid="tweetTextarea_0"]'
-                        reply_input = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, reply_input_selector)))
-                        
-                        if dry_run:
-                            logging.info(f"[DRY RUN] tweet_id: {tweet_id} に以下の内容で返信します:\n--- MOCK REPLY ---\n{generated_reply}\n--------------------")
-                        else:
-                            logging.info(f"tweet_id: {tweet_id} に返信します...")
-                            
-                            driver.execute_script("arguments[0].focus(); arguments[0].click();", reply_input)
-                            time.sleep(1)
-
-                            final_reply_text = generated_reply.replace('<br>', '\n')
-                            pyperclip.copy(final_reply_text)
-                            
-                            reply_input.send_keys(Keys.CONTROL, 'v')
-                            time.sleep(0.5)
-
-                            reply_input.send_keys(Keys.CONTROL, Keys.ENTER)
-                            logging.info("返信を投稿しました。")
-                            time.sleep(2)
-                    except Exception as e:
-                        logging.error(f"tweet_id: {tweet_id} への返信中にエラーが発生しました: {e}")
-                else:
-                    logging.info("重複チェックにより返信がスキップされたため、クールダウンを省略して次の処理へ進みます。")
-                    continue
+                should_reply = can_reply_on_current_page(driver, tweet_id)
+                if not should_reply:
+                    logging.info("重複チェックにより返信をスキップします。")
             else:
                 logging.info(f"tweet_id: {tweet_id} には返信コメントが生成されていないため、返信対象外です。")
 
-            logging.info(f"次の処理までのクールダウン ({interval}秒)")
-            time.sleep(interval)
+            # 3. 「いいね」処理 (未実施の場合)
+            if task['needs_like']:
+                scheduler.wait_for('like')
+                if like_current_tweet(driver, tweet_id, dry_run, wait):
+                    update_row(run_id, tweet_id, liked=True)
+                    something_changed = True
+                    scheduler.record('like', tweet_id)
+                elif dry_run:
+                    scheduler.record('like', tweet_id)
+            else:
+                logging.info(f"tweet_id: {tweet_id} は「いいね」済みのためスキップします。")
+
+            # 4. 返信処理
+            if should_reply:
+                scheduler.wait_for('reply', tweet_id)
+                if post_reply_on_current_page(
+                    driver, tweet_id, generated_reply, dry_run, wait,
+                    user_id=task['user_id'], is_my_thread=task['is_my_thread']
+                ):
+                    scheduler.record('reply')
+                    if not dry_run:
+                        update_row(run_id, tweet_id, posted=True)
+                        something_changed = True
+
+        logging.info(
+            f"スケジューラ: いいね {scheduler.stats['like']} 件, 返信 {scheduler.stats['reply']} 件, "
+            f"間隔調整の待機 合計 {scheduler.stats['waited_seconds']:.1f} 秒"
+        )
     except Exception as e:
         logging.error(f"投稿処理中に予期せぬエラーが発生しました: {e}", exc_info=True)
     finally:
+        # 進捗はランに記録済み。CSVは確認用に書き出す（入力CSVの場合は liked 列を書き換える）
         if something_changed and not dry_run:
-            logging.info(f"「いいね」のステータスをCSVファイルに書き込みます: {input_csv}")
-            df.to_csv(input_csv, index=False, encoding='utf-8-sig')
+            if input_csv:
+                logging.info(f"「いいね」のステータスをCSVファイルに書き込みます: {input_csv}")
+                sync_csv(run_id, input_csv)
+            else:
+                export_stage_csv(run_id, "processed")
         else:
             logging.info("ドライランモードまたは「いいね」の変更がなかったため、CSVは更新されませんでした。")
             
@@ -181,7 +275,8 @@ def main_process(driver: webdriver.Chrome, input_csv: str, dry_run: bool = True,
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='生成された返信をXに投稿します。')
-    parser.add_argument('input_csv', type=str, help='入力CSVファイルのパス (例: output/generated_replies_....csv)')
+    parser.add_argument('input_csv', type=str, nargs='?', help='入力CSVファイルのパス (例: output/processed_replies_....csv)')
+    parser.add_argument('--run-id', type=str, default=None, help='CSVの代わりにランストアのランを処理します。')
     parser.add_argument('--live-run', action='store_true', help='このフラグを立てると、実際に投稿やいいねを行います（ドライランを無効化）。')
     parser.add_argument('--limit', type=int, default=None, help='処理するツイートの最大数を指定します。')
     parser.add_argument('--interval', type=int, default=None, help=f'投稿間の待機時間（秒）。指定しない場合はconfig.pyの値({POST_INTERVAL_SECONDS}秒)が使われます。')
@@ -200,7 +295,7 @@ if __name__ == '__main__':
     try:
         driver = setup_driver(headless=args.headless)
         if driver:
-            main_process(driver, args.input_csv, dry_run=is_dry_run, limit=args.limit, interval=interval_to_use)
+            main_process(driver, args.input_csv, dry_run=is_dry_run, limit=args.limit, interval=interval_to_use, run_id=args.run_id)
     finally:
         if driver:
             driver.quit()
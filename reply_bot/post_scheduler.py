@@ -0,0 +1,164 @@
+"""
+「いいね」と返信の投稿スケジューラ
+アクションの種類ごとに最小間隔と1時間あたりの上限をトークンバケットで管理し、
+種類をまたいだアクション同士にも最小間隔を設けて、優先度順（自分のスレッドへの返信 → その他の返信 → いいねのみ、同じ優先度なら新しい順）にタスクを取り出す
+"""
+
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime
+
+from .config import (
+    POST_INTERVAL_SECONDS, REPLIES_PER_HOUR, REPLY_BURST,
+    LIKE_MIN_INTERVAL_SECONDS, LIKES_PER_HOUR, LIKE_BURST, ACTION_MIN_GAP_SECONDS, SCHEDULER_LOOKAHEAD_SECONDS
+)
+
+# タスクの優先度（小さいほど先に処理）
+PRIORITY_MY_THREAD_REPLY = 0
+PRIORITY_REPLY = 1
+PRIORITY_LIKE_ONLY = 2
+
+
+class TokenBucket:
+    """
+    最小間隔と1時間あたりの上限を持つトークンバケット
+
+    トークンは per_hour / 3600 個/秒で補充され、最大 burst 個まで貯まります。
+    アクションにはトークン1個と、前回のアクションから min_interval 秒の経過が必要です。
+    """
+
+    def __init__(self, name: str, min_interval: float, per_hour: float, burst: int, clock=time.monotonic):
+        self.name = name
+        self.min_interval = min_interval
+        self.rate = per_hour / 3600
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._last_refill = clock()
+        self._last_action: float | None = None
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def time_until_ready(self) -> float:
+        """次のアクションが可能になるまでの秒数を返します。"""
+        now = self._clock()
+        self._refill(now)
+        spacing_wait = 0.0 if self._last_action is None else max(0.0, self._last_action + self.min_interval - now)
+        if self.tokens >= 1:
+            token_wait = 0.0
+        elif self.rate > 0:
+            token_wait = (1 - self.tokens) / self.rate
+        else:
+            token_wait = float('inf')
+        return max(spacing_wait, token_wait)
+
+    def consume(self):
+        """アクションを実行したことを記録します。"""
+        now = self._clock()
+        self._refill(now)
+        self.tokens = max(0.0, self.tokens - 1)
+        self._last_action = now
+
+
+class PostScheduler:
+    """
+    投稿タスクの優先度キューとアクション種別ごとのトークンバケット
+
+    種類ごとのバケットに加えて、「いいね」と返信を合わせたアクション同士にも min_gap 秒の間隔を空けます
+    （種類ごとの間隔だけでは、全体のアクション頻度が従来の倍近くになるため）。
+    ただし、同じツイートへの「いいね」に続く返信は1回の訪問で行う一連の操作のため、この間隔の対象外とします
+    （返信自体の間隔は返信のバケットで守られます）。
+    pop() は最優先のタスクを返しますが、そのタスクのアクションが
+    SCHEDULER_LOOKAHEAD_SECONDS（ページ移動にかかる程度の時間）以内に実行できない場合は、
+    すぐに実行できる次のタスクを先に返します。待ち時間はページ移動や重複チェックと重ねて消化し、
+    不足分だけを wait_for() で待ちます。
+    """
+
+    def __init__(self, reply_interval: float = POST_INTERVAL_SECONDS, min_gap: float = ACTION_MIN_GAP_SECONDS,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.buckets = {
+            "like": TokenBucket("like", LIKE_MIN_INTERVAL_SECONDS, LIKES_PER_HOUR, LIKE_BURST, clock),
+            "reply": TokenBucket("reply", reply_interval, REPLIES_PER_HOUR, REPLY_BURST, clock),
+        }
+        self.min_gap = min_gap
+        self._clock = clock
+        self._sleep = sleep
+        self._last_action: float | None = None
+        self._last_like_tweet_id: str | None = None
+        # 必要なアクションの組み合わせ (needs_like, needs_reply) ごとのヒープ。
+        # 実行可能になるまでの時間は組み合わせだけで決まるため、各ヒープの先頭を比べれば次のタスクが決まる
+        self._queues: dict = {}
+        self._counter = itertools.count()
+        self.stats = {"like": 0, "reply": 0, "waited_seconds": 0.0}
+
+    def push(self, task: dict, needs_like: bool, needs_reply: bool, is_my_thread: bool = False, posted_at: str = ""):
+        """タスクをキューに追加します。いいねも返信も不要なタスクは追加しません。"""
+        if not needs_like and not needs_reply:
+            return
+        if needs_reply:
+            priority = PRIORITY_MY_THREAD_REPLY if is_my_thread else PRIORITY_REPLY
+        else:
+            priority = PRIORITY_LIKE_ONLY
+        try:
+            freshness = -datetime.fromisoformat(posted_at).timestamp()
+        except (TypeError, ValueError):
+            freshness = 0.0
+        task = dict(task, needs_like=needs_like, needs_reply=needs_reply)
+        queue = self._queues.setdefault((needs_like, needs_reply), [])
+        heapq.heappush(queue, (priority, freshness, next(self._counter), task))
+
+    def _time_until_kind(self, kind: str, tweet_id: str | None = None) -> float:
+        follows_like = (kind == "reply" and tweet_id is not None
+                        and self._last_like_tweet_id is not None and str(tweet_id) == self._last_like_tweet_id)
+        if self._last_action is None or follows_like:
+            shared_wait = 0.0
+        else:
+            shared_wait = max(0.0, self._last_action + self.min_gap - self._clock())
+        return max(self.buckets[kind].time_until_ready(), shared_wait)
+
+    def time_until(self, task: dict) -> float:
+        """タスクに必要なアクションが全て可能になるまでの秒数"""
+        kinds = [kind for kind in ("like", "reply") if task[f"needs_{kind}"]]
+        tweet_id = task.get("tweet_id")
+        if len(kinds) == 2:
+            # 「いいね」→返信の順に続けて行うため、返信は「いいね」の直後に可能かで判定する
+            like_wait = self._time_until_kind("like")
+            reply_wait = self.buckets["reply"].time_until_ready()
+            return max(like_wait, reply_wait)
+        return max((self._time_until_kind(kind, tweet_id) for kind in kinds), default=0.0)
+
+    def pop(self) -> dict | None:
+        """次に処理するタスクを取り出します。"""
+        heads = sorted(queue[0] + (queue,) for queue in self._queues.values() if queue)
+        if not heads:
+            return None
+        chosen = next(
+            (head for head in heads if self.time_until(head[3]) <= SCHEDULER_LOOKAHEAD_SECONDS), heads[0]
+        )
+        return heapq.heappop(chosen[4])[3]
+
+    def wait_for(self, kind: str, tweet_id: str | None = None) -> float:
+        """
+        指定したアクションが可能になるまで待機し、待機した秒数を返します。
+        tweet_id を渡すと、同じツイートへの「いいね」直後の返信には種類をまたいだ最小間隔を適用しません。
+        """
+        wait_seconds = self._time_until_kind(kind, tweet_id)
+        if wait_seconds > 0:
+            logging.info(f"{'いいね' if kind == 'like' else '返信'}の間隔調整のため {wait_seconds:.1f} 秒待機します。")
+            self._sleep(wait_seconds)
+            self.stats["waited_seconds"] += wait_seconds
+        return wait_seconds
+
+    def record(self, kind: str, tweet_id: str | None = None):
+        """アクションを実行したことを記録します。"""
+        self.buckets[kind].consume()
+        self._last_action = self._clock()
+        self._last_like_tweet_id = str(tweet_id) if kind == "like" and tweet_id is not None else None
+        self.stats[kind] += 1
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
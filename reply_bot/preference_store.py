@@ -0,0 +1,157 @@
+"""
+ユーザー設定（ニックネーム等）のメモリ上のインデックス
+起動時に user_preferences を1回だけ読み込み、返信生成中の参照は辞書の読み取りだけで済ませる。
+DBの変更（PRAGMA data_version とこのプロセスの書き込み回数）を検出した場合は、
+トリガーで記録した変更履歴から変更のあった user_id だけを読み直す
+（未読の変更履歴が保持期間の処理で削除されていた場合は全件を読み直す）。
+CSV / JSON からの一括登録は1つのトランザクションで行う。
+"""
+
+import argparse
+import csv
+import json
+import logging
+import threading
+import time
+
+from .config import PREFERENCE_REFRESH_SECONDS
+from .db import (
+    init_db, add_user_preferences_many, get_all_user_preferences, get_user_preferences_many,
+    get_preference_change_seq, get_preference_changes, get_oldest_preference_change_seq, get_change_marker
+)
+
+PREFERENCE_FIELDS = ("user_id", "nickname", "language", "basic_response")
+
+
+class PreferenceStore:
+    """
+    user_preferences の辞書インデックス
+
+    get() は前回の変更確認から refresh_seconds 秒以上経っている場合にだけDBの変更を確認し、
+    それ以外は辞書を引くだけです。
+    """
+
+    def __init__(self, refresh_seconds: float = PREFERENCE_REFRESH_SECONDS, clock=time.monotonic):
+        self.refresh_seconds = refresh_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._index: dict = {}
+        self._marker = None
+        self._seq = 0
+        self._checked_at = 0.0
+        self.stats = {"loads": 0, "refreshes": 0, "changed_users": 0}
+
+    def load(self):
+        """全件を読み込みます。"""
+        with self._lock:
+            self._reload()
+        logging.info(f"ユーザー設定を {len(self._index)} 件読み込みました。")
+
+    def _reload(self):
+        self._seq = get_preference_change_seq()
+        self._marker = get_change_marker()
+        self._index = get_all_user_preferences()
+        self._checked_at = self._clock()
+        self.stats["loads"] += 1
+
+    def refresh(self) -> int:
+        """DBが変更されていれば、変更のあった user_id だけを読み直し、その件数を返します。"""
+        with self._lock:
+            self._checked_at = self._clock()
+            marker = get_change_marker()
+            if marker == self._marker:
+                return 0
+            oldest = get_oldest_preference_change_seq()
+            if oldest is not None and oldest > self._seq + 1:
+                # 未読の変更履歴が保持期間の処理で削除されているため、全件を読み直す
+                self._reload()
+                logging.info(f"ユーザー設定の変更履歴が圧縮されていたため、全件 ({len(self._index)} 件) を読み直しました。")
+                return len(self._index)
+            self._marker = marker
+            changed, self._seq = get_preference_changes(self._seq)
+            if not changed:
+                return 0
+            current = get_user_preferences_many(changed)
+            for user_id in changed:
+                if user_id in current:
+                    self._index[user_id] = current[user_id]
+                else:
+                    self._index.pop(user_id, None)
+            self.stats["refreshes"] += 1
+            self.stats["changed_users"] += len(changed)
+        logging.info(f"ユーザー設定の変更を検出し、{len(changed)} 件を読み直しました。")
+        return len(changed)
+
+    def get(self, user_id: str):
+        """(nickname, language, basic_response) を返します。登録されていない場合はNone。"""
+        if self._marker is None:
+            self.load()
+        elif self._clock() - self._checked_at >= self.refresh_seconds:
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.warning(f"ユーザー設定の更新確認中にエラー（読み込み済みの内容を使います）: {e}")
+        return self._index.get(user_id)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+_store: PreferenceStore | None = None
+
+def get_preference_store() -> PreferenceStore:
+    """プロセス内で共有するインデックスを返します（初回のみDBから読み込み）。"""
+    global _store
+    if _store is None:
+        init_db()
+        _store = PreferenceStore()
+        _store.load()
+    return _store
+
+def get_preference(user_id: str):
+    """get_user_preference のメモリ版"""
+    return get_preference_store().get(user_id)
+
+def read_preference_file(path: str) -> list[tuple]:
+    """
+    CSV（ヘッダーに user_id, nickname, language, basic_response）または
+    JSON（オブジェクトか4要素の配列のリスト）からユーザー設定を読み込みます。
+    """
+    if path.lower().endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+    else:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            records = list(csv.DictReader(f))
+
+    rows = []
+    for record in records:
+        if isinstance(record, dict):
+            values = tuple((record.get(field) or "") for field in PREFERENCE_FIELDS)
+        else:
+            values = tuple(list(record) + [""] * (len(PREFERENCE_FIELDS) - len(record)))[:len(PREFERENCE_FIELDS)]
+        if values[0]:
+            rows.append(tuple(str(value) for value in values))
+    return rows
+
+def import_preferences(rows) -> int:
+    """ユーザー設定を1つのトランザクションで一括登録し、件数を返します。"""
+    init_db()
+    count = add_user_preferences_many(list(rows))
+    if _store is not None:
+        _store.refresh()
+    return count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="ユーザー設定（ニックネーム等）の一括登録と確認")
+    parser.add_argument("--import", dest="import_path", metavar="PATH", help="CSVまたはJSONファイルから一括登録します")
+    parser.add_argument("--lookup", metavar="USER_ID", help="指定したユーザーの設定を表示します")
+    args = parser.parse_args()
+
+    if args.import_path:
+        imported = import_preferences(read_preference_file(args.import_path))
+        print(f"{imported} 件のユーザー設定を登録/更新しました。")
+    store = get_preference_store()
+    if args.lookup:
+        print(f"@{args.lookup}: {store.get(args.lookup)}")
+    print(f"登録済みのユーザー設定: {len(store)} 件")
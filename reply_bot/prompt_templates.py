@@ -0,0 +1,172 @@
+"""
+コンパイル済みプロンプトテンプレート
+ペルソナ・返信ルールなど実行中に変わらない部分（静的プレフィックス）をプロセスごとに1回だけ組み立て、
+Geminiのコンテキストキャッシュ（使えない場合はsystem_instruction付きモデルの再利用）に載せて、
+リクエストごとには会話や回避ルールなどの可変部分だけを送る
+"""
+
+import argparse
+import logging
+import re
+from datetime import timedelta
+from typing import Dict, List, Tuple
+
+import google.generativeai as genai
+
+from .config import (
+    GEMINI_MODEL_NAME, MAYA_PERSONALITY_PROMPT, REPLY_RULES_PROMPT,
+    PROMPT_CONTEXT_CACHE_ENABLED, PROMPT_CONTEXT_CACHE_TTL_MINUTES, PROMPT_CONTEXT_CACHE_MIN_TOKENS
+)
+
+# プロセス全体での送信量の集計
+_prompt_stats = {"requests": 0, "sent_bytes": 0, "full_bytes": 0}
+
+def estimate_tokens(text: str) -> int:
+    """APIを使わずにトークン数を概算します（ASCIIは約4文字、それ以外は1文字を1トークンとして数える）。"""
+    if not text:
+        return 0
+    ascii_chars = len(re.findall(r'[\x00-\x7f]', text))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+class CompiledPrompt:
+    """
+    静的プレフィックスと可変サフィックスに分けたプロンプト
+
+    静的プレフィックスは生成時に1回だけ結合し、モデルは初回の generate() で
+    1回だけ用意します。コンテキストキャッシュを作成できた場合はキャッシュを参照する
+    モデルを、できなかった場合は system_instruction に静的プレフィックスを設定した
+    モデルをプロセス内で使い回します。
+    """
+
+    def __init__(self, name: str, static_sections: List[Tuple[str, str]], model_name: str = GEMINI_MODEL_NAME):
+        self.name = name
+        self.model_name = model_name
+        self.sections = [(section, text.strip()) for section, text in static_sections]
+        self.prefix = "\n\n".join(text for _, text in self.sections)
+        self._prefix_bytes = len(self.prefix.encode('utf-8'))
+        self._token_counts: Dict[str, int] | None = None
+        self._model: genai.GenerativeModel | None = None
+        self._cached_content = None
+
+    def token_counts(self, use_api: bool = True) -> Dict[str, int]:
+        """
+        静的プレフィックスのセクションごとのトークン数を返します（初回のみ計測）。
+        APIでの計測に失敗した場合は概算値を使います。
+        """
+        if self._token_counts is not None:
+            return dict(self._token_counts)
+        counts = {}
+        counter = genai.GenerativeModel(self.model_name) if use_api else None
+        for section, text in self.sections:
+            try:
+                counts[section] = counter.count_tokens(text).total_tokens if counter else estimate_tokens(text)
+            except Exception as e:
+                logging.debug(f"トークン数の計測に失敗したため概算値を使います ({self.name}/{section}): {e}")
+                counter = None
+                counts[section] = estimate_tokens(text)
+        counts["total"] = sum(counts.values())
+        self._token_counts = counts
+        return dict(counts)
+
+    def _create_model(self) -> genai.GenerativeModel:
+        if PROMPT_CONTEXT_CACHE_ENABLED:
+            total_tokens = self.token_counts()["total"]
+            if total_tokens < PROMPT_CONTEXT_CACHE_MIN_TOKENS:
+                logging.info(
+                    f"プロンプト '{self.name}' の静的部分は {total_tokens} トークンで、コンテキストキャッシュの"
+                    f"最小サイズ ({PROMPT_CONTEXT_CACHE_MIN_TOKENS}) 未満のため system_instruction を使います。"
+                )
+            else:
+                try:
+                    self._cached_content = genai.caching.CachedContent.create(
+                        model=self.model_name,
+                        display_name=f"reply_bot_{self.name}",
+                        system_instruction=self.prefix,
+                        ttl=timedelta(minutes=PROMPT_CONTEXT_CACHE_TTL_MINUTES),
+                    )
+                    logging.info(f"プロンプト '{self.name}' の静的部分 ({total_tokens} トークン) をコンテキストキャッシュに登録しました。")
+                    return genai.GenerativeModel.from_cached_content(self._cached_content)
+                except Exception as e:
+                    self._cached_content = None
+                    logging.warning(f"コンテキストキャッシュを作成できませんでした。system_instruction を使います: {e}")
+        return genai.GenerativeModel(self.model_name, system_instruction=self.prefix)
+
+    def model(self) -> genai.GenerativeModel:
+        """プロセス内で使い回すモデルを取得します。"""
+        if self._model is None:
+            self._model = self._create_model()
+        return self._model
+
+    def render(self, *parts: str) -> str:
+        """可変サフィックスを組み立てます。"""
+        return "\n".join(part for part in parts if part)
+
+    def full_prompt(self, suffix: str) -> str:
+        """静的プレフィックスを含めた全文（デバッグ用）"""
+        return f"{self.prefix}\n\n{suffix}"
+
+    def generate(self, suffix: str):
+        """可変サフィックスだけを送信して生成します。"""
+        model = self.model()  # 初回はここでキャッシュを作るため、送信量はその後に数える
+        suffix_bytes = len(suffix.encode('utf-8'))
+        _prompt_stats["requests"] += 1
+        _prompt_stats["full_bytes"] += self._prefix_bytes + suffix_bytes
+        _prompt_stats["sent_bytes"] += suffix_bytes if self._cached_content else self._prefix_bytes + suffix_bytes
+        try:
+            return model.generate_content(suffix)
+        except Exception as e:
+            if self._cached_content is None:
+                raise
+            # キャッシュの期限切れなどに備え、system_instruction のモデルに切り替えて1回だけ再送する
+            logging.warning(f"コンテキストキャッシュを使った生成に失敗したため、キャッシュなしで再試行します: {e}")
+            self._cached_content = None
+            self._model = genai.GenerativeModel(self.model_name, system_instruction=self.prefix)
+            return self._model.generate_content(suffix)
+
+
+_reply_prompt: CompiledPrompt | None = None
+_self_check_prompt: CompiledPrompt | None = None
+
+def get_reply_prompt() -> CompiledPrompt:
+    """返信生成用のテンプレート（静的部分: ペルソナ・返信ルール）"""
+    global _reply_prompt
+    if _reply_prompt is None:
+        _reply_prompt = CompiledPrompt("reply", [
+            ("persona", MAYA_PERSONALITY_PROMPT),
+            ("task", "あなたはファンとの会話に参加しています。送られてくる「これまでの会話」の最後のファンからのリプライに返信してください。"),
+            ("rules", REPLY_RULES_PROMPT),
+        ])
+    return _reply_prompt
+
+def get_self_check_prompt() -> CompiledPrompt:
+    """セルフチェック用のテンプレート（静的部分: ペルソナ・返信ルール・判定方法）"""
+    global _self_check_prompt
+    if _self_check_prompt is None:
+        _self_check_prompt = CompiledPrompt("self_check", [
+            ("header", "あなたは、以下のルールに基づいて文章を生成するAIです。\n\n--- ルール ---"),
+            ("persona", MAYA_PERSONALITY_PROMPT),
+            ("rules", REPLY_RULES_PROMPT),
+            ("question",
+             "--- 質問 ---\n送られてくる「生成された文章」は、あなた自身が定めた上記の「ルール」をすべて遵守していますか？\n"
+             "YesかNoかのみで、理由を付けずに答えてください。"),
+        ])
+    return _self_check_prompt
+
+def get_prompt_stats() -> dict:
+    """この実行での送信バイト数（実際の送信量と、全文を毎回送った場合の量）を返します。"""
+    return dict(_prompt_stats)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="プロンプトテンプレートの静的部分のトークン数を表示します。")
+    parser.add_argument("--offline", action='store_true', help="APIを使わずに概算値を表示します。")
+    args = parser.parse_args()
+
+    if not args.offline:
+        from .config import GEMINI_API_KEY
+        genai.configure(api_key=GEMINI_API_KEY)
+    for template in (get_reply_prompt(), get_self_check_prompt()):
+        counts = template.token_counts(use_api=not args.offline)
+        print(f"[{template.name}] 静的部分 {template._prefix_bytes} バイト")
+        for section, count in counts.items():
+            print(f"  {section}: {count} トークン")
@@ -0,0 +1,101 @@
+"""
+返信生成キャッシュ
+正規化したリプライ本文・言語・ニックネーム有無・直前の文脈をキーに、
+セルフチェック済みの返信本文をSQLiteに保存し、同じ入力へのAI呼び出しを省略する
+"""
+
+import hashlib
+import logging
+import random
+import re
+import unicodedata
+from datetime import datetime, timedelta
+
+from .config import (
+    REPLY_CACHE_ENABLED, REPLY_CACHE_TTL_HOURS,
+    REPLY_CACHE_MIN_VARIANTS, REPLY_CACHE_MAX_VARIANTS
+)
+from .db import get_cached_replies, add_cached_reply, touch_cached_reply
+from .phrase_index import match_phrases
+
+# 1回の実行中のキャッシュ利用状況
+_cache_stats = {"hits": 0, "misses": 0, "stores": 0}
+
+def normalize_reply_text(text: str) -> str:
+    """
+    キャッシュキー用にリプライ本文を正規化します。
+    メンション・URLを除去し、全角半角や大文字小文字、長音や記号の揺れを吸収します。
+    """
+    if not text:
+        return ""
+    normalized = unicodedata.normalize('NFKC', text).lower()
+    normalized = re.sub(r'@[\w_]+', '', normalized)
+    normalized = re.sub(r'https?://\S+', '', normalized)
+    # 「おはよーーー」「!!!」のような繰り返しは2文字に揃える
+    normalized = re.sub(r'(.)\1{2,}', r'\1\1', normalized)
+    normalized = re.sub(r'[\s、。,.・…]+', ' ', normalized)
+    return normalized.strip()
+
+def build_cache_key(reply_text: str, lang: str, has_nickname: bool, conversation_history: list) -> str:
+    """
+    キャッシュキーを生成します。
+    文脈は返信対象の直前のツイートのみを短いハッシュとして含めます。
+    """
+    parent = conversation_history[-2] if conversation_history and len(conversation_history) >= 2 else ""
+    parent_text = parent.split(': ', 1)[-1] if parent else ""
+    context_hash = hashlib.sha1(normalize_reply_text(parent_text).encode('utf-8')).hexdigest()[:8]
+    return f"{lang}|{int(bool(has_nickname))}|{context_hash}|{normalize_reply_text(reply_text)}"
+
+def lookup_cached_reply(cache_key: str, banned_phrases: set, history: list) -> str | None:
+    """
+    キャッシュから返信本文を選択します。
+    直近の返信履歴と同じもの、禁止フレーズを含むものは候補から除外し、
+    残った候補が REPLY_CACHE_MIN_VARIANTS 件未満の場合はキャッシュを使いません。
+    """
+    if not REPLY_CACHE_ENABLED:
+        return None
+
+    since = (datetime.now() - timedelta(hours=REPLY_CACHE_TTL_HOURS)).isoformat()
+    try:
+        variants = get_cached_replies(cache_key, since)
+    except Exception as e:
+        logging.warning(f"返信キャッシュの読み込み中にエラー: {e}")
+        return None
+
+    # 返信履歴はニックネーム行を除いた最終行で記録されるため、候補も最終行同士で比べる
+    recent = {entry.split('\n')[-1] for entry in history or []}
+    candidates = [
+        body for body in variants
+        if body.split('\n')[-1] not in recent and not match_phrases(body, banned_phrases)
+    ]
+    if len(candidates) < REPLY_CACHE_MIN_VARIANTS:
+        _cache_stats["misses"] += 1
+        logging.debug(f"返信キャッシュ: 候補不足 ({len(candidates)}/{len(variants)}件) key={cache_key}")
+        return None
+
+    reply_body = random.choice(candidates)
+    try:
+        touch_cached_reply(cache_key, reply_body)
+    except Exception as e:
+        logging.warning(f"返信キャッシュの利用回数更新中にエラー: {e}")
+    _cache_stats["hits"] += 1
+    logging.info(f"返信キャッシュを利用しました (候補 {len(candidates)}件): {reply_body}")
+    return reply_body
+
+def store_cached_reply(cache_key: str, reply_body: str):
+    """セルフチェックを通過した返信本文をキャッシュに保存します。"""
+    if not REPLY_CACHE_ENABLED or not reply_body:
+        return
+
+    since = (datetime.now() - timedelta(hours=REPLY_CACHE_TTL_HOURS)).isoformat()
+    try:
+        if len(get_cached_replies(cache_key, since)) >= REPLY_CACHE_MAX_VARIANTS:
+            return
+        add_cached_reply(cache_key, reply_body)
+        _cache_stats["stores"] += 1
+    except Exception as e:
+        logging.warning(f"返信キャッシュの保存中にエラー: {e}")
+
+def get_cache_stats() -> dict:
+    """この実行でのキャッシュ利用状況を返します。"""
+    return dict(_cache_stats)
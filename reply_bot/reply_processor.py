@@ -1,25 +1,31 @@
 import logging
-import pandas as pd
 import argparse
 import os
 import time
 import random
 import re
-import emoji
 import google.generativeai as genai
 from typing import List, Dict, Tuple
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 
 from .config import (
-    GEMINI_API_KEY, MAYA_PERSONALITY_PROMPT, THANK_YOU_PHRASES, 
-    REPLY_RULES_PROMPT, TARGET_USER, GEMINI_MODEL_NAME
+    GEMINI_API_KEY, THANK_YOU_PHRASES, TARGET_USER, NEAR_DUP_MAX_REGENERATIONS, PHRASE_INDEX_MAX_REGENERATIONS,
+    THREAD_TAB_POOL_SIZE
 )
-from .db import get_user_preference
+from .db import init_db, get_reply_text, add_skipped_tweet
+from .emoji_table import ALLOWED_REPLY_EMOJI, is_emoji_only, split_emoji, trailing_emoji
+from .intent_classifier import classify_intent, choose_intent_reply
+from .near_duplicate import find_near_duplicate
+from .phrase_index import get_phrase_index, match_phrases
+from .preference_store import get_preference
+from .prompt_templates import get_reply_prompt, get_self_check_prompt, get_prompt_stats
+from .reply_cache import build_cache_key, lookup_cached_reply, store_cached_reply, get_cache_stats
+from .resource_policy import apply_policy
+from .run_store import RowSink, resolve_run, iter_rows
+from .tab_pool import TabPool
 from .utils import setup_driver
 from .reply_detection_unified import detect_reply_unified
 
@@ -71,22 +77,49 @@ process_handler.setFormatter(process_formatter)
 process_logger.addHandler(process_handler)
 process_logger.setLevel(logging.INFO)
 
-# --- テキスト処理ヘルパー関数 (旧gen_reply.pyより) ---
+# スレッドページの読み込み・スクロール後の待ち時間（秒）
+_THREAD_LOAD_TIMEOUT_SECONDS = 15
+_THREAD_LOAD_POLL_SECONDS = 0.5
+_SCROLL_SETTLE_SECONDS = 3.5
+
+# 1回の実行中のAI呼び出し回数（キャッシュ等による削減効果の計測用）
+_model_call_stats = {"generate": 0, "self_check": 0}
+
+def get_model_call_stats() -> dict:
+    return dict(_model_call_stats)
+
+# 1回の実行中にAIで生成した返信のうち、セルフチェック等で破棄した件数（禁止フレーズによる破棄率の計測用）
+_discard_stats = {"generated": 0, "discarded": 0, "banned_phrase": 0, "phrase_regenerations": 0}
 
-def is_emoji_only(text: str) -> bool:
-    if not text or not isinstance(text, str): return False
-    text_without_symbols = re.sub(r'[^\w\s]', '', text)
-    demojized_text = emoji.demojize(text_without_symbols).strip()
-    if not demojized_text: return True
-    return all(re.fullmatch(r':[a-zA-Z0-9_+-]+:', word) for word in demojized_text.split())
+def get_discard_stats() -> dict:
+    return dict(_discard_stats)
+
+def format_discard_stats() -> str:
+    """破棄率のログ用文字列"""
+    stats = _discard_stats
+    rate = stats["discarded"] / stats["generated"] * 100 if stats["generated"] else 0.0
+    return (
+        f"返信の破棄: {stats['discarded']}/{stats['generated']} 件 ({rate:.1f}%, うち禁止フレーズ {stats['banned_phrase']} 件) / "
+        f"禁止フレーズによる再生成: {stats['phrase_regenerations']} 回"
+    )
+
+# --- テキスト処理ヘルパー関数 (旧gen_reply.pyより) ---
 
 def clean_generated_text(text: str) -> str:
-    allowed_chars_pattern = re.compile(r'[^\w\s.,!?「」『』、。ー〜…\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\u2764\u1FA77]')
-    cleaned_text = allowed_chars_pattern.sub('', text)
+    allowed_chars_pattern = re.compile(r'[^\w\s.,!?「」『』、。ー〜…\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]')
+    # 絵文字はハート以外を除去し、それ以外の文字は許可リストで絞り込む
+    cleaned_text = "".join(
+        segment if is_emoji else allowed_chars_pattern.sub('', segment)
+        for segment, is_emoji in split_emoji(text)
+        if not is_emoji or segment in ALLOWED_REPLY_EMOJI
+    )
     cleaned_text = re.sub(r'^(おはようございます|おはよう|こんにちは|こんばんは)\s*', '', cleaned_text)
     cleaned_text = re.sub(r'〇〇(ちゃん|くん|さん)', '', cleaned_text)
-    cleaned_text = cleaned_text.strip().rstrip('❤️🩷') + '🩷'
-    return cleaned_text
+    cleaned_text = cleaned_text.strip()
+    # 末尾のハートを取り除いてから🩷を1つだけ付ける
+    while trailing_emoji(cleaned_text) in ALLOWED_REPLY_EMOJI:
+        cleaned_text = cleaned_text.rstrip()[:-len(trailing_emoji(cleaned_text))].rstrip()
+    return cleaned_text + '🩷'
 
 def format_reply(text: str, lang: str = 'ja') -> str:
     processed_text = text.strip()
@@ -331,22 +364,12 @@ def _get_live_like_count(article: BeautifulSoup) -> int:
         pass
     return 0
 
-def _safe_scroll_to_direction(driver: webdriver.Chrome, direction: str, max_attempts: int = 3) -> bool:
-    """
-    安全にスクロールを実行します。
-    direction: 'up' または 'down'
-    """
+def _try_scroll(driver: webdriver.Chrome, direction: str):
+    """待機せずに1回スクロールします（失敗してもスレッドの取得は続けます）。"""
     try:
-        for attempt in range(max_attempts):
-            if direction == 'up':
-                driver.execute_script("window.scrollBy(0, -3000);")
-            else:
-                driver.execute_script("window.scrollBy(0, 3000);")
-            time.sleep(1.5)  # スクロール後の待機
-        return True
+        driver.execute_script("window.scrollBy(0, -3000);" if direction == 'up' else "window.scrollBy(0, 3000);")
     except Exception as e:
         logging.warning(f"スクロール中にエラー: {e}")
-        return False
 
 def _extract_tweet_data(article: BeautifulSoup) -> dict:
     """
@@ -411,11 +434,30 @@ def _extract_tweet_data(article: BeautifulSoup) -> dict:
         thread_debug_logger.error(f"ツイートデータの抽出でエラー: {e}", exc_info=True)
         return None
 
+def run_steps(steps):
+    """
+    ステップ関数（待ち時間の秒数を yield し、結果を return するジェネレータ）を
+    time.sleep で待ちながら最後まで実行し、結果を返します。
+    """
+    while True:
+        try:
+            delay = next(steps)
+        except StopIteration as stop:
+            return stop.value
+        time.sleep(delay)
+
 def _get_complete_thread(driver: webdriver.Chrome, target_tweet_id: str) -> dict:
     """
     スレッド全体を確実に取得する堅牢な実装。
     先頭・末尾・時系列順序を保証します。
     """
+    return run_steps(_complete_thread_steps(driver, target_tweet_id))
+
+def _complete_thread_steps(driver: webdriver.Chrome, target_tweet_id: str):
+    """
+    _get_complete_thread のステップ関数版。スクロール後の読み込み待ちを yield するため、
+    TabPool で他のタブの待ち時間と重ねられます。
+    """
     try:
         thread_debug_logger.info(f"=== スレッド全体の取得開始 (target_id: {target_tweet_id}) ===")
         
@@ -430,8 +472,8 @@ def _get_complete_thread(driver: webdriver.Chrome, target_tweet_id: str) -> dict
         max_up_scrolls = 10  # 最大スクロール回数を増加
         
         while up_scroll_count < max_up_scrolls:
-            _safe_scroll_to_direction(driver, 'up', 1)
-            time.sleep(2)
+            _try_scroll(driver, 'up')
+            yield _SCROLL_SETTLE_SECONDS
             current_page_size = len(driver.page_source)
             
             thread_debug_logger.debug(f"上スクロール{up_scroll_count + 1}回目: ページサイズ {prev_page_size} -> {current_page_size}")
@@ -450,8 +492,8 @@ def _get_complete_thread(driver: webdriver.Chrome, target_tweet_id: str) -> dict
         max_down_scrolls = 10  # 最大スクロール回数を増加
         
         while down_scroll_count < max_down_scrolls:
-            _safe_scroll_to_direction(driver, 'down', 1)
-            time.sleep(2)
+            _try_scroll(driver, 'down')
+            yield _SCROLL_SETTLE_SECONDS
             current_page_size = len(driver.page_source)
             
             thread_debug_logger.debug(f"下スクロール{down_scroll_count + 1}回目: ページサイズ {prev_page_size} -> {current_page_size}")
@@ -607,12 +649,42 @@ def _get_complete_thread(driver: webdriver.Chrome, target_tweet_id: str) -> dict
         logging.error(f"スレッド全体取得中にエラー: {e}", exc_info=True)
         return None
 
-def fetch_and_analyze_thread(tweet_id: str, driver: webdriver.Chrome) -> dict:
+def fetch_and_analyze_thread(tweet_id: str, driver: webdriver.Chrome, base_url: str = "https://x.com") -> dict:
     """
     指定されたtweet_idのページにアクセスし、スレッド全体を解析して必要な情報を返します。
     改良版: 先頭・末尾・時系列全体を確実に取得します。
+    base_url はベンチマーク用のローカルサイトを使う場合にだけ指定します。
+    """
+    return run_steps(analyze_thread_steps(tweet_id, driver, base_url))
+
+# 移動先のページ（URLに marker を含む）でツイートの記事が表示されているか
+_THREAD_READY_SCRIPT = """
+return location.href.indexOf(arguments[0]) !== -1 && !!document.querySelector('article[data-testid="tweet"]');
+"""
+
+def _navigate_steps(driver: webdriver.Chrome, url: str, marker: str, timeout: float = _THREAD_LOAD_TIMEOUT_SECONDS):
+    """
+    ページの読み込みを待たずに url へ移動し、URLに marker を含むページでツイートの記事が
+    表示されるまで待ち時間を yield します。時間内に表示されない場合は TimeoutException を送出します。
+    """
+    driver.execute_script("window.location.href = arguments[0];", url)
+    deadline = time.monotonic() + timeout
+    while True:
+        yield _THREAD_LOAD_POLL_SECONDS
+        try:
+            if driver.execute_script(_THREAD_READY_SCRIPT, marker):
+                return
+        except Exception:
+            pass  # 移動中でスクリプトを実行できない場合は待ち続ける
+        if time.monotonic() >= deadline:
+            raise TimeoutException(f"{url} の読み込みが {timeout} 秒以内に完了しませんでした")
+
+def analyze_thread_steps(tweet_id: str, driver: webdriver.Chrome, base_url: str = "https://x.com"):
+    """
+    fetch_and_analyze_thread のステップ関数版（ページの読み込み・スクロールの待ち時間を yield し、解析結果を return）
+    TabPool で複数のタブの待ち時間を重ねて実行できます。
     """
-    tweet_url = f"https://x.com/any/status/{tweet_id}"
+    tweet_url = f"{base_url}/any/status/{tweet_id}"
     result = {
         "should_skip": True, "is_my_thread": False, "conversation_history": [],
         "current_reply_text": "", "current_replier_id": None, "lang": "und",
@@ -621,11 +693,10 @@ def fetch_and_analyze_thread(tweet_id: str, driver: webdriver.Chrome) -> dict:
     }
     
     try:
-        driver.get(tweet_url)
-        WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.XPATH, '//article[@data-testid="tweet"]')))
+        yield from _navigate_steps(driver, tweet_url, f"/status/{tweet_id}")
         
         # スレッド全体を取得する
-        thread_data = _get_complete_thread(driver, tweet_id)
+        thread_data = yield from _complete_thread_steps(driver, tweet_id)
         if not thread_data:
             logging.warning("スレッドデータの取得に失敗しました。")
             return result
@@ -739,7 +810,7 @@ def self_check_reply(
         return False, "生成された返信が空です。"
 
     # チェック2: フォーマット（末尾の絵文字）
-    if not generated_reply.strip().endswith('🩷'):
+    if trailing_emoji(generated_reply) != '🩷':
         return False, f"返信の末尾に意図した絵文字('🩷')が付いていません: {generated_reply}"
 
     # チェック3: ニックネーム
@@ -749,9 +820,9 @@ def self_check_reply(
     # チェック4: 禁止フレーズ
     # ニックネームを除いた本文のみをチェック対象とする
     reply_body = generated_reply.replace(f"{nickname}\n", "") if nickname else generated_reply
-    for phrase in banned_phrases:
-        if phrase in reply_body:
-            return False, f"禁止フレーズ '{phrase}' が含まれています: {reply_body}"
+    matched_phrases = match_phrases(reply_body, banned_phrases)
+    if matched_phrases:
+        return False, f"禁止フレーズ '{matched_phrases[0]}' が含まれています: {reply_body}"
 
     # チェック5: 言語一貫性の強化
     expected_lang = thread_data.get("lang", "und")
@@ -825,15 +896,10 @@ def self_check_reply(
 
     # チェック6: AIによる自己評価
     try:
-        self_check_prompt = (
-            f"あなたは、以下のルールに基づいて文章を生成するAIです。\n\n"
-            f"--- ルール ---\n{MAYA_PERSONALITY_PROMPT}\n{REPLY_RULES_PROMPT}\n\n"
-            f"--- 生成された文章 ---\n{reply_body}\n\n"
-            f"--- 質問 ---\n上記の「生成された文章」は、あなた自身が定めた上記の「ルール」をすべて遵守していますか？\n"
-            f"YesかNoかのみで、理由を付けずに答えてください。"
-        )
-        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-        response = model.generate_content(self_check_prompt)
+        # ルール部分は静的プレフィックスとして共有し、生成された文章だけを送る
+        self_check_prompt = get_self_check_prompt()
+        _model_call_stats["self_check"] += 1
+        response = self_check_prompt.generate(f"--- 生成された文章 ---\n{reply_body}")
         
         # 回答が 'yes' (小文字、トリム) で始まらない場合はNG
         if not response.text.strip().lower().startswith('yes'):
@@ -864,53 +930,49 @@ def generate_reply(thread_data: dict, history: list) -> str:
     cleaned_reply_text = re.sub(r'^[…,:・、。]', '', cleaned_reply_text).strip()
 
     # ニックネームの有無を先に取得
-    preference = get_user_preference(replier_id.lower()) if replier_id else None
+    preference = get_preference(replier_id.lower()) if replier_id else None
     nickname = preference[0] if preference else None
 
-    # 1. 定型文での返信（ニックネームがないユーザーに限定）
-    if ("おはよう" in cleaned_reply_text or "おはよー" in cleaned_reply_text) and not nickname:
-        return format_reply(f"おはよう{random.choice(['❤️', '🩷'])}", lang)
-    if "こんにちは" in cleaned_reply_text and not nickname:
-        return format_reply(f"こんにちは{random.choice(['❤️', '🩷'])}", lang)
-    if "こんばんは" in cleaned_reply_text and not nickname:
-        return format_reply(f"こんばんは{random.choice(['❤️', '🩷'])}", lang)
-    
-    # 絵文字のみ、または短い外国語のツイートに対する応答を改善
-    if is_emoji_only(cleaned_reply_text) or (lang != "ja" and len(cleaned_reply_text) <= 15):
-        # qme（絵文字のみ）の場合、言語コードとして'qme'を使用する
-        lang_code = 'qme' if is_emoji_only(cleaned_reply_text) else lang
-        return random.choice(THANK_YOU_PHRASES.get(lang_code, ["🩷"]))
+    # 1. 定型文での返信（挨拶・感謝・笑い・おやすみ・絵文字のみ）
+    intent_result = classify_intent(cleaned_reply_text, lang, has_nickname=bool(nickname))
+    if intent_result:
+        canned_reply = choose_intent_reply(intent_result, lang, nickname)
+        if canned_reply:
+            logging.info(f"定型リプライと判定しました (intent={intent_result['intent']}, matched={intent_result['matched']})")
+            return format_reply(canned_reply, lang)
+
+    # 短い外国語のツイートに対する応答
+    if lang != "ja" and len(cleaned_reply_text) <= 15:
+        return random.choice(THANK_YOU_PHRASES.get(lang, ["🩷"]))
 
     # 2. AIによる返信
     if lang == "ja" and not nickname and len(cleaned_reply_text) <= 15:
         return random.choice(["ありがとう🩷", "嬉しいな🩷", "えへへ、照れちゃうな🩷", "ふふっ🩷", "うんうん🩷", "わーい🩷"])
 
+    # 直近に投稿した返信（実行をまたいで保持）から禁止フレーズを取得
+    banned_phrases = get_phrase_index().banned_phrases()
+
+    # 3. 同じ入力に対する生成済み返信の再利用
+    cache_key = build_cache_key(cleaned_reply_text, lang, bool(nickname), thread_data["conversation_history"])
+    cached_body = lookup_cached_reply(cache_key, banned_phrases, history)
+    if cached_body:
+        return f"{nickname}\n{cached_body}" if nickname else cached_body
+
     # --- プロンプト生成 ---
     logging.info(f"AIへの入力（会話履歴）:\n---\n{conversation}\n---")
+    # ペルソナ・返信ルールは静的プレフィックスとして共有し、ここでは可変部分のみを組み立てる
+    reply_prompt = get_reply_prompt()
     prompt_parts = [
-        MAYA_PERSONALITY_PROMPT,
-        "あなたは以下の会話に参加しています。最後のファンからのリプライに返信してください。",
         "--- これまでの会話 ---",
         conversation,
         "--------------------",
-        REPLY_RULES_PROMPT
     ]
-    if history:
-        history_str = "、".join(history)
-        
-        # 履歴から禁止フレーズを動的に抽出
-        banned_phrases = set()
-        common_verbs = ["照れる", "照れちゃう", "嬉しい", "嬉しいな", "ありがとう", "頑張る", "ドキドキ", "すごい", "素敵"]
-        for reply in history:
-            for phrase in common_verbs:
-                if phrase in reply:
-                    banned_phrases.add(phrase)
-
+    if history or banned_phrases:
         avoidance_prompt = (
             "6. **表現の多様性**: 過去の返信と同じ表現の繰り返しは避け、Mayaらしい自然な短文で返信してください。"
         )
         if banned_phrases:
-            avoidance_prompt += f"\n   - 最近使った表現: `{', '.join(banned_phrases)}` は今回は使わず、別の表現で返信してください。"
+            avoidance_prompt += f"\n   - 最近使った表現: `{', '.join(sorted(banned_phrases))}` は今回は使わず、別の表現で返信してください。"
         
         prompt_parts.append(avoidance_prompt)
 
@@ -927,29 +989,62 @@ def generate_reply(thread_data: dict, history: list) -> str:
         )
         prompt_parts.append(lang_prompt)
 
-    prompt = "\n".join(prompt_parts)
-    logging.debug(f"生成されたプロンプト:\n{prompt}")
+    prompt = reply_prompt.render(*prompt_parts)
+    logging.debug(f"生成されたプロンプト:\n{reply_prompt.full_prompt(prompt)}")
 
     try:
-        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-        response = model.generate_content(prompt)
-        reply_body = format_reply(clean_generated_text(response.text), lang)
-        
-        final_reply = f"{nickname}\n{reply_body}" if nickname else reply_body
-
-        # --- セルフチェックの実行 ---
-        # banned_phrases はこのスコープで定義されている
-        is_ok, check_log = self_check_reply(
-            generated_reply=final_reply,
-            thread_data=thread_data,
-            nickname=nickname,
-            banned_phrases=banned_phrases if 'banned_phrases' in locals() else set()
-        )
+        phrase_regenerations = duplicate_regenerations = 0
+        _discard_stats["generated"] += 1
+        while True:
+            _model_call_stats["generate"] += 1
+            response = reply_prompt.generate(prompt)
+            reply_body = format_reply(clean_generated_text(response.text), lang)
+
+            final_reply = f"{nickname}\n{reply_body}" if nickname else reply_body
+
+            # --- 最近使った表現が含まれていれば、その表現を避けるよう指示して再生成 ---
+            matched_phrases = match_phrases(reply_body, banned_phrases)
+            if matched_phrases and phrase_regenerations < PHRASE_INDEX_MAX_REGENERATIONS:
+                phrase_regenerations += 1
+                _discard_stats["phrase_regenerations"] += 1
+                logging.info(f"返信に最近使った表現 {matched_phrases} が含まれているため、再生成します: {reply_body}")
+                prompt += f"\n- 次の表現は最近使ったため使わずに、別の言い回しで返信してください: `{', '.join(matched_phrases)}`"
+                continue
+
+            # --- セルフチェックの実行 ---
+            is_ok, check_log = self_check_reply(
+                generated_reply=final_reply,
+                thread_data=thread_data,
+                nickname=nickname,
+                banned_phrases=banned_phrases
+            )
+
+            if not is_ok:
+                _discard_stats["discarded"] += 1
+                _discard_stats["banned_phrase"] += int(bool(matched_phrases))
+                logging.warning(f"返信ID {thread_data.get('tweet_id', 'N/A')} のセルフチェックで問題を発見: {check_log}")
+                logging.warning(f"  -> この返信は破棄されます: {final_reply.replace(chr(10), '<br>')}")
+                return "" # 問題があったため返信を空にする
+
+            # --- 過去に投稿した返信との類似チェック ---
+            duplicate = find_near_duplicate(reply_body)
+            if duplicate:
+                duplicate_id, similarity = duplicate
+                previous = get_reply_text(duplicate_id) or reply_body
+                logging.warning(
+                    f"返信ID {thread_data.get('tweet_id', 'N/A')} の返信が過去の返信 (ID: {duplicate_id}) と"
+                    f"類似しています (類似度 {similarity:.2f}): {reply_body}"
+                )
+                if duplicate_regenerations < NEAR_DUP_MAX_REGENERATIONS:
+                    duplicate_regenerations += 1
+                    prompt += f"\n- 次の過去の返信とほぼ同じ内容になっています。言い回しを変えて返信してください: `{previous.splitlines()[-1]}`"
+                    continue
+                _discard_stats["discarded"] += 1
+                logging.warning("  -> 再生成しても類似が解消しないため、この返信は破棄されます。")
+                return ""
+            break
 
-        if not is_ok:
-            logging.warning(f"返信ID {thread_data.get('tweet_id', 'N/A')} のセルフチェックで問題を発見: {check_log}")
-            logging.warning(f"  -> この返信は破棄されます: {final_reply.replace(chr(10), '<br>')}")
-            return "" # 問題があったため返信を空にする
+        store_cached_reply(cache_key, reply_body)
 
         log_message = final_reply.replace('\n', '<br>')
         logging.info(f"生成された返信: {log_message}")
@@ -959,75 +1054,114 @@ def generate_reply(thread_data: dict, history: list) -> str:
         logging.error(f"Gemini API呼び出し中にエラー: {e}")
         return ""
 
-# --- パイプライン実行関数 ---
-
-def main_process(driver: webdriver.Chrome, input_csv: str, limit: int = None) -> str | None:
-    logging.info(f"'{input_csv}' の処理を開始します...")
+def record_skip_decision(tweet_id: str, thread_data: dict):
+    """
+    スレッドを解析できたうえで返信対象外と判定したリプライをスキップリストに記録します。
+    次回以降のステップ1ではCSVから除外され、スレッドを開き直さずに済みます。
+    ページを読み込めなかった場合は一時的な失敗の可能性があるため記録しません。
+    """
+    if not thread_data.get("full_timeline"):
+        return
+    if thread_data["should_skip"]:
+        reason = "has_following_replies"
+    elif not thread_data.get("is_my_thread", False):
+        reason = "not_my_thread"
+    else:
+        return
     try:
-        df = pd.read_csv(input_csv)
-        if limit:
-            df = df.head(limit)
-            logging.info(f"処理件数を {limit} 件に制限しました。")
-        df.fillna('', inplace=True)
+        add_skipped_tweet(tweet_id, reason)
+    except Exception as e:
+        logging.warning(f"スキップリストへの記録中にエラー (tweet_id: {tweet_id}): {e}")
 
-        generated_replies_history = []
-        rows_to_drop = [] # 削除対象の行インデックスを格納
+# --- パイプライン実行関数 ---
 
-        for index, row in df.iterrows():
-            tweet_id = str(row['reply_id'])
-            
-            # --- スレッド解析 ---
-            thread_data = fetch_and_analyze_thread(tweet_id, driver)
-            thread_data['tweet_id'] = tweet_id # ログ出力用にIDを追加
-
-            # 取得したライブ情報でDataFrameを更新
-            df.loc[index, 'reply_num'] = thread_data['live_reply_count']
-            df.loc[index, 'like_num'] = thread_data['live_like_count']
-            df.loc[index, 'is_my_thread'] = thread_data['is_my_thread']
-
-            # --- 返信生成の判断 ---
-            # 自分のスレッドで、かつスキップ対象でない場合のみ返信生成を試みる
-            if thread_data and not thread_data["should_skip"] and thread_data.get("is_my_thread", False):
-                generated_reply = generate_reply(thread_data, generated_replies_history)
-                df.loc[index, 'generated_reply'] = generated_reply
-                
-                if generated_reply:
-                    # セルフチェックを通過し、返信が正常に生成された
-                    reply_body = generated_reply.split('\n')[-1]
-                    generated_replies_history.append(reply_body.replace('\n', ' '))
-                else:
-                    # 返信生成を試みたが、セルフチェックで失敗した
-                    rows_to_drop.append(index)
-            else:
-                # そもそも返信対象外（自分のスレッドでない、またはスキップ対象）
-                logging.info(f"  -> Tweet ID {tweet_id} は返信生成の対象外です。")
-                df.loc[index, 'generated_reply'] = "" # 明示的に空にしておく
+def process_row(driver: webdriver.Chrome, row: Dict, generated_replies_history: List[str], thread_data: Dict | None = None) -> Dict:
+    """
+    1件のリプライを解析して返信を生成し、ランに書き戻す結果（列名→値）を返します。
+    thread_data（TabPool で解析済みのスレッド）が無い場合はこの場でスレッドを解析します。
+    生成した返信は generated_replies_history に追加します。
+    """
+    tweet_id = row['reply_id']
 
-        # --- 失敗した行の処理と出力 ---
-        base_name = os.path.basename(input_csv)
-        name_part = base_name.replace('extracted_tweets_', '')
+    # --- スレッド解析 ---
+    if thread_data is None:
+        thread_data = fetch_and_analyze_thread(tweet_id, driver)
+    thread_data['tweet_id'] = tweet_id # ログ出力用にIDを追加
 
-        if rows_to_drop:
-            # 失敗した行を新しいDataFrameとして抽出し、別ファイルに保存
-            failed_df = df.loc[rows_to_drop].copy()
-            failed_output_filename = os.path.join("output", f"failed_selfcheck_{name_part}")
-            failed_df.to_csv(failed_output_filename, index=False, encoding='utf-8-sig')
-            logging.info(f"セルフチェックに失敗した {len(rows_to_drop)} 件を {failed_output_filename} に保存しました。")
+    # 取得したライブ情報をランに書き戻す
+    result = {
+        "reply_num": thread_data['live_reply_count'],
+        "like_num": thread_data['live_like_count'],
+        "is_my_thread": thread_data['is_my_thread'],
+        "generated_reply": "",
+        "analyzed": True,
+    }
 
-            # 元のDataFrameから失敗した行を削除
-            df.drop(rows_to_drop, inplace=True)
-            logging.info("メインの処理対象から上記失敗件数を除外しました。")
+    # --- 返信生成の判断 ---
+    # 自分のスレッドで、かつスキップ対象でない場合のみ返信生成を試みる
+    if thread_data and not thread_data["should_skip"] and thread_data.get("is_my_thread", False):
+        generated_reply = generate_reply(thread_data, generated_replies_history)
+        result["generated_reply"] = generated_reply
 
+        if generated_reply:
+            # セルフチェックを通過し、返信が正常に生成された
+            reply_body = generated_reply.split('\n')[-1]
+            generated_replies_history.append(reply_body.replace('\n', ' '))
+        else:
+            # 返信生成を試みたが、セルフチェックで失敗した
+            result["selfcheck_failed"] = True
+    else:
+        # そもそも返信対象外（自分のスレッドでない、またはスキップ対象）
+        logging.info(f"  -> Tweet ID {tweet_id} は返信生成の対象外です。")
+        record_skip_decision(tweet_id, thread_data)
+    return result
+
+def main_process(driver: webdriver.Chrome, input_csv: str | None = None, limit: int = None, run_id: str | None = None) -> str | None:
+    """
+    ランストアの未解析のリプライを収集順に読みながら解析・返信生成し、1行終わるごとに
+    ランへの書き戻しと確認用CSVへの追記を行います（全件をメモリに載せません）。
+    run_id を指定しない場合は input_csv（extracted_tweets_*.csv）をランに取り込みます。
+    途中で中断しても、再実行すると未解析の行から続きを処理します。成功した場合は run_id を返します。
+    """
+    logging.info(f"'{run_id or input_csv}' の処理を開始します...")
+    try:
+        init_db()
+        run_id = resolve_run(input_csv, run_id)
+        if limit:
+            logging.info(f"処理件数を {limit} 件に制限しました。")
 
-        # --- 正常な行の出力処理 ---
-        output_filename = os.path.join("output", f"processed_replies_{name_part}")
-        
-        df.to_csv(output_filename, index=False, encoding='utf-8-sig')
-        logging.info(f"--- 全件の処理が完了し、{output_filename} に保存されました ---")
-        return output_filename
+        generated_replies_history = []
+        rows = iter_rows(run_id, limit=limit, analyzed=False)
+        apply_policy(driver, "analyze")
+        with RowSink(run_id) as sink:
+            if THREAD_TAB_POOL_SIZE > 1:
+                # 複数のタブでスレッドページの読み込みを重ね、解析が終わった行から返信を生成する
+                with TabPool(driver, THREAD_TAB_POOL_SIZE, resource_stage="analyze") as pool:
+                    for row, thread_data in pool.imap(lambda row, tab_driver: analyze_thread_steps(row['reply_id'], tab_driver), rows):
+                        sink.write(row, **process_row(driver, row, generated_replies_history, thread_data))
+            else:
+                for row in rows:
+                    sink.write(row, **process_row(driver, row, generated_replies_history))
+            output_paths = sink.paths()
+
+        if sink.counts["failed_selfcheck"]:
+            logging.info(f"セルフチェックに失敗した {sink.counts['failed_selfcheck']} 件はステップ3の対象から除外されます。")
+        logging.info(
+            f"--- 全件の処理が完了しました (ラン: {run_id}, 今回の処理: {sum(sink.counts.values())} 件, "
+            f"出力: {output_paths.get('processed') or 'なし'}) ---"
+        )
+        cache_stats = get_cache_stats()
+        prompt_stats = get_prompt_stats()
+        logging.info(
+            f"AI呼び出し回数: 生成={_model_call_stats['generate']}, セルフチェック={_model_call_stats['self_check']} / "
+            f"返信キャッシュ: ヒット={cache_stats['hits']}, ミス={cache_stats['misses']}, 保存={cache_stats['stores']} / "
+            f"プロンプト送信量: {prompt_stats['sent_bytes']:,} バイト (全文送信時 {prompt_stats['full_bytes']:,} バイト)"
+        )
+        logging.info(format_discard_stats())
+        return run_id
 
     except FileNotFoundError:
-        logging.error(f"入力ファイルが見つかりません: {input_csv}")
+        logging.error(f"入力ファイルまたはランが見つかりません: {run_id or input_csv}")
         return None
     except Exception as e:
         logging.error(f"メインプロセス中に予期せぬエラー: {e}", exc_info=True)
@@ -1035,7 +1169,8 @@ def main_process(driver: webdriver.Chrome, input_csv: str, limit: int = None) ->
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="スレッドを解析し、文脈に応じた返信を生成します。")
-    parser.add_argument("input_csv", help="入力CSVファイルのパス (extracted_tweets_...csv)")
+    parser.add_argument("input_csv", nargs='?', help="入力CSVファイルのパス (extracted_tweets_...csv)")
+    parser.add_argument("--run-id", help="CSVの代わりにランストアのランを処理します")
     parser.add_argument("--limit", type=int, help="処理するリプライの最大数")
     parser.add_argument("--headless", action='store_true', help="このフラグを立てると、ブラウザをヘッドレスモード（非表示）で起動します。")
     args = parser.parse_args()
@@ -1044,7 +1179,7 @@ if __name__ == '__main__':
     try:
         driver = setup_driver(headless=args.headless)
         if driver:
-            main_process(driver, args.input_csv, args.limit)
+            main_process(driver, args.input_csv, args.limit, run_id=args.run_id)
     finally:
         if driver:
             driver.quit()
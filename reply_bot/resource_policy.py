@@ -0,0 +1,124 @@
+"""
+ステージごとのリソースのブロック
+通知ページやスレッドページでは使わない画像・動画・Webフォント・計測用のリクエストを、DevToolsの
+Network.setBlockedURLs でブラウザ側で破棄する。ブロックするカテゴリはステージ（collect / analyze / post）ごとに
+RESOURCE_BLOCK_STAGES で決め、返信欄を使う post では画像・フォントを読み込む。
+設定はタブ（DevToolsのターゲット）ごとに有効なため、タブを開いたりステージが変わったりしたら apply_policy を呼ぶ。
+--bench で、ブロックの有無によるページの転送量と読み込み時間を比べられる。
+"""
+
+import argparse
+import logging
+import time
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from .config import RESOURCE_BLOCK_ENABLED, RESOURCE_BLOCK_PATTERNS, RESOURCE_BLOCK_STAGES, PAGE_LOAD_TIMEOUT_SECONDS
+
+# (セッションID, ウィンドウハンドル) -> 適用済みのパターン（同じ内容の再設定を省く）
+_applied = {}
+
+# ページの転送量（Resource Timing）。転送量を公開しないクロスオリジンのリソースは 0 バイトとして数えられる
+_MEASURE_SCRIPT = """
+const navigation = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+return {
+    requests: resources.length + 1,
+    bytes: resources.reduce((sum, entry) => sum + (entry.transferSize || 0), navigation ? navigation.transferSize : 0),
+    dom_ms: navigation ? navigation.domContentLoadedEventEnd : null,
+};
+"""
+
+def patterns_for(stage: str) -> list:
+    """ステージでブロックするURLのパターンを返します。"""
+    if not RESOURCE_BLOCK_ENABLED:
+        return []
+    patterns = []
+    for category in RESOURCE_BLOCK_STAGES.get(stage, []):
+        patterns += RESOURCE_BLOCK_PATTERNS.get(category, [])
+    return patterns
+
+def apply_policy(driver: webdriver.Chrome, stage: str | None) -> bool:
+    """
+    現在のタブに stage のブロック設定を適用します（None の場合はブロックを解除します）。
+    DevToolsのコマンドが使えない場合は警告を出して False を返し、ブロックせずに続行します。
+    """
+    patterns = patterns_for(stage) if stage else []
+    try:
+        key = (driver.session_id, driver.current_window_handle)
+        if _applied.get(key) == patterns:
+            return True
+        if key not in _applied:
+            driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        _applied[key] = patterns
+        logging.debug(f"リソースのブロック設定を適用しました (stage: {stage}, パターン: {len(patterns)} 件)。")
+        return True
+    except Exception as e:
+        logging.warning(f"リソースのブロック設定を適用できませんでした（ブロックせずに続行します）: {e}")
+        return False
+
+def measure_page(driver: webdriver.Chrome, url: str, timeout: float = PAGE_LOAD_TIMEOUT_SECONDS * 2) -> dict:
+    """url を開き、ツイートが表示されるまでの時間と転送量を測ります。"""
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    start = time.perf_counter()
+    driver.get(url)
+    try:
+        WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.XPATH, '//article[@data-testid="tweet"]'))
+        )
+    except Exception:
+        logging.warning(f"{url} でツイートの表示を確認できませんでした。")
+    ready_seconds = time.perf_counter() - start
+    stats = driver.execute_script(_MEASURE_SCRIPT)
+    return dict(stats, url=url, ready_seconds=round(ready_seconds, 2))
+
+def benchmark(driver: webdriver.Chrome, urls: list, stage: str = "collect", repeat: int = 2) -> list:
+    """各URLをブロックなし・stage のブロックありで repeat 回ずつ開き、平均の転送量と表示までの時間を返します。"""
+    results = []
+    for url in urls:
+        row = {"url": url}
+        for label, policy in (("off", None), ("on", stage)):
+            apply_policy(driver, policy)
+            samples = [measure_page(driver, url) for _ in range(repeat)]
+            row[label] = {
+                "requests": sum(s["requests"] for s in samples) / repeat,
+                "bytes": sum(s["bytes"] for s in samples) / repeat,
+                "ready_seconds": sum(s["ready_seconds"] for s in samples) / repeat,
+            }
+        results.append(row)
+    apply_policy(driver, None)
+    return results
+
+if __name__ == '__main__':
+    from .utils import setup_driver, close_driver
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="ステージごとのリソースのブロック設定の確認と効果の計測")
+    parser.add_argument("--bench", action='store_true', help="ブロックの有無でページの転送量と表示までの時間を比べます")
+    parser.add_argument("--stage", choices=sorted(RESOURCE_BLOCK_STAGES), default="collect", help="計測に使うステージの設定")
+    parser.add_argument("--url", action='append', help="計測するページ（複数指定可。既定は通知（メンション）ページ）")
+    parser.add_argument("--repeat", type=int, default=2, help="1ページあたりの計測回数")
+    parser.add_argument("--headless", action='store_true', help="ブラウザをヘッドレスモードで起動します")
+    args = parser.parse_args()
+
+    if not args.bench:
+        for stage in sorted(RESOURCE_BLOCK_STAGES):
+            print(f"{stage}: {', '.join(RESOURCE_BLOCK_STAGES[stage]) or '(なし)'} ({len(patterns_for(stage))} パターン)")
+    else:
+        driver = setup_driver(headless=args.headless)
+        try:
+            if driver:
+                for row in benchmark(driver, args.url or ["https://x.com/notifications/mentions"], args.stage, args.repeat):
+                    off, on = row["off"], row["on"]
+                    print(
+                        f"{row['url']}\n"
+                        f"  ブロックなし: {off['requests']:.0f} リクエスト, {off['bytes'] / 1024:,.0f} KB, 表示まで {off['ready_seconds']:.2f} 秒\n"
+                        f"  ブロックあり: {on['requests']:.0f} リクエスト, {on['bytes'] / 1024:,.0f} KB, 表示まで {on['ready_seconds']:.2f} 秒\n"
+                        f"  削減: {(off['bytes'] - on['bytes']) / 1024:,.0f} KB, {off['ready_seconds'] - on['ready_seconds']:.2f} 秒"
+                    )
+        finally:
+            close_driver()
@@ -0,0 +1,109 @@
+"""
+DBの保持期間の管理と圧縮
+保持期間を過ぎた返信済みツイートを replied_archive に移し（類似チェックには引き続き使う）、
+期限切れのキャッシュ・スキップリスト・行動ジャーナルと古いユーザー設定の変更履歴を上限件数ずつ削除してから、
+空きページを incremental_vacuum で少しずつ解放する
+（auto_vacuum を INCREMENTAL に切り替えるVACUUMは --enable-incremental-vacuum で明示的に一度だけ行う）
+"""
+
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+
+from .config import (
+    RETENTION_ENABLED, RETENTION_INTERVAL_HOURS, REPLIED_RETENTION_DAYS, ARCHIVE_RETENTION_DAYS,
+    JOURNAL_RETENTION_DAYS, RUN_RETENTION_DAYS, RETENTION_BATCH_SIZE, INCREMENTAL_VACUUM_PAGES,
+    REPLY_CACHE_TTL_HOURS, SKIP_LIST_TTL_HOURS, PREFERENCE_CHANGES_KEEP
+)
+from .db import (
+    init_db, archive_replied_before, delete_rows_before, delete_orphan_signatures, delete_old_preference_changes,
+    get_last_maintenance, set_last_maintenance, incremental_vacuum, enable_incremental_vacuum, get_db_stats
+)
+
+_TASK_NAME = "retention"
+
+def _cutoff(**delta) -> str:
+    return (datetime.now() - timedelta(**delta)).isoformat()
+
+def _in_batches(step, batch_size: int) -> int:
+    """step(batch_size) が batch_size 件未満を返すまで繰り返し、合計件数を返します。"""
+    total = 0
+    while True:
+        count = step(batch_size)
+        total += count
+        if count < batch_size:
+            return total
+
+def run_retention(batch_size: int = RETENTION_BATCH_SIZE, vacuum_pages: int = INCREMENTAL_VACUUM_PAGES) -> dict:
+    """保持期間の処理を1回行い、テーブルごとの移動・削除件数を返します。"""
+    init_db()
+    start = time.perf_counter()
+    replied_cutoff = _cutoff(days=REPLIED_RETENTION_DAYS)
+    deletions = {
+        "replied_archive": _cutoff(days=ARCHIVE_RETENTION_DAYS),
+        "reply_cache": _cutoff(hours=REPLY_CACHE_TTL_HOURS),
+        "skip_list": _cutoff(hours=SKIP_LIST_TTL_HOURS),
+        "action_journal": _cutoff(days=JOURNAL_RETENTION_DAYS),
+        "run_rows": _cutoff(days=RUN_RETENTION_DAYS),
+        "runs": _cutoff(days=RUN_RETENTION_DAYS),
+    }
+
+    result = {"archived_replied": _in_batches(lambda limit: archive_replied_before(replied_cutoff, limit), batch_size)}
+    for table, cutoff in deletions.items():
+        result[f"deleted_{table}"] = _in_batches(lambda limit: delete_rows_before(table, cutoff, limit), batch_size)
+    result["deleted_user_preference_changes"] = _in_batches(
+        lambda limit: delete_old_preference_changes(PREFERENCE_CHANGES_KEEP, limit), batch_size
+    )
+    result["deleted_signatures"] = delete_orphan_signatures()
+    result["vacuumed_pages"] = incremental_vacuum(vacuum_pages)
+    set_last_maintenance(_TASK_NAME)
+
+    logging.info(
+        f"DBの保持期間の処理が完了しました ({time.perf_counter() - start:.2f} 秒): "
+        + ", ".join(f"{name}={count}" for name, count in result.items())
+    )
+    return result
+
+def run_retention_if_due() -> dict | None:
+    """前回の処理から RETENTION_INTERVAL_HOURS 時間以上経っている場合だけ保持期間の処理を行います。"""
+    if not RETENTION_ENABLED:
+        return None
+    try:
+        init_db()
+        last_run = get_last_maintenance(_TASK_NAME)
+        if last_run and datetime.fromisoformat(last_run) > datetime.now() - timedelta(hours=RETENTION_INTERVAL_HOURS):
+            return None
+        return run_retention()
+    except Exception as e:
+        logging.warning(f"DBの保持期間の処理中にエラー: {e}")
+        return None
+
+def format_report(stats: dict) -> str:
+    """get_db_stats() の結果を表示用の文字列にします。"""
+    lines = [
+        f"DB: {stats['path']}",
+        f"  サイズ: {stats['size_bytes'] / 1024:,.1f} KB (WAL: {stats['wal_bytes'] / 1024:,.1f} KB)",
+        f"  ページ: {stats['page_count']:,} x {stats['page_size']} バイト, 空き: {stats['freelist_count']:,}"
+        f" (auto_vacuum={'INCREMENTAL' if stats['auto_vacuum'] == 2 else stats['auto_vacuum']})",
+    ]
+    lines += [f"  {table:<24} {count:>10,} 行" for table, count in stats["tables"].items()]
+    return "\n".join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="DBの保持期間の処理（アーカイブ・削除・圧縮）とサイズの確認")
+    parser.add_argument("--run", action='store_true', help="前回の実行時刻に関係なく保持期間の処理を行います")
+    parser.add_argument("--enable-incremental-vacuum", action='store_true',
+                        help="既存のDBの auto_vacuum を INCREMENTAL に切り替えます（VACUUMでDB全体を書き直すため、ボットを止めてから実行してください）")
+    args = parser.parse_args()
+
+    init_db()
+    if args.enable_incremental_vacuum:
+        start = time.perf_counter()
+        if enable_incremental_vacuum():
+            print(f"auto_vacuum を INCREMENTAL に切り替えました ({time.perf_counter() - start:.1f} 秒)")
+        else:
+            print("auto_vacuum は既に INCREMENTAL です")
+    if args.run:
+        run_retention()
+    print(format_report(get_db_stats()))
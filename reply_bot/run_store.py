@@ -0,0 +1,271 @@
+"""
+ステージ間のリプライの受け渡し（ランストア）
+ステップ1で収集したリプライを run_id ごとにSQLiteの run_rows テーブルへ型付きで保存し、
+ステップ2・3は行を収集順に少しずつ読みながら、結果を1行ずつ書き戻す（RowSink はCSVへの追記も行う）。
+CSVは確認用の出力物（RUN_STORE_EXPORT_CSV）で、既存のCSVを取り込んで途中のステップから再実行することもできる。
+"""
+
+import argparse
+import csv
+import logging
+import math
+import os
+from datetime import datetime
+from typing import Dict, Iterator
+
+from .config import RUN_STORE_EXPORT_CSV
+from .db import (
+    RUN_ROW_COLUMNS, init_db, add_run, run_exists, get_runs, add_run_rows, update_run_row,
+    get_run_rows_page, get_run_counts
+)
+
+# 列ごとの型（CSVから読み込んだ文字列・NaN・空欄をこの型に揃える）
+_INT_COLUMNS = {"reply_num", "like_num"}
+_BOOL_COLUMNS = {"is_my_thread", "liked", "analyzed", "selfcheck_failed", "posted"}
+
+# CSVに出力する列
+EXTRACTED_COLUMNS = ["UserID", "Name", "date_time", "reply_id", "reply_to", "contents", "reply_num", "like_num", "is_my_thread", "lang", "liked"]
+PROCESSED_COLUMNS = EXTRACTED_COLUMNS + ["generated_reply"]
+
+_PAGE_SIZE = 200
+
+def _coerce(column: str, value):
+    """値を列の型に変換します。"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        value = ""
+    if column in _BOOL_COLUMNS:
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "1", "yes")
+        return bool(value)
+    if column in _INT_COLUMNS:
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return 0
+    return str(value)
+
+def _typed(row: dict) -> dict:
+    return {column: _coerce(column, value) for column, value in row.items() if column in RUN_ROW_COLUMNS}
+
+def new_run_id() -> str:
+    return datetime.now().strftime('%Y%m%d_%H%M%S')
+
+def run_id_from_path(path: str) -> str:
+    """'output/extracted_tweets_20250711_161308.csv' のようなパスから run_id を取り出します。"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    for prefix in ("extracted_tweets_", "processed_replies_", "failed_selfcheck_"):
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+def start_run(run_id: str | None = None, source: str = '') -> str:
+    """ランを作成し（既にある場合はそのまま）、run_id を返します。"""
+    init_db()
+    run_id = run_id or new_run_id()
+    add_run(run_id, source)
+    return run_id
+
+def add_rows(run_id: str, rows: list[dict]) -> int:
+    """ステップ1で収集したリプライを追加します。"""
+    if not rows:
+        return 0
+    # 行ごとに列が欠けていても、型のある列は NULL ではなく既定値（0・False）で揃える（analyzed=False などの条件に一致させるため）
+    defaults = {column: _coerce(column, None) for column in _INT_COLUMNS | _BOOL_COLUMNS}
+    return add_run_rows(run_id, [dict(defaults, **_typed(row), reply_id=str(row["reply_id"])) for row in rows])
+
+def update_row(run_id: str, reply_id, **fields):
+    """1行の結果を書き戻します（例: update_row(run_id, tweet_id, liked=True)）。"""
+    update_run_row(run_id, str(reply_id), {column: _coerce(column, value) for column, value in fields.items()})
+
+def iter_rows(run_id: str, limit: int | None = None, **conditions) -> Iterator[Dict]:
+    """
+    ランの行を収集順に返します。DBからは _PAGE_SIZE 件ずつ読み込むため、
+    反復中に update_row で書き戻しても構いません。conditions は {列名: 値} の等価条件です。
+    """
+    conditions = _typed(conditions)
+    after_seq, yielded = 0, 0
+    while limit is None or yielded < limit:
+        page = get_run_rows_page(run_id, after_seq, _PAGE_SIZE, conditions)
+        if not page:
+            return
+        for seq, reply_id, *values in page:
+            row = {column: _coerce(column, value) for column, value in zip(RUN_ROW_COLUMNS, values)}
+            row["reply_id"] = reply_id
+            yield row
+            yielded += 1
+            if limit is not None and yielded >= limit:
+                return
+        after_seq = page[-1][0]
+
+def get_summary(run_id: str) -> dict:
+    return get_run_counts(run_id)
+
+def export_csv(run_id: str, path: str, columns: list = PROCESSED_COLUMNS, **conditions) -> int:
+    """ランの行をCSVに書き出し、書き出した件数を返します。"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for row in iter_rows(run_id, **conditions):
+            writer.writerow(row)
+            count += 1
+    return count
+
+def export_stage_csv(run_id: str, stage: str, force: bool = False) -> str | None:
+    """
+    ステージの結果を従来と同じ名前のCSVに書き出します（RUN_STORE_EXPORT_CSV=False の場合は force=True の時のみ）。
+    stage は 'extracted' / 'processed' / 'failed_selfcheck' です。
+    """
+    if not RUN_STORE_EXPORT_CSV and not force:
+        return None
+    path = _stage_csv_path(run_id, stage)
+    if stage == "extracted":
+        columns, conditions = EXTRACTED_COLUMNS, {}
+    elif stage == "processed":
+        columns, conditions = PROCESSED_COLUMNS, {"analyzed": True, "selfcheck_failed": False}
+    else:
+        columns, conditions = PROCESSED_COLUMNS, {"selfcheck_failed": True}
+    count = export_csv(run_id, path, columns, **conditions)
+    logging.info(f"ラン {run_id} の {count} 件を {path} に書き出しました。")
+    return path
+
+def _stage_csv_path(run_id: str, stage: str) -> str:
+    prefix = {"extracted": "extracted_tweets", "processed": "processed_replies", "failed_selfcheck": "failed_selfcheck"}[stage]
+    return os.path.join("output", f"{prefix}_{run_id}.csv")
+
+
+class RowSink:
+    """
+    ステージの結果の書き込み先
+    write() のたびにランへ1行書き戻し、確認用のCSV（processed_replies / failed_selfcheck）にも
+    1行追記してフラッシュする。再開時は既存のCSVの続きに追記する。
+    """
+
+    def __init__(self, run_id: str, export: bool = RUN_STORE_EXPORT_CSV):
+        self.run_id = run_id
+        self.export = export
+        self._files = {}
+        self.counts = {"processed": 0, "failed_selfcheck": 0}
+
+    def _writer(self, stage: str):
+        if stage not in self._files:
+            path = _stage_csv_path(self.run_id, stage)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            resume = os.path.exists(path) and os.path.getsize(path) > 0
+            f = open(path, 'a', newline='', encoding='utf-8-sig')
+            writer = csv.DictWriter(f, fieldnames=PROCESSED_COLUMNS, extrasaction='ignore')
+            if not resume:
+                writer.writeheader()
+            self._files[stage] = (f, writer)
+        return self._files[stage]
+
+    def write(self, row: dict, **fields):
+        """row（iter_rows の1行）に fields の結果を書き戻します。"""
+        update_row(self.run_id, row["reply_id"], **fields)
+        record = dict(row, **{column: _coerce(column, value) for column, value in fields.items()})
+        if not record.get("analyzed"):
+            return
+        stage = "failed_selfcheck" if record.get("selfcheck_failed") else "processed"
+        self.counts[stage] += 1
+        if self.export:
+            f, writer = self._writer(stage)
+            writer.writerow(record)
+            f.flush()
+
+    def paths(self) -> dict:
+        return {stage: f.name for stage, (f, _) in self._files.items()}
+
+    def close(self):
+        for f, _ in self._files.values():
+            f.close()
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def import_csv(path: str) -> str:
+    """
+    既存の extracted_tweets / processed_replies のCSVをランに取り込み、run_id を返します。
+    processed_replies の場合は解析済みとして取り込み、既にある行の返信文（手で編集した内容を含む）と
+    「いいね」の状態はCSVの内容で更新します。
+    """
+    run_id = start_run(run_id_from_path(path), source=path)
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = [row for row in csv.DictReader(f) if row.get("reply_id")]
+    processed = "generated_reply" in (rows[0] if rows else {})
+    for row in rows:
+        row["reply_id"] = str(row["reply_id"]).split('.')[0]
+        if processed:
+            row["analyzed"] = True
+    added = add_rows(run_id, rows)
+    if processed:
+        for row in rows:
+            fields = {"generated_reply": row.get("generated_reply"), "is_my_thread": row.get("is_my_thread")}
+            if _coerce("liked", row.get("liked")):
+                fields["liked"] = True
+            update_row(run_id, row["reply_id"], analyzed=True, **fields)
+    logging.info(f"'{path}' をラン {run_id} に取り込みました（新規 {added} 件 / 全 {len(rows)} 件）。")
+    return run_id
+
+def csv_reply_ids(path: str) -> list[str]:
+    """CSVに含まれる reply_id を順に返します。"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return [str(row["reply_id"]).split('.')[0] for row in csv.DictReader(f) if row.get("reply_id")]
+
+def sync_csv(run_id: str, path: str, columns: tuple = ("liked",)) -> int:
+    """
+    入力として渡されたCSVの指定した列を、ランの値で書き換えます（他の列と行の順序はそのまま）。
+    書き換えた行数を返します。
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        fieldnames = list(reader.fieldnames or [])
+        rows = list(reader)
+    fieldnames += [column for column in columns if column not in fieldnames]
+    current = {row["reply_id"]: row for row in iter_rows(run_id)}
+    changed = 0
+    for row in rows:
+        stored = current.get(str(row.get("reply_id", "")).split('.')[0])
+        if not stored:
+            continue
+        for column in columns:
+            if str(row.get(column)) != str(stored[column]):
+                row[column] = stored[column]
+                changed += 1
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    return changed
+
+def resolve_run(input_csv: str | None = None, run_id: str | None = None) -> str:
+    """ステージの入力（run_id またはCSVのパス）から run_id を決めます。"""
+    if run_id:
+        init_db()
+        if not run_exists(run_id):
+            raise FileNotFoundError(f"ラン {run_id} が見つかりません")
+        return run_id
+    if not input_csv or not os.path.exists(input_csv):
+        raise FileNotFoundError(input_csv)
+    return import_csv(input_csv)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="ステージ間のリプライの受け渡し（ランストア）の確認・取り込み・書き出し")
+    parser.add_argument("--import", dest="import_path", metavar="CSV", help="extracted_tweets / processed_replies のCSVを取り込みます")
+    parser.add_argument("--export", metavar="RUN_ID", help="ランをCSVに書き出します")
+    parser.add_argument("--stage", choices=["extracted", "processed", "failed_selfcheck"], default="processed", help="--export で書き出す内容")
+    args = parser.parse_args()
+
+    init_db()
+    if args.import_path:
+        print(f"run_id: {import_csv(args.import_path)}")
+    elif args.export:
+        print(export_stage_csv(args.export, args.stage, force=True))
+    else:
+        for run_id, source, created_at, rows in get_runs():
+            print(f"{run_id}  {created_at[:19]}  {rows:>5} 件  {get_summary(run_id)}  {source or ''}")
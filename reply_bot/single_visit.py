@@ -0,0 +1,241 @@
+import argparse
+import logging
+import time
+
+from selenium import webdriver
+from selenium.webdriver.support.ui import WebDriverWait
+
+from .action_journal import ACTION_LIKE, ACTION_REPLY, completed_actions, resolve_pending, reconcile_replied
+from .config import POST_INTERVAL_SECONDS
+from .db import init_db
+from .post_reply import like_current_tweet, can_reply_on_current_page, post_reply_on_current_page
+from .post_scheduler import PostScheduler
+from .reply_cache import get_cache_stats
+from .reply_processor import (
+    fetch_and_analyze_thread, generate_reply, get_model_call_stats, format_discard_stats, record_skip_decision
+)
+from .resource_policy import apply_policy
+from .thread_probe import probe_thread
+from .run_store import resolve_run, iter_rows, update_row, export_stage_csv
+from .utils import setup_driver
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def _bring_target_into_view(driver: webdriver.Chrome, tweet_id: str):
+    """
+    スレッド解析のスクロールで対象ツイートが画面外（DOMから外れた状態）になっていることがあるため、
+    対象ツイートを画面内に戻します。見つからない場合はページ先頭に戻します。
+    """
+    found = driver.execute_script(
+        """
+        const link = document.querySelector(`article[data-testid="tweet"] a[href*="/status/${arguments[0]}"]`);
+        if (link) { link.closest('article').scrollIntoView({block: 'center'}); return true; }
+        window.scrollTo(0, 0);
+        return false;
+        """,
+        str(tweet_id)
+    )
+    time.sleep(0.5)
+    return found
+
+def _thread_changed_since_analysis(driver: webdriver.Chrome, tweet_id: str, analysed_probe: dict | None) -> bool:
+    """
+    返信生成の間に返信が付いていないかを、ページを移動せずに表示中のDOMで確認します。
+    少しスクロールして遅延描画された後続ツイートを読み込ませてから対象ツイートに戻り、
+    解析直後のプローブ（analysed_probe）より対象の返信数が増えている場合、または確認できなかった場合はTrueを返します。
+    """
+    try:
+        driver.execute_script("window.scrollBy(0, window.innerHeight);")
+        time.sleep(1)
+        _bring_target_into_view(driver, tweet_id)
+    except Exception as e:
+        logging.warning(f"tweet_id: {tweet_id} のスクロール中にエラー: {e}")
+    probe = probe_thread(driver, tweet_id)
+    if probe is None or probe["target_index"] == -1:
+        return True
+    # 同じスクリプトで読んだ返信数同士を比べる（解析時の返信数とは読み取り方が異なるため使わない）
+    before = analysed_probe.get("target_reply_count") if analysed_probe else None
+    after = probe.get("target_reply_count")
+    if before is not None and after is not None and after > before:
+        logging.warning(f"tweet_id: {tweet_id} の返信数が解析時の {before} 件から {after} 件に増えています。")
+        return True
+    return False
+
+def main_process(driver: webdriver.Chrome, input_csv: str | None = None, dry_run: bool = True, limit: int | None = None,
+                 interval: int = POST_INTERVAL_SECONDS, run_id: str | None = None) -> str | None:
+    """
+    ステップ2（スレッド解析・返信生成）とステップ3（いいね・返信投稿）を1回のページ訪問で行います。
+    ランストアの未解析のリプライ（run_id を指定しない場合は input_csv を取り込んだもの）のページを開いて解析し、
+    返信を生成した後、同じページのまま「いいね」を行い、表示中のDOMで返信数と後続ツイートの有無を再確認してから返信します。
+    ステップ1で返信対象外と判定済みとして解析を省いた行は、最後にページを開いて「いいね」だけ行います。
+    結果はランに1行ずつ書き戻し、processed_replies_*.csv にも書き出します。成功した場合は run_id を返します。
+    """
+    if dry_run:
+        logging.info("=== ドライランモードで実行します ===")
+    else:
+        logging.warning("★★★ ライブモードで実行します ★★★")
+
+    logging.info(f"'{run_id or input_csv}' の処理を開始します（1回訪問モード）...")
+    try:
+        init_db()
+        run_id = resolve_run(input_csv, run_id)
+        rows = list(iter_rows(run_id, limit=limit, analyzed=False))
+        # ステップ1で返信対象外と判定済みとして解析を省いた行は、ページを開いて「いいね」だけ行う
+        like_rows = [
+            row for row in iter_rows(run_id, limit=limit, analyzed=True, liked=False, selfcheck_failed=False)
+            if not row['generated_reply'].strip()
+        ]
+        if limit:
+            logging.info(f"処理件数を {limit} 件に制限しました。")
+
+        # 解析と返信を同じページで行うため、返信欄に必要な画像・フォントは読み込む（post の設定）
+        apply_policy(driver, "post")
+
+        # 行動ジャーナル: 前回中断したアクションを解決し、完了済みのアクションは繰り返さない
+        if not dry_run:
+            resolve_pending(driver)
+            reconcile_replied()
+        completed = completed_actions([row['reply_id'] for row in rows + like_rows])
+
+        generated_replies_history = []
+        page_loads = 0
+        counts = {"generated": 0, "posted": 0}
+        # 解析・生成にかかる時間をアクション間の待ち時間に充て、不足分だけ待機する
+        scheduler = PostScheduler(reply_interval=interval)
+
+        for position, row in enumerate(rows, start=1):
+            tweet_id = row['reply_id']
+            logging.info(f"--- 処理中: {position}/{len(rows)} (tweet_id: {tweet_id}) ---")
+            # ステップ1でタイムライン上の「いいね」が済んでいる行はそのまま引き継ぐ
+            liked = row['liked'] or (tweet_id, ACTION_LIKE) in completed
+            if (tweet_id, ACTION_REPLY) in completed:
+                logging.info(f"  -> Tweet ID {tweet_id} は行動ジャーナル上で返信済みのため、ページを開かずにスキップします。")
+                update_row(run_id, tweet_id, liked=liked, analyzed=True)
+                continue
+
+            # --- スレッド解析（このリプライでのページ訪問はここだけ） ---
+            thread_data = fetch_and_analyze_thread(tweet_id, driver)
+            thread_data['tweet_id'] = tweet_id
+            page_loads += 1
+            analysed_probe = None
+            if thread_data["full_timeline"] and not thread_data["should_skip"] and thread_data.get("is_my_thread", False):
+                # 投稿直前の再確認と比べるため、返信生成の前に対象ツイートの状態を記録する
+                _bring_target_into_view(driver, tweet_id)
+                analysed_probe = probe_thread(driver, tweet_id)
+            result = {
+                "reply_num": thread_data['live_reply_count'],
+                "like_num": thread_data['live_like_count'],
+                "is_my_thread": thread_data['is_my_thread'],
+                "generated_reply": "",
+                "analyzed": True,
+                "liked": liked,
+            }
+
+            try:
+                # --- 返信生成 ---
+                generated_reply = ""
+                if not thread_data["should_skip"] and thread_data.get("is_my_thread", False):
+                    generated_reply = generate_reply(thread_data, generated_replies_history)
+                    result["generated_reply"] = generated_reply
+                    if generated_reply:
+                        counts["generated"] += 1
+                        generated_replies_history.append(generated_reply.split('\n')[-1])
+                    else:
+                        result["selfcheck_failed"] = True
+                else:
+                    logging.info(f"  -> Tweet ID {tweet_id} は返信生成の対象外です。")
+                    record_skip_decision(tweet_id, thread_data)
+
+                # --- 同じページのまま「いいね」 ---
+                wait = WebDriverWait(driver, 20)
+                if not thread_data["full_timeline"]:
+                    logging.warning(f"tweet_id: {tweet_id} のページを解析できなかったため、「いいね」と返信をスキップします。")
+                    continue
+                _bring_target_into_view(driver, tweet_id)
+                if not liked:
+                    scheduler.wait_for('like')
+                    if like_current_tweet(driver, tweet_id, dry_run, wait):
+                        result["liked"] = True
+                        scheduler.record('like', tweet_id)
+                    elif dry_run:
+                        scheduler.record('like', tweet_id)
+
+                if not generated_reply:
+                    continue
+
+                # --- 生成中に返信が付いていないかを、ページを移動せずに再確認してから投稿 ---
+                logging.info("返信の重複チェック（返信数と後続ツイートの有無）を行います...")
+                if _thread_changed_since_analysis(driver, tweet_id, analysed_probe):
+                    logging.info("解析後にスレッドが変化した（または確認できなかった）ため、安全のため返信をスキップします。")
+                    continue
+                if not can_reply_on_current_page(driver, tweet_id):
+                    logging.info("重複チェックにより返信をスキップします。")
+                    continue
+                scheduler.wait_for('reply', tweet_id)
+                if post_reply_on_current_page(
+                    driver, tweet_id, generated_reply, dry_run, wait,
+                    user_id=row['UserID'], is_my_thread=bool(thread_data['is_my_thread'])
+                ):
+                    result["posted"] = not dry_run
+                    counts["posted"] += int(not dry_run)
+                    scheduler.record('reply')
+            finally:
+                update_row(run_id, tweet_id, **result)
+
+        for row in like_rows:
+            tweet_id = row['reply_id']
+            if (tweet_id, ACTION_LIKE) in completed:
+                update_row(run_id, tweet_id, liked=True)
+                continue
+            logging.info(f"--- 「いいね」のみ (tweet_id: {tweet_id}) ---")
+            driver.get(f"https://x.com/any/status/{tweet_id}")
+            page_loads += 1
+            scheduler.wait_for('like')
+            if like_current_tweet(driver, tweet_id, dry_run, WebDriverWait(driver, 20)):
+                update_row(run_id, tweet_id, liked=True)
+                scheduler.record('like', tweet_id)
+            elif dry_run:
+                scheduler.record('like', tweet_id)
+
+        output_filename = export_stage_csv(run_id, "processed")
+
+        model_calls = get_model_call_stats()
+        cache_stats = get_cache_stats()
+        logging.info(f"--- 全件の処理が完了しました (ラン: {run_id}, 出力: {output_filename or 'なし'}) ---")
+        logging.info(
+            f"ページ読み込み: {page_loads} 回 / 返信生成: {counts['generated']} 件 / "
+            f"投稿: {counts['posted']} 件 / AI呼び出し回数: 生成={model_calls['generate']}, "
+            f"セルフチェック={model_calls['self_check']} / 返信キャッシュ: ヒット={cache_stats['hits']}"
+        )
+        logging.info(format_discard_stats())
+        return run_id
+
+    except FileNotFoundError:
+        logging.error(f"入力ファイルまたはランが見つかりません: {run_id or input_csv}")
+        return None
+    except Exception as e:
+        logging.error(f"1回訪問モードの処理中に予期せぬエラー: {e}", exc_info=True)
+        return None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="スレッド解析・返信生成・いいね・返信投稿を1回のページ訪問で行います。")
+    parser.add_argument("input_csv", nargs='?', help="入力CSVファイルのパス (extracted_tweets_...csv)")
+    parser.add_argument("--run-id", help="CSVの代わりにランストアのランを処理します")
+    parser.add_argument("--live-run", action='store_true', help="このフラグを立てると、実際に投稿やいいねを行います（ドライランを無効化）。")
+    parser.add_argument("--limit", type=int, help="処理するリプライの最大数")
+    parser.add_argument("--interval", type=int, default=None, help=f"投稿間の待機時間（秒）。指定しない場合はconfig.pyの値({POST_INTERVAL_SECONDS}秒)が使われます。")
+    parser.add_argument("--headless", action='store_true', help="このフラグを立てると、ブラウザをヘッドレスモード（非表示）で起動します。")
+    args = parser.parse_args()
+
+    driver = None
+    try:
+        driver = setup_driver(headless=args.headless)
+        if driver:
+            interval_to_use = args.interval if args.interval is not None else POST_INTERVAL_SECONDS
+            main_process(driver, args.input_csv, dry_run=not args.live_run, limit=args.limit, interval=interval_to_use,
+                         run_id=args.run_id)
+    finally:
+        if driver:
+            driver.quit()
+            logging.info("Selenium WebDriverを終了しました。")
@@ -0,0 +1,136 @@
+"""
+ステップ1とステップ2のストリーミング実行
+ステップ1（通知タイムラインの収集）がページごとに保存したリプライを上限付きのキューでステップ2
+（スレッド解析・返信生成）に渡し、2つ目のブラウザ（プロファイルの複製）で収集と並行して処理する。
+キューは投稿日時の新しい順に取り出すため、最新のメンションほど早く返信が生成される。
+キューから溢れた行は、収集の完了後にランストアの未解析の行としてまとめて処理する。
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from selenium import webdriver
+
+from .config import STREAM_QUEUE_SIZE
+from .csv_generator import main_process as csv_generator_main
+from .reply_processor import process_row, main_process as reply_processor_main
+from .resource_policy import apply_policy
+from .run_store import RowSink, iter_rows
+from .utils import setup_secondary_driver, close_secondary_driver
+
+_POLL_SECONDS = 0.5
+
+def _priority(row: dict) -> float:
+    """新しいリプライほど先に取り出すためのキー"""
+    try:
+        return -datetime.fromisoformat(row["date_time"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+
+class AnalysisWorker(threading.Thread):
+    """
+    キューのリプライを2つ目のWebDriverで解析・返信生成し、ランに書き戻すスレッド
+    収集が終わってキューが空になったら、キューから溢れた未解析の行を処理して終了する。
+    """
+
+    def __init__(self, driver: webdriver.Chrome, run_id: str, queue_size: int = STREAM_QUEUE_SIZE):
+        super().__init__(name="stream-analysis", daemon=True)
+        self.driver = driver
+        self.run_id = run_id
+        self.rows = queue.PriorityQueue(maxsize=queue_size)
+        self.collection_done = threading.Event()
+        self.started_at = time.monotonic()
+        self.error = None
+        self.stats = {"queued": 0, "overflow": 0, "streamed": 0, "caught_up": 0, "first_reply_seconds": None}
+        self._order = itertools.count()
+
+    def offer(self, rows: list):
+        """ステップ1のページごとのリプライをキューに入れます（満杯の場合は収集後の処理に回し、収集は待たせません）。"""
+        for row in rows:
+            if row.get("analyzed"):
+                continue  # 返信対象外と判定済みの行（「いいね」のみ）は解析しない
+            try:
+                self.rows.put_nowait((_priority(row), next(self._order), dict(row)))
+                self.stats["queued"] += 1
+            except queue.Full:
+                self.stats["overflow"] += 1
+
+    def run(self):
+        history = []
+        try:
+            apply_policy(self.driver, "analyze")
+            with RowSink(self.run_id) as sink:
+                while True:
+                    try:
+                        _, _, row = self.rows.get(timeout=_POLL_SECONDS)
+                    except queue.Empty:
+                        if self.collection_done.is_set():
+                            break
+                        continue
+                    self._process(sink, row, history, "streamed")
+                # キューから溢れた行（ステップ1で保存済み・未解析）を収集順に処理する
+                for row in iter_rows(self.run_id, analyzed=False):
+                    self._process(sink, row, history, "caught_up")
+        except Exception as e:
+            self.error = e
+            logging.error(f"ストリーミングのスレッド解析中にエラー: {e}", exc_info=True)
+
+    def _process(self, sink: RowSink, row: dict, history: list, counter: str):
+        result = process_row(self.driver, row, history)
+        sink.write(row, **result)
+        self.stats[counter] += 1
+        if result.get("generated_reply") and self.stats["first_reply_seconds"] is None:
+            self.stats["first_reply_seconds"] = time.monotonic() - self.started_at
+            logging.info(
+                f"最初の返信を生成しました (tweet_id: {row['reply_id']}, "
+                f"収集開始から {self.stats['first_reply_seconds']:.1f} 秒)。"
+            )
+
+
+def run_streaming(driver: webdriver.Chrome, run_id: str, output_csv_path: str, hours_to_collect: int | None = None,
+                  like_in_timeline: bool = False, dry_run: bool = True, headless: bool = False) -> str | None:
+    """
+    ステップ1（driver）とステップ2（2つ目のWebDriver）を並行して実行し、成功した場合は run_id を返します。
+    2つ目のWebDriverを起動できない場合や解析スレッドが失敗した場合は、driver で残りを順に処理します。
+    """
+    analysis_driver, profile_path = setup_secondary_driver(headless=headless)
+    if not analysis_driver:
+        logging.warning("2つ目のブラウザを起動できないため、ステップ1と2を順に実行します。")
+        if not csv_generator_main(driver=driver, output_csv_path=output_csv_path, hours_to_collect=hours_to_collect,
+                                  like_in_timeline=like_in_timeline, dry_run=dry_run, run_id=run_id):
+            return None
+        return reply_processor_main(driver, run_id=run_id)
+
+    worker = AnalysisWorker(analysis_driver, run_id)
+    try:
+        worker.start()
+        collected = csv_generator_main(
+            driver=driver, output_csv_path=output_csv_path, hours_to_collect=hours_to_collect,
+            like_in_timeline=like_in_timeline, dry_run=dry_run, run_id=run_id, on_rows=worker.offer
+        )
+        logging.info("ステップ1が完了しました。ステップ2の残りの処理を待っています...")
+        worker.collection_done.set()
+        worker.join()
+    finally:
+        worker.collection_done.set()
+        if worker.is_alive():
+            worker.join()
+        close_secondary_driver(analysis_driver, profile_path)
+
+    stats = worker.stats
+    first_reply = f"{stats['first_reply_seconds']:.1f} 秒" if stats["first_reply_seconds"] is not None else "なし"
+    logging.info(
+        f"ストリーミング処理の結果: キュー経由 {stats['streamed']} 件, 収集後の処理 {stats['caught_up']} 件 "
+        f"(キューから溢れた件数: {stats['overflow']}), 最初の返信までの時間: {first_reply}"
+    )
+    if not collected:
+        return None
+    if worker.error:
+        logging.warning("解析スレッドが失敗したため、残りのリプライをメインのブラウザで処理します。")
+        return reply_processor_main(driver, run_id=run_id)
+    return run_id
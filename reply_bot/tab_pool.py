@@ -0,0 +1,124 @@
+"""
+1つのChromeセッション内のタブプール
+認証済みのWebDriverに N 個のタブを開き、ステップ関数（待ち時間の秒数を yield し、結果を return する
+ジェネレータ。reply_processor.analyze_thread_steps など）を空いたタブに順番に割り当てる。
+待ち時間が明けたタブにだけ切り替えて次のステップを進めるため、あるタブのページ読み込みや
+スクロール後の読み込み待ちの間に他のタブの処理を進められる（Chromeのプロセスやプロファイルは増やさない）。
+リソースのブロック設定はタブごとに有効なため、resource_stage を指定すると全てのタブに適用する。
+"""
+
+import logging
+import time
+from typing import Callable, Iterable, Iterator, Tuple
+
+from selenium import webdriver
+
+from .config import THREAD_TAB_POOL_SIZE
+from .resource_policy import apply_policy
+
+
+class TabPool:
+    """
+    WebDriverのタブのプール
+
+    with TabPool(driver, 3) as pool:
+        for tweet_id, thread_data in pool.imap(analyze_thread_steps, tweet_ids):
+            ...
+    """
+
+    def __init__(self, driver: webdriver.Chrome, size: int = THREAD_TAB_POOL_SIZE, resource_stage: str | None = None):
+        self.driver = driver
+        self.home = driver.current_window_handle
+        self.handles = [self.home]
+        self._current = self.home
+        try:
+            for _ in range(max(1, size) - 1):
+                driver.switch_to.new_window('tab')
+                self.handles.append(driver.current_window_handle)
+        except Exception as e:
+            logging.warning(f"タブを開けませんでした（{len(self.handles)} タブで続行します）: {e}")
+        if resource_stage:
+            for handle in self.handles:
+                self._switch(handle)
+                apply_policy(driver, resource_stage)
+        self._switch(self.home)
+        self.stats = {"tabs": len(self.handles), "jobs": 0, "steps": 0, "idle_seconds": 0.0}
+        logging.info(f"{len(self.handles)} 個のタブでタブプールを開始しました。")
+
+    def _switch(self, handle: str):
+        if handle != self._current:
+            self.driver.switch_to.window(handle)
+            self._current = handle
+
+    def imap(self, steps: Callable, items: Iterable) -> Iterator[Tuple]:
+        """
+        items の各要素について steps(item, driver) のジェネレータを空いたタブで実行し、
+        終わったものから (item, 結果) を返します。ステップ関数の例外は (item, None) として返します。
+        呼び出し側が結果を処理している間も、他のタブのページ読み込みはブラウザ側で進みます。
+        """
+        items = iter(items)
+        free = list(self.handles)
+        active = {}  # handle -> [item, ジェネレータ, 次に進めてよい時刻]
+        exhausted = False
+        while True:
+            # 空いたタブに次の仕事を割り当てる（ジェネレータの最初のステップはタブを切り替えてから実行する）
+            while free and not exhausted:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                active[free.pop(0)] = [item, steps(item, self.driver), 0.0]
+                self.stats["jobs"] += 1
+            if not active:
+                return
+
+            # 待ち時間が最も早く明けるタブを進める
+            handle = min(active, key=lambda h: active[h][2])
+            item, job, ready_at = active[handle]
+            delay = ready_at - time.monotonic()
+            if delay > 0:
+                self.stats["idle_seconds"] += delay
+                time.sleep(delay)
+
+            result, finished = None, False
+            try:
+                self._switch(handle)
+                active[handle][2] = time.monotonic() + next(job)
+                self.stats["steps"] += 1
+            except StopIteration as stop:
+                result, finished = stop.value, True
+            except Exception as e:
+                logging.error(f"タブでの処理中にエラー ({item}): {e}", exc_info=True)
+                job.close()
+                finished = True
+            if finished:
+                del active[handle]
+                free.append(handle)
+                yield item, result
+
+    def close(self):
+        """プールで開いたタブを閉じ、元のタブに戻ります。"""
+        for handle in self.handles[1:]:
+            try:
+                self._switch(handle)
+                self.driver.close()
+            except Exception as e:
+                logging.warning(f"タブを閉じる際にエラー: {e}")
+            self._current = None
+        try:
+            self.driver.switch_to.window(self.home)
+            self._current = self.home
+        except Exception as e:
+            logging.warning(f"元のタブに戻れませんでした: {e}")
+        self.handles = [self.home]
+        logging.info(
+            f"タブプールを終了しました（{self.stats['tabs']} タブ, {self.stats['jobs']} 件, "
+            f"全タブが待機していた時間: {self.stats['idle_seconds']:.1f} 秒）。"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
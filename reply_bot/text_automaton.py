@@ -0,0 +1,98 @@
+"""
+複数パターン文字列照合（Aho–Corasick法）
+多数のキーワードを1回の走査でまとめて検出するための軽量オートマトン
+"""
+
+from collections import deque
+from typing import Any, Iterable, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """
+    Aho–Corasickオートマトン
+
+    add() でパターンを登録し、build() でfailureリンクを構築した後、
+    iter_matches() / find_all() で本文を1回走査して全ての一致を取得します。
+    各パターンには任意の値（インテント名など）を関連付けられます。
+    """
+
+    def __init__(self, patterns: Iterable[str] | None = None):
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._own: List[List[Tuple[str, Any]]] = [[]]      # 各ノードで終わるパターン（add() で登録したもの）
+        self._outputs: List[List[Tuple[str, Any]]] = [[]]  # failureリンク先の出力を含めたもの（build() で再計算）
+        self._built = False
+        self._size = 0
+        for pattern in patterns or ():
+            self.add(pattern)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, pattern: str, value: Any = None):
+        """パターンを登録します。build() 後に追加した場合は再構築が必要です。"""
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+                self._outputs.append([])
+            state = next_state
+        self._own[state].append((pattern, pattern if value is None else value))
+        self._size += 1
+        self._built = False
+
+    def build(self) -> "AhoCorasick":
+        """幅優先でfailureリンクを構築し、出力を継承させます（何度呼んでも各ノードの出力から作り直します）。"""
+        self._outputs = [list(own) for own in self._own]
+        queue = deque()
+        for next_state in self._goto[0].values():
+            self._fail[next_state] = 0
+            queue.append(next_state)
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+        self._built = True
+        return self
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str, Any]]:
+        """
+        本文中の全ての一致を (開始位置, 終了位置, パターン, 値) の形で順に返します。
+        終了位置はスライス用の排他的な位置です。
+        """
+        if not self._built:
+            self.build()
+        state = 0
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                for pattern, value in outputs[state]:
+                    yield index + 1 - len(pattern), index + 1, pattern, value
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str, Any]]:
+        return list(self.iter_matches(text))
+
+    def contains_any(self, text: str) -> bool:
+        """いずれかのパターンが含まれていればTrueを返します。"""
+        for _ in self.iter_matches(text):
+            return True
+        return False
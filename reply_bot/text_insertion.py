@@ -0,0 +1,103 @@
+"""
+返信欄へのテキスト入力
+クリップボード（pyperclip + Ctrl+V）を使わず、DevToolsの Input.insertText でセッションごとに入力し、
+固定のsleepの代わりに返信欄の内容を読み取って入力完了を確認する
+"""
+
+import logging
+import re
+import time
+
+from selenium import webdriver
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.remote.webelement import WebElement
+
+from .config import TEXT_INSERTION_BACKEND, TEXT_INSERTION_FALLBACK_TO_CLIPBOARD, TEXT_INSERTION_TIMEOUT_SECONDS
+from .emoji_table import strip_emoji
+
+_POLL_SECONDS = 0.05
+
+def _normalize(text: str) -> str:
+    """比較用に空白と絵文字を取り除きます（返信欄では絵文字が画像として描画されることがあるため）。"""
+    return re.sub(r'\s+', '', strip_emoji(text or ""))
+
+def _wait_until(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if predicate():
+                return True
+        except Exception:
+            pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(_POLL_SECONDS)
+
+def _read_composer(driver: webdriver.Chrome, element: WebElement) -> str:
+    return driver.execute_script("return arguments[0].innerText;", element) or ""
+
+def focus_composer(driver: webdriver.Chrome, element: WebElement, timeout: float = TEXT_INSERTION_TIMEOUT_SECONDS) -> bool:
+    """返信欄をクリックし、フォーカスが移ったことを確認します。"""
+    driver.execute_script("arguments[0].focus(); arguments[0].click();", element)
+    return _wait_until(
+        lambda: driver.execute_script(
+            "return arguments[0] === document.activeElement || arguments[0].contains(document.activeElement);", element
+        ),
+        timeout
+    )
+
+def _clear_composer(driver: webdriver.Chrome, element: WebElement):
+    element.send_keys(Keys.CONTROL, 'a')
+    element.send_keys(Keys.BACKSPACE)
+    _wait_until(lambda: not _normalize(_read_composer(driver, element)), TEXT_INSERTION_TIMEOUT_SECONDS)
+
+def _insert_with_cdp(driver: webdriver.Chrome, text: str):
+    """Input.insertText で1行ずつ入力し、改行はEnterキーのイベントで入力します。"""
+    for i, line in enumerate(text.split('\n')):
+        if i > 0:
+            for event_type in ("keyDown", "keyUp"):
+                driver.execute_cdp_cmd("Input.dispatchKeyEvent", {
+                    "type": event_type, "key": "Enter", "code": "Enter",
+                    "windowsVirtualKeyCode": 13, "nativeVirtualKeyCode": 13,
+                    **({"text": "\r"} if event_type == "keyDown" else {}),
+                })
+        if line:
+            driver.execute_cdp_cmd("Input.insertText", {"text": line})
+
+def _insert_with_clipboard(element: WebElement, text: str):
+    """従来のクリップボード経由の入力（デスクトップ環境のみ）"""
+    import pyperclip
+    pyperclip.copy(text)
+    element.send_keys(Keys.CONTROL, 'v')
+
+def insert_text(driver: webdriver.Chrome, element: WebElement, text: str, backend: str = TEXT_INSERTION_BACKEND) -> bool:
+    """
+    返信欄にテキストを入力し、返信欄の内容が入力したテキストと一致したらTrueを返します。
+    backend="cdp" で失敗した場合は、返信欄を空に戻してからクリップボード経由で再試行します
+    （TEXT_INSERTION_FALLBACK_TO_CLIPBOARD=False の場合は再試行しません）。
+    """
+    if not focus_composer(driver, element):
+        logging.warning("返信欄へのフォーカスを確認できませんでしたが、入力を続行します。")
+
+    expected = _normalize(text)
+    backends = [backend]
+    if backend != "clipboard" and TEXT_INSERTION_FALLBACK_TO_CLIPBOARD:
+        backends.append("clipboard")
+    for current in backends:
+        try:
+            if current == "cdp":
+                _insert_with_cdp(driver, text)
+            else:
+                _insert_with_clipboard(element, text)
+        except Exception as e:
+            logging.warning(f"テキスト入力 ({current}) に失敗しました: {e}")
+            _clear_composer(driver, element)
+            continue
+
+        if _wait_until(lambda: _normalize(_read_composer(driver, element)) == expected, TEXT_INSERTION_TIMEOUT_SECONDS):
+            logging.debug(f"返信欄への入力を確認しました ({current})。")
+            return True
+
+        logging.warning(f"返信欄の内容が入力したテキストと一致しません ({current}): {_read_composer(driver, element)!r}")
+        _clear_composer(driver, element)
+    return False
@@ -0,0 +1,68 @@
+"""
+表示中のスレッドページの軽量プローブ
+1回のスクリプト実行で、返信対象ツイートの位置・後続ツイート数・後続ツイートの投稿者を取得する
+（記事ごとにfind_elementを呼ぶとWebDriverとの往復が記事数だけ発生するため）
+"""
+
+import logging
+
+from selenium import webdriver
+
+from .config import TARGET_USER
+
+_PROBE_SCRIPT = r"""
+const tweetId = arguments[0];
+const statusPattern = new RegExp('/status/' + tweetId + '(?:[/?#]|$)');
+const articles = Array.from(document.querySelectorAll('article[data-testid="tweet"]'));
+const authorOf = (article) => {
+    const userName = article.querySelector('div[data-testid="User-Name"]');
+    if (!userName) return null;
+    for (const link of userName.querySelectorAll('a[role="link"][href^="/"]')) {
+        const href = link.getAttribute('href');
+        if (!href.includes('/status/')) return href.slice(1);
+    }
+    return null;
+};
+const targetIndex = articles.findIndex(
+    (article) => Array.from(article.querySelectorAll('a[href*="/status/"]'))
+        .some((link) => statusPattern.test(link.getAttribute('href')))
+);
+const following = targetIndex >= 0 ? articles.slice(targetIndex + 1) : [];
+// 返信ボタンの aria-label（例: "3 件の返信。返信する"）から対象ツイートの返信数を読む
+let targetReplyCount = null;
+if (targetIndex >= 0) {
+    const replyButton = articles[targetIndex].querySelector('[data-testid="reply"]');
+    const match = replyButton && (replyButton.getAttribute('aria-label') || '').match(/\d[\d,]*/);
+    targetReplyCount = match ? parseInt(match[0].replace(/,/g, ''), 10) : 0;
+}
+return {
+    target_index: targetIndex,
+    article_count: articles.length,
+    following_count: following.length,
+    following_authors: following.map(authorOf),
+    target_reply_count: targetReplyCount,
+};
+"""
+
+def probe_thread(driver: webdriver.Chrome, tweet_id: str) -> dict | None:
+    """
+    表示中のページを1回のスクリプト実行で調べ、以下を返します。失敗した場合はNoneを返します。
+      target_index: 返信対象ツイートの位置（見つからなければ -1）
+      article_count: ページ上のツイート数
+      following_count: 返信対象より後のツイート数
+      following_authors: 後続ツイートの投稿者ID（取得できないものはNone）
+      target_reply_count: 返信対象ツイートの返信ボタンに表示されている返信数（対象が無ければNone）
+      replied_by_target_user: 後続ツイートに TARGET_USER のものが含まれるか
+    """
+    try:
+        result = driver.execute_script(_PROBE_SCRIPT, str(tweet_id))
+    except Exception as e:
+        logging.warning(f"スレッドのプローブ中にエラー (tweet_id: {tweet_id}): {e}")
+        return None
+    if not result:
+        return None
+    target_user = TARGET_USER.lower()
+    result["replied_by_target_user"] = any(
+        author and author.lower() == target_user for author in result.get("following_authors", [])
+    )
+    return result
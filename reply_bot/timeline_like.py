@@ -0,0 +1,105 @@
+"""
+通知（メンション）タイムライン上での「いいね」
+ステップ1のスクロール中に表示されている記事をreply_idで特定し、その場で「いいね」を押して
+FavoriteTweet のレスポンスかボタンの unlike への切り替わりで確認する（ツイートページを開かずに済ませる）
+記事の特定はページの種類に依存しないため、ツイートページ上の「いいね」にも使う
+"""
+
+import logging
+from typing import Dict, Iterable
+
+from selenium import webdriver
+
+from .action_confirmation import arm as arm_confirmation, describe as describe_confirmation, wait_for_like
+from .action_journal import ACTION_LIKE, record_done, record_intent, record_result
+from .config import TIMELINE_LIKE_VERIFY_SECONDS
+from .post_scheduler import PostScheduler
+
+# 記事の特定と「いいね」の状態確認・クリックを1回のスクリプト実行で行う
+_LIKE_SCRIPT = """
+const tweetId = arguments[0];
+const click = arguments[1];
+const statusPattern = new RegExp('/status/' + tweetId + '(?:[/?#]|$)');
+const article = Array.from(document.querySelectorAll('article[data-testid="tweet"]')).find(
+    (candidate) => Array.from(candidate.querySelectorAll('a[href*="/status/"]'))
+        .some((link) => statusPattern.test(link.getAttribute('href')))
+);
+if (!article) return 'not_found';
+if (article.querySelector('[data-testid="unlike"]')) return 'liked';
+const button = article.querySelector('[data-testid="like"]');
+if (!button) return 'no_button';
+if (!click) return 'not_liked';
+button.scrollIntoView({block: 'center'});
+button.click();
+return 'clicked';
+"""
+
+def like_state(driver: webdriver.Chrome, tweet_id: str, click: bool = False) -> str:
+    """
+    表示中のページでreply_idの記事の「いいね」状態を返します。
+    'liked' / 'not_liked' / 'not_found' / 'no_button'（click=True の場合はクリックして 'clicked'）
+    """
+    return driver.execute_script(_LIKE_SCRIPT, str(tweet_id), click)
+
+def like_article(driver: webdriver.Chrome, tweet_id: str, dry_run: bool = True) -> bool:
+    """
+    表示中のページでreply_idの記事に「いいね」し、unlike への切り替わりを確認します。
+    「いいね」済みになった（または元から「いいね」済みだった）場合にTrueを返します。
+    実際に押す場合は行動ジャーナルに intent → done / failed を記録します。
+    """
+    entry_id = None
+    try:
+        state = like_state(driver, tweet_id, click=False)
+        if state == 'liked':
+            logging.info(f"tweet_id: {tweet_id} は既に「いいね」済みです。")
+            if not dry_run:
+                record_done(tweet_id, ACTION_LIKE, "already_liked")
+            return True
+        if state != 'not_liked':
+            logging.debug(f"tweet_id: {tweet_id} の記事または「いいね」ボタンがページ上に見つかりません ({state})。")
+            return False
+        if dry_run:
+            logging.info(f"[DRY RUN] tweet_id: {tweet_id} に「いいね」をします。")
+            return False
+
+        entry_id = record_intent(tweet_id, ACTION_LIKE)
+        arm_confirmation(driver)
+        like_state(driver, tweet_id, click=True)
+        confirmation = wait_for_like(
+            driver, tweet_id, lambda: like_state(driver, tweet_id, click=False) == 'liked', timeout=TIMELINE_LIKE_VERIFY_SECONDS
+        )
+        if confirmation["confirmed"]:
+            record_result(entry_id, True, describe_confirmation(confirmation))
+            logging.info(f"tweet_id: {tweet_id} に「いいね」しました。")
+            return True
+        # 時間切れの場合は intent のまま残し、次回の実行開始時にページ上で確認する
+        if confirmation["source"] != "timeout":
+            record_result(entry_id, False, describe_confirmation(confirmation))
+        return False
+    except Exception as e:
+        record_result(entry_id, False, str(e))
+        logging.warning(f"tweet_id: {tweet_id} の「いいね」中にエラー: {e}")
+        return False
+
+def like_visible_replies(driver: webdriver.Chrome, tweet_ids: Iterable[str], scheduler: PostScheduler,
+                         dry_run: bool = True) -> Dict[str, bool]:
+    """
+    タイムライン上に表示されている複数のリプライに、スケジューラの間隔を守りながら「いいね」します。
+    {tweet_id: 「いいね」済みかどうか} を返します。
+    """
+    results = {}
+    for tweet_id in tweet_ids:
+        try:
+            state = like_state(driver, tweet_id, click=False)
+        except Exception as e:
+            logging.warning(f"tweet_id: {tweet_id} の「いいね」状態の確認中にエラー: {e}")
+            state = 'error'
+        if state != 'not_liked':
+            # 既に「いいね」済み、または記事が見つからない場合は待機せずに次へ
+            results[tweet_id] = state == 'liked'
+            continue
+        scheduler.wait_for('like')
+        results[tweet_id] = like_article(driver, tweet_id, dry_run)
+        if results[tweet_id] or dry_run:
+            scheduler.record('like', tweet_id)
+    return results
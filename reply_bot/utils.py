@@ -22,6 +22,7 @@ _memory_monitor_enabled = True  # メモリ監視の有効/無効フラグ
 
 # Profile認証用のグローバル変数
 _auth_manager = None
+_daemon_driver: webdriver.Chrome | None = None  # 常駐ブラウザに接続したWebDriver
 
 def _get_auth_manager():
     """認証マネージャーの取得（遅延初期化）"""
@@ -74,15 +75,50 @@ def force_restart_driver():
 def close_driver():
     """
     WebDriverの終了（既存関数の互換性維持）
+    常駐ブラウザに接続している場合は切り離すだけで、ブラウザは終了しません。
     """
+    global _daemon_driver
+    if _daemon_driver is not None:
+        from .browser_daemon import detach_driver
+        detach_driver(_daemon_driver)
+        _daemon_driver = None
+        return
     auth_manager = _get_auth_manager()
     auth_manager.close_driver()
 
+def is_daemon_driver() -> bool:
+    """常駐ブラウザ（browser_daemon）に接続したWebDriverを使っているかを返します。"""
+    return _daemon_driver is not None
+
+def _attach_daemon_driver() -> webdriver.Chrome | None:
+    """常駐ブラウザ（browser_daemon）が起動していれば接続し、接続済みならそれを返します。"""
+    global _daemon_driver
+    if _daemon_driver is not None:
+        try:
+            _ = _daemon_driver.current_url
+            return _daemon_driver
+        except Exception:
+            _daemon_driver = None
+    from .browser_daemon import attach_driver
+    try:
+        _daemon_driver = attach_driver()
+    except Exception as e:
+        logging.warning(f"常駐ブラウザに接続できませんでした: {e}")
+        _daemon_driver = None
+    return _daemon_driver
+
 def setup_driver(headless: bool = True) -> webdriver.Chrome:
     """
     WebDriverのセットアップ（既存関数の互換性維持）
     内部実装をProfile認証に変更
+    常駐ブラウザ（python -m reply_bot.browser_daemon --serve）が起動している場合は、Chromeを起動せずに接続します。
     """
+    from .config import BROWSER_DAEMON_ENABLED
+    if BROWSER_DAEMON_ENABLED:
+        driver = _attach_daemon_driver()
+        if driver:
+            return driver
+
     auth_manager = _get_auth_manager()
     from .config import TWITTER_PROFILE_NAME
     profile_name = TWITTER_PROFILE_NAME
@@ -96,6 +132,23 @@ def setup_driver(headless: bool = True) -> webdriver.Chrome:
         logging.error(f"setup_driver failed: {e}")
         raise # ループが正常に終了した場合（通常は起こらない）
 
+def setup_secondary_driver(headless: bool = True):
+    """
+    メインのWebDriverと並行して使う2つ目のWebDriverを、プロファイルの複製で起動します。
+    (driver, 複製したプロファイルのパス) を返し、起動できない場合は (None, None) を返します。
+    """
+    auth_manager = _get_auth_manager()
+    from .config import TWITTER_PROFILE_NAME
+    try:
+        return auth_manager.get_secondary_driver(profile_name=TWITTER_PROFILE_NAME, headless=headless)
+    except Exception as e:
+        logging.warning(f"2つ目のWebDriverを起動できませんでした: {e}")
+        return None, None
+
+def close_secondary_driver(driver: webdriver.Chrome | None, profile_path: str | None = None):
+    """setup_secondary_driver で起動したWebDriverを終了し、複製したプロファイルを削除します。"""
+    _get_auth_manager().close_secondary_driver(driver, profile_path)
+
 def get_cookie(driver: webdriver.Chrome):
     """
     指定されたURLにアクセスし、ユーザーがログインを完了するのを待ってから、
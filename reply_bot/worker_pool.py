@@ -0,0 +1,346 @@
+"""
+複数プロセスのブラウザワーカープール（バックログの一括処理用）
+停止明けの --hours 72 のように未解析のリプライが多い場合に、K 個のワーカープロセスがそれぞれ
+認証済みプロファイルの複製（ProfiledChromeManager）でChromeを起動し、親プロセスから割り当てられた
+tweet_id のスレッドを解析して結果を返す。返信の生成とランへの書き戻しは親プロセスで1行ずつ行う。
+終了時はワーカーに停止を伝えて待ち、終わらない場合は強制終了して複製したプロファイルを削除する。
+"""
+
+import argparse
+import logging
+import multiprocessing
+import queue
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, Iterator, Tuple
+
+from selenium import webdriver
+
+from .config import (
+    TARGET_USER, WORKER_POOL_SIZE, WORKER_POOL_MAX_PROCESSES, WORKER_START_TIMEOUT_SECONDS,
+    WORKER_SHUTDOWN_TIMEOUT_SECONDS
+)
+from .db import init_db
+from .reply_processor import fetch_and_analyze_thread, process_row, main_process as reply_processor_main
+from .resource_policy import apply_policy
+from .run_store import RowSink, resolve_run, iter_rows
+from .utils import setup_secondary_driver, close_secondary_driver
+
+_X_BASE_URL = "https://x.com"
+_JOBS_PER_WORKER = 2  # ワーカーごとに先に割り当てておく件数（解析中の1件 + 待ち1件）
+
+
+def _portable(thread_data: dict | None) -> dict | None:
+    """スレッドの解析結果からBeautifulSoupの要素を除き、プロセス間で受け渡せる形にします。"""
+    if thread_data is None:
+        return None
+
+    def strip(tweet):
+        return {key: value for key, value in tweet.items() if key != "article"} if tweet else tweet
+
+    data = dict(thread_data)
+    data["thread_head"] = strip(data.get("thread_head"))
+    data["thread_tail"] = strip(data.get("thread_tail"))
+    data["full_timeline"] = [strip(tweet) for tweet in data.get("full_timeline") or []]
+    return data
+
+def _worker_main(worker_no: int, jobs, results, headless: bool, base_url: str):
+    """
+    ワーカープロセスの本体
+    複製したプロファイルでChromeを起動し、jobs の tweet_id（None で終了）を解析して results に返す。
+    results には (種類, ワーカー番号, 値1, 値2) を送る: started / result / stopped
+    """
+    driver, profile_path = setup_secondary_driver(headless=headless)
+    results.put(("started", worker_no, profile_path, driver is not None))
+    if not driver:
+        return
+    apply_policy(driver, "analyze")
+    try:
+        while True:
+            tweet_id = jobs.get()
+            if tweet_id is None:
+                break
+            try:
+                thread_data = _portable(fetch_and_analyze_thread(tweet_id, driver, base_url=base_url))
+            except Exception as e:
+                logging.error(f"ワーカー {worker_no} で tweet_id: {tweet_id} の解析中にエラー: {e}")
+                thread_data = None
+            results.put(("result", worker_no, tweet_id, thread_data))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_secondary_driver(driver, profile_path)
+        results.put(("stopped", worker_no, None, None))
+
+
+class WorkerPool:
+    """
+    ブラウザのワーカープロセスのプール
+
+    with WorkerPool(3) as pool:
+        if pool.start():
+            for row, thread_data in pool.imap(rows, key=lambda row: row["reply_id"]):
+                ...
+    """
+
+    def __init__(self, workers: int = WORKER_POOL_SIZE, headless: bool = True, base_url: str = _X_BASE_URL):
+        self.size = max(1, min(workers, WORKER_POOL_MAX_PROCESSES))
+        if self.size < workers:
+            logging.info(f"ワーカー数を上限の {self.size} に制限しました (WORKER_POOL_MAX_PROCESSES)。")
+        context = multiprocessing.get_context("spawn")  # Windowsと同じ起動方式に揃える
+        self.results = context.Queue()
+        self.jobs = [context.Queue() for _ in range(self.size)]
+        self.processes = [
+            context.Process(target=_worker_main, args=(n, self.jobs[n], self.results, headless, base_url), name=f"browser-worker-{n}")
+            for n in range(self.size)
+        ]
+        self.profiles = {}
+        self.alive = set()
+        self.assigned = {n: [] for n in range(self.size)}
+        self.stats = {"workers": 0, "jobs": 0, "lost": 0, "start_seconds": 0.0}
+
+    def start(self) -> int:
+        """ワーカーを起動し、Chromeの起動に成功したワーカー数を返します。"""
+        started_at = time.monotonic()
+        for process in self.processes:
+            process.start()
+        deadline = started_at + WORKER_START_TIMEOUT_SECONDS
+        pending = set(range(self.size))
+        while pending and time.monotonic() < deadline:
+            try:
+                kind, worker_no, profile_path, ok = self.results.get(timeout=1)
+            except queue.Empty:
+                pending -= {n for n in pending if not self.processes[n].is_alive()}
+                continue
+            if kind == "started":
+                pending.discard(worker_no)
+                if profile_path:
+                    self.profiles[worker_no] = profile_path
+                if ok:
+                    self.alive.add(worker_no)
+        self.stats["workers"] = len(self.alive)
+        self.stats["start_seconds"] = time.monotonic() - started_at
+        logging.info(f"{len(self.alive)}/{self.size} 個のワーカーが起動しました ({self.stats['start_seconds']:.1f} 秒)。")
+        return len(self.alive)
+
+    def _drop_worker(self, worker_no: int) -> list:
+        """ワーカーを外し、そのワーカーに割り当てていて結果が返っていない tweet_id を返します。"""
+        self.alive.discard(worker_no)
+        lost, self.assigned[worker_no] = self.assigned[worker_no], []
+        self.stats["lost"] += len(lost)
+        return lost
+
+    def _check_workers(self) -> list:
+        """終了したワーカーを外し、そのワーカーに割り当てていた tweet_id を返します。"""
+        lost = []
+        for worker_no in list(self.alive):
+            if not self.processes[worker_no].is_alive():
+                logging.warning(f"ワーカー {worker_no} が終了しました (exitcode={self.processes[worker_no].exitcode})。")
+                lost += self._drop_worker(worker_no)
+        return lost
+
+    def imap(self, items: Iterable, key: Callable = lambda item: item) -> Iterator[Tuple]:
+        """
+        items を空いているワーカーに割り当て、解析が終わったものから (item, スレッドの解析結果) を返します。
+        key(item) がワーカーに渡す tweet_id です。ワーカーが異常終了した場合、そのワーカーの
+        仕事は (item, None) として返します。
+        """
+        items = iter(items)
+        in_flight = {}
+        exhausted = False
+        while True:
+            # 割り当てが少ないワーカーから順に、_JOBS_PER_WORKER 件まで割り当てる
+            while not exhausted:
+                candidates = [n for n in self.alive if len(self.assigned[n]) < _JOBS_PER_WORKER]
+                if not candidates:
+                    break
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                worker_no = min(candidates, key=lambda n: len(self.assigned[n]))
+                tweet_id = key(item)
+                in_flight[tweet_id] = item
+                self.assigned[worker_no].append(tweet_id)
+                self.jobs[worker_no].put(tweet_id)
+                self.stats["jobs"] += 1
+            if not in_flight:
+                return
+
+            try:
+                kind, worker_no, tweet_id, thread_data = self.results.get(timeout=1)
+            except queue.Empty:
+                for tweet_id in self._check_workers():
+                    yield in_flight.pop(tweet_id), None
+                if not self.alive:
+                    # 全ワーカーが終了した場合、残りは呼び出し側で処理する
+                    for tweet_id in list(in_flight):
+                        yield in_flight.pop(tweet_id), None
+                    return
+                continue
+            if kind == "result" and tweet_id in in_flight:
+                self.assigned[worker_no].remove(tweet_id)
+                yield in_flight.pop(tweet_id), thread_data
+            elif kind == "stopped":
+                for tweet_id in self._drop_worker(worker_no):
+                    yield in_flight.pop(tweet_id), None
+
+    def close(self):
+        """ワーカーに停止を伝えて終了を待ち、終わらないワーカーは強制終了して複製したプロファイルを削除します。"""
+        for worker_no, process in enumerate(self.processes):
+            if process.is_alive():
+                self.jobs[worker_no].put(None)
+        deadline = time.monotonic() + WORKER_SHUTDOWN_TIMEOUT_SECONDS
+        for worker_no, process in enumerate(self.processes):
+            if process.pid is None:
+                continue
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logging.warning(f"ワーカー {worker_no} が終了しないため、強制終了します。")
+                process.terminate()
+                process.join(5)
+                if worker_no in self.profiles:
+                    shutil.rmtree(self.profiles[worker_no], ignore_errors=True)
+        self.alive.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def analyze_run(driver: webdriver.Chrome | None, run_id: str, workers: int = WORKER_POOL_SIZE, limit: int | None = None,
+                headless: bool = True) -> str | None:
+    """
+    ランの未解析のリプライをワーカープールで解析し、親プロセスで返信を生成して1行ずつ書き戻します。
+    ワーカーを起動できない場合や、ワーカーの異常終了で解析できなかった行は driver で順に処理します。
+    """
+    init_db()
+    run_id = resolve_run(run_id=run_id)
+    history = []
+    done = 0
+    started_at = time.monotonic()
+    with WorkerPool(workers, headless=headless) as pool:
+        if pool.start():
+            with RowSink(run_id) as sink:
+                for row, thread_data in pool.imap(iter_rows(run_id, limit=limit, analyzed=False), key=lambda row: row["reply_id"]):
+                    if thread_data is None and driver is None:
+                        continue  # 未解析のまま残す
+                    sink.write(row, **process_row(driver, row, history, thread_data))
+                    done += 1
+            logging.info(
+                f"ワーカープールでの処理が完了しました ({pool.stats['workers']} ワーカー, {done} 件, "
+                f"{time.monotonic() - started_at:.1f} 秒, 異常終了で再処理: {pool.stats['lost']} 件)。"
+            )
+        else:
+            logging.warning("ワーカーを起動できなかったため、1つのブラウザで順に処理します。")
+
+    # 残った未解析の行（ワーカーの起動失敗など）をメインのブラウザで処理する
+    remaining = None if limit is None else limit - done
+    if driver is None or remaining == 0 or not next(iter_rows(run_id, limit=1, analyzed=False), None):
+        return run_id
+    return reply_processor_main(driver, run_id=run_id, limit=remaining)
+
+
+# --- ベンチマーク用のローカルサイト ---
+
+_STAND_IN_ARTICLE = """
+<article data-testid="tweet">
+  <div data-testid="User-Name"><a role="link" href="/{author}">{author}</a></div>
+  <a href="/{author}/status/{tweet_id}"><time datetime="{timestamp}">{timestamp}</time></a>
+  {replying}
+  <div data-testid="tweetText">{text}</div>
+  <div data-testid="reply"><span data-testid="stat">0</span></div>
+  <div data-testid="like"><span data-testid="stat">1</span></div>
+</article>
+"""
+
+def _stand_in_page(tweet_id: str) -> str:
+    """自分のスレッドへのリプライを模したスレッドページ（先頭・リプライ・対象の3件）"""
+    base = int(tweet_id)
+    tweets = [
+        (TARGET_USER, base - 2, "2025-01-01T00:00:00.000Z", "", "スレッドの先頭"),
+        ("someone", base - 1, "2025-01-01T00:01:00.000Z", f"<div>Replying to @{TARGET_USER}</div>", "途中のリプライ"),
+        ("replier", base, "2025-01-01T00:02:00.000Z", f"<div>Replying to @{TARGET_USER}</div>", "対象のリプライです"),
+    ]
+    articles = "".join(
+        _STAND_IN_ARTICLE.format(author=author, tweet_id=tweet, timestamp=timestamp, replying=replying, text=text)
+        for author, tweet, timestamp, replying, text in tweets
+    )
+    return f"<!doctype html><html><head><meta charset='utf-8'></head><body><main>{articles}</main></body></html>"
+
+def start_stand_in_site(latency: float = 1.0) -> ThreadingHTTPServer:
+    """/any/status/<id> にスレッドページを latency 秒遅れで返すローカルサーバーを起動します。"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            tweet_id = self.path.rstrip('/').split('/')[-1]
+            if '/status/' not in self.path or not tweet_id.isdigit():
+                self.send_error(404)
+                return
+            time.sleep(latency)
+            body = _stand_in_page(tweet_id).encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def benchmark(jobs: int = 12, workers: tuple = (1, WORKER_POOL_SIZE), latency: float = 1.0, headless: bool = True) -> list:
+    """ローカルサイトの jobs 件のスレッドを、ワーカー数を変えて解析した時間を比べます。"""
+    server = start_stand_in_site(latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    tweet_ids = [str(10_000 + n * 10) for n in range(jobs)]
+    rows = []
+    try:
+        for count in workers:
+            with WorkerPool(count, headless=headless, base_url=base_url) as pool:
+                if not pool.start():
+                    rows.append({"workers": count, "started": 0})
+                    continue
+                start = time.perf_counter()
+                results = list(pool.imap(tweet_ids))
+                elapsed = time.perf_counter() - start
+                rows.append({
+                    "workers": count, "started": pool.stats["workers"], "start_seconds": pool.stats["start_seconds"],
+                    "seconds": elapsed, "threads_per_minute": len(results) / elapsed * 60,
+                    "analyzed": sum(1 for _, data in results if data and data["full_timeline"]),
+                })
+    finally:
+        server.shutdown()
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="複数のブラウザプロセスでランの未解析のリプライを解析します（バックログの一括処理用）")
+    parser.add_argument("--run-id", help="処理するランストアのラン")
+    parser.add_argument("--workers", type=int, default=WORKER_POOL_SIZE, help=f"ワーカープロセス数 (上限: {WORKER_POOL_MAX_PROCESSES})")
+    parser.add_argument("--limit", type=int, help="処理するリプライの最大数")
+    parser.add_argument("--headless", action='store_true', help="ワーカーのブラウザをヘッドレスモードで起動します")
+    parser.add_argument("--bench", type=int, metavar="N", help="ローカルのスタンドインサイトで N 件のスレッド解析の時間を計測します")
+    parser.add_argument("--latency", type=float, default=1.0, help="--bench のページの応答遅延（秒）")
+    args = parser.parse_args()
+
+    if args.bench:
+        for result in benchmark(args.bench, workers=tuple(sorted({1, args.workers})), latency=args.latency, headless=args.headless):
+            if not result["started"]:
+                print(f"workers={result['workers']}: ワーカーを起動できませんでした")
+                continue
+            print(
+                f"workers={result['workers']} (起動 {result['started']}, {result['start_seconds']:.1f} 秒): "
+                f"{result['seconds']:.1f} 秒, {result['threads_per_minute']:.1f} スレッド/分, 解析成功 {result['analyzed']}/{args.bench}"
+            )
+    elif args.run_id:
+        analyze_run(None, args.run_id, workers=args.workers, limit=args.limit, headless=args.headless)
+    else:
+        parser.error("--run-id または --bench を指定してください")
@@ -21,7 +21,23 @@ function Get-ChromeDriverForProfile($prof) {
     Where-Object { $_.Name -eq 'chromedriver.exe' -and $_.CommandLine -like "*$prof*" }
 }
 
+# True if reply_bot.browser_daemon keeps Chrome alive for this profile (do not kill it)
+function Test-BrowserDaemon {
+  $stateFile = Join-Path (Get-Location) 'profiles\browser_daemon.json'
+  if (-not (Test-Path $stateFile)) { return $false }
+  try {
+    $state = Get-Content -LiteralPath $stateFile -Raw | ConvertFrom-Json
+    return [bool](Get-Process -Id $state.daemon_pid -ErrorAction SilentlyContinue)
+  } catch {
+    return $false
+  }
+}
+
 function Stop-ProcsUsingProfile($prof) {
+  if (Test-BrowserDaemon) {
+    Write-Host "Browser daemon is running. Reusing its Chrome."
+    return
+  }
   $busyChrome = Get-ChromeProcsForProfile $prof
   $busyDriver = Get-ChromeDriverForProfile $prof
 
@@ -0,0 +1,90 @@
+"""
+「いいね」と返信の完了確認のテスト
+偽のドライバーで、ネットワークのレスポンス・返信欄の変化・「いいね」ボタンの切り替わりによる判定と、
+失敗や時間切れの場合にスクリーンショットを保存することを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import action_confirmation
+from reply_bot.action_confirmation import describe, wait_for_like, wait_for_reply_posted
+
+
+class FakeDriver:
+    def __init__(self, actions=(), composer_state=None, new_reply_id=None):
+        self.actions = list(actions)
+        self.composer_state = composer_state
+        self.new_reply_id = new_reply_id
+        self.screenshots = []
+
+    def execute_script(self, script, *args):
+        if script == action_confirmation._TAKE_ACTIONS_SCRIPT:
+            actions, self.actions = [a for a in self.actions if a["op"] == args[0]], [a for a in self.actions if a["op"] != args[0]]
+            return actions
+        if script == action_confirmation._COMPOSER_STATE_SCRIPT:
+            if self.composer_state is None:
+                raise RuntimeError("stale element")
+            return self.composer_state
+        if script == action_confirmation._NEW_REPLY_ID_SCRIPT:
+            return self.new_reply_id
+        raise AssertionError("unexpected script")
+
+    def save_screenshot(self, path):
+        self.screenshots.append(path)
+        return True
+
+
+@pytest.fixture(autouse=True)
+def screenshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(action_confirmation, "ACTION_FAILURE_SCREENSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(action_confirmation, "_POLL_SECONDS", 0.01)
+
+
+def test_reply_confirmed_by_network_response():
+    driver = FakeDriver(actions=[{"op": "CreateTweet", "ok": True, "tweetId": 999}],
+                        composer_state={"cleared": False, "toast": None})
+    confirmation = wait_for_reply_posted(driver, "1", timeout=1)
+    assert confirmation == {"confirmed": True, "source": "network", "tweet_id": "999", "error": None}
+    assert describe(confirmation) == "network:999"
+
+
+def test_reply_error_response_saves_screenshot():
+    driver = FakeDriver(actions=[{"op": "CreateTweet", "ok": False, "status": 403, "error": None}])
+    confirmation = wait_for_reply_posted(driver, "1", timeout=1)
+    assert (confirmation["confirmed"], confirmation["error"]) == (False, "HTTP 403")
+    assert len(driver.screenshots) == 1 and "post_failure_" in driver.screenshots[0]
+
+
+def test_reply_confirmed_by_cleared_composer():
+    driver = FakeDriver(composer_state={"cleared": True, "toast": None}, new_reply_id="1000")
+    assert wait_for_reply_posted(driver, "1", timeout=1)["tweet_id"] == "1000"
+
+
+def test_reply_toast_is_failure():
+    driver = FakeDriver(composer_state={"cleared": False, "toast": "送信できませんでした"})
+    confirmation = wait_for_reply_posted(driver, "1", timeout=1)
+    assert (confirmation["source"], confirmation["error"]) == ("error", "送信できませんでした")
+
+
+def test_unknown_composer_state_times_out_without_new_reply():
+    driver = FakeDriver(composer_state=None)
+    confirmation = wait_for_reply_posted(driver, "1", timeout=0.05)
+    assert (confirmation["confirmed"], confirmation["source"]) == (False, "timeout")
+    assert driver.screenshots
+
+    driver = FakeDriver(composer_state=None, new_reply_id="1000")
+    assert wait_for_reply_posted(driver, "1", timeout=0.05)["source"] == "dom"
+
+
+def test_like_confirmation():
+    assert wait_for_like(FakeDriver(actions=[{"op": "FavoriteTweet", "ok": True}]), "1", lambda: False, timeout=1)["source"] == "network"
+    assert wait_for_like(FakeDriver(), "1", lambda: True, timeout=1)["source"] == "dom"
+    driver = FakeDriver()
+    confirmation = wait_for_like(driver, "1", lambda: False, timeout=0.05)
+    assert (confirmation["confirmed"], confirmation["source"]) == (False, "timeout")
+    assert "like_failure_" in driver.screenshots[0]
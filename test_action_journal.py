@@ -0,0 +1,109 @@
+"""
+行動ジャーナルと投稿確認のテスト
+intent のまま残ったアクションの解決、完了済みの返信の replied への反映、
+返信欄の状態を確認できない場合に投稿済みとみなさないことを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import action_confirmation, action_journal, db
+from reply_bot.action_journal import (
+    ACTION_LIKE, ACTION_REPLY, completed_actions, reconcile_replied, record_intent, record_result, resolve_pending
+)
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    db.init_db()
+    yield
+    db.close_connection()
+
+
+class FakeDriver:
+    """ページ移動を記録し、execute_script は script_result(script, args) の結果を返す"""
+
+    def __init__(self, script_result=None):
+        self.visited = []
+        self.script_result = script_result or (lambda script, args: None)
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def execute_script(self, script, *args):
+        return self.script_result(script, args)
+
+    def save_screenshot(self, path):
+        return True
+
+
+class ReadyWait:
+    def __init__(self, driver, timeout):
+        pass
+
+    def until(self, condition):
+        return True
+
+
+def test_done_actions_are_skipped_and_reconciled(temp_db):
+    entry_id = record_intent("100", ACTION_REPLY, text="ありがとう🩷", user_id="user_a", is_my_thread=True)
+    record_result(entry_id, True, "network:200")
+    record_result(record_intent("101", ACTION_LIKE), False, "timeout")
+
+    assert completed_actions(["100", "101"]) == {("100", ACTION_REPLY)}
+    # 投稿は完了したが replied に記録されなかった返信を反映する（2回目は何もしない）
+    assert reconcile_replied() == 1
+    assert db.is_replied_many(["100"]) == {"100"}
+    assert db.get_reply_text("100") == "ありがとう🩷"
+    assert reconcile_replied() == 0
+
+
+def test_resolve_pending_checks_page_state(temp_db, monkeypatch):
+    monkeypatch.setattr(action_journal, "WebDriverWait", ReadyWait)
+    monkeypatch.setattr(
+        "reply_bot.thread_probe.probe_thread",
+        lambda driver, tweet_id: {"replied_by_target_user": tweet_id == "200"}
+    )
+    monkeypatch.setattr("reply_bot.timeline_like.like_state", lambda driver, tweet_id: "not_liked")
+    record_intent("200", ACTION_REPLY, text="おはよう🩷", user_id="user_a")
+    record_intent("201", ACTION_REPLY, text="こんにちは🩷", user_id="user_b")
+    record_intent("202", ACTION_LIKE)
+
+    driver = FakeDriver()
+    assert resolve_pending(driver) == {"done": 1, "failed": 2}
+    assert len(driver.visited) == 3
+    assert completed_actions(["200", "201", "202"]) == {("200", ACTION_REPLY)}
+    assert db.is_replied_many(["200", "201"]) == {"200"}
+    # 解決済みのアクションは次回の実行で再確認しない
+    assert resolve_pending(FakeDriver()) == {"done": 0, "failed": 0}
+
+
+def test_unreadable_composer_is_not_a_posted_reply(monkeypatch):
+    monkeypatch.setattr(action_confirmation, "save_failure_screenshot", lambda *args, **kwargs: None)
+
+    def script_result(script, args):
+        if script == action_confirmation._COMPOSER_STATE_SCRIPT:
+            raise RuntimeError("stale element reference")
+        return None
+
+    # 返信欄が空になった後の待ち時間（1秒）より長く待っても、投稿済みとはみなさない
+    confirmation = action_confirmation.wait_for_reply_posted(FakeDriver(script_result), "300", timeout=1.5)
+    assert confirmation["confirmed"] is False
+    assert confirmation["source"] == "timeout"
+
+
+def test_unreadable_composer_with_visible_reply_is_posted():
+    def script_result(script, args):
+        if script == action_confirmation._COMPOSER_STATE_SCRIPT:
+            raise RuntimeError("stale element reference")
+        if script == action_confirmation._NEW_REPLY_ID_SCRIPT:
+            return "301"
+        return None
+
+    confirmation = action_confirmation.wait_for_reply_posted(FakeDriver(script_result), "300", timeout=0.3)
+    assert confirmation == {"confirmed": True, "source": "dom", "tweet_id": "301", "error": None}
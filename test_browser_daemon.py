@@ -0,0 +1,81 @@
+"""
+常駐ブラウザのテスト
+実行中のリース（acquire_lease）がある間はメモリ・経過時間による再起動を行わず、
+応答しない場合やリースを持つプロセスが終了している場合は再起動することを確認する
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import browser_daemon
+from reply_bot.browser_daemon import BrowserDaemon, acquire_lease, lease_active, release_lease
+
+
+class FakeProcess:
+    pid = 4242
+
+    def poll(self):
+        return None
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(browser_daemon, "LEASE_FILE", tmp_path / "browser_daemon.lease")
+    monkeypatch.setattr(browser_daemon, "BROWSER_DAEMON_MAX_MEMORY_MB", 1000)
+    monkeypatch.setattr(browser_daemon, "BROWSER_DAEMON_MAX_AGE_HOURS", 12)
+    healthy = {"value": True}
+    monkeypatch.setattr(browser_daemon, "is_healthy", lambda port: healthy["value"])
+    monkeypatch.setattr(browser_daemon, "chrome_memory_mb", lambda pid: 100.0)
+
+    daemon = BrowserDaemon()
+    daemon.process = FakeProcess()
+    daemon.started_at = time.monotonic()
+    daemon.restart_reasons = []
+    daemon.restart = daemon.restart_reasons.append
+    daemon.healthy = healthy
+    yield daemon
+    release_lease()
+
+
+def test_lease_blocks_memory_restart(daemon, monkeypatch):
+    monkeypatch.setattr(browser_daemon, "chrome_memory_mb", lambda pid: 5000.0)
+    acquire_lease()
+    assert lease_active()
+    daemon.check()
+    assert daemon.restart_reasons == []
+
+    release_lease()
+    daemon.check()
+    assert daemon.restart_reasons == ["メモリ使用量 5000 MB"]
+
+
+def test_lease_blocks_age_restart(daemon):
+    daemon.started_at = time.monotonic() - 13 * 3600
+    acquire_lease()
+    daemon.check()
+    assert daemon.restart_reasons == []
+
+    release_lease()
+    daemon.check()
+    assert daemon.restart_reasons[0].startswith("起動から 13.0 時間")
+
+
+def test_stale_lease_does_not_block_restart(daemon, monkeypatch):
+    monkeypatch.setattr(browser_daemon, "_pid_alive", lambda pid: False)
+    daemon.started_at = time.monotonic() - 13 * 3600
+    acquire_lease()
+    assert not lease_active()
+    daemon.check()
+    assert len(daemon.restart_reasons) == 1
+
+
+def test_unresponsive_browser_restarts_despite_lease(daemon):
+    acquire_lease()
+    daemon.healthy["value"] = False
+    daemon.check()
+    assert daemon.restart_reasons == ["応答なし"]
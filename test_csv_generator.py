@@ -0,0 +1,55 @@
+"""
+ステップ1の事前フィルタのテスト
+返信済み（repliedテーブル・行動ジャーナル）のリプライを除外し、返信対象外と判定済みのリプライは
+「いいね」済みなら除外、そうでなければ解析だけ省いて残すことを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import csv_generator, db
+from reply_bot.action_journal import ACTION_LIKE, ACTION_REPLY, record_done
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    db.init_db()
+    yield
+    db.close_connection()
+
+
+def _counts():
+    return {"replied": 0, "journal": 0, "skip_list": 0, "like_only": 0}
+
+
+def test_prefilter_rows(temp_db):
+    db.mark_replied("replied", "user_a", "返信")
+    record_done("journaled", ACTION_REPLY)
+    db.add_skipped_tweet("skipped_liked", "already_replied")
+    record_done("skipped_liked", ACTION_LIKE)
+    db.add_skipped_tweet("skipped", "already_replied")
+    rows = [{"reply_id": reply_id} for reply_id in ("new", "replied", "journaled", "skipped_liked", "skipped")]
+
+    counts = _counts()
+    kept = csv_generator._prefilter_rows(rows, counts)
+
+    assert [(row["reply_id"], row["analyzed"]) for row in kept] == [("new", False), ("skipped", True)]
+    assert counts == {"replied": 1, "journal": 1, "skip_list": 1, "like_only": 1}
+    assert csv_generator._excluded_count(counts) == 3
+
+
+def test_prefilter_keeps_rows_when_disabled_or_db_fails(temp_db, monkeypatch):
+    db.mark_replied("replied", "user_a", "返信")
+    rows = [{"reply_id": "replied"}]
+
+    monkeypatch.setattr(csv_generator, "STAGE1_PREFILTER_ENABLED", False)
+    assert csv_generator._prefilter_rows(rows, _counts()) == rows
+
+    monkeypatch.setattr(csv_generator, "STAGE1_PREFILTER_ENABLED", True)
+    monkeypatch.setattr(csv_generator, "is_replied_many", lambda ids: 1 / 0)
+    assert csv_generator._prefilter_rows(rows, _counts()) == rows
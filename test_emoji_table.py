@@ -0,0 +1,34 @@
+"""
+コードポイント表による絵文字判定のテスト
+ZWJ・肌の色・国旗・キーキャップなどの複合シーケンスを1つの絵文字として扱うことと、
+絵文字のみの判定・除去・末尾の絵文字の取り出しを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot.emoji_table import find_emoji, is_emoji_only, strip_emoji, trailing_emoji
+
+
+@pytest.mark.parametrize("text", ["❤️", "🩷🩷🩷", "👍🏻", "👨‍👩‍👧‍👦", "🇯🇵", "1️⃣", "🏴󠁧󠁢󠁳󠁣󠁴󠁿", "🙏✨ !!", " 🌸 🌸 "])
+def test_emoji_only(text):
+    assert is_emoji_only(text)
+
+
+@pytest.mark.parametrize("text", ["", "   ", None, "おはよう☀️", "かわいい😍", "www", "1", "Good morning 🌞"])
+def test_not_emoji_only(text):
+    assert not is_emoji_only(text)
+
+
+def test_sequences_are_single_emoji():
+    assert find_emoji("家族👨‍👩‍👧‍👦と🇯🇵へ👍🏻") == ["👨‍👩‍👧‍👦", "🇯🇵", "👍🏻"]
+
+
+def test_strip_and_trailing_emoji():
+    assert strip_emoji("ありがとう🩷✨", keep=["🩷"]) == "ありがとう🩷"
+    assert trailing_emoji("おやすみ🌙 ") == "🌙"
+    assert trailing_emoji("🌙おやすみ") is None
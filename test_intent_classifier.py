@@ -0,0 +1,42 @@
+"""
+定型リプライのインテント判定のテスト
+笑い記号（笑・w・草）は、本文の付いたリプライを定型返信にしないことを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot.intent_classifier import classify_intent
+
+
+@pytest.mark.parametrize("text", ["笑", "www", "草", "笑笑"])
+def test_bare_laughter_is_canned(text):
+    assert classify_intent(text, "ja")["intent"] == "laughter"
+
+
+@pytest.mark.parametrize("text", ["素敵な写真ですね笑", "お疲れ様です笑", "それは大変だったねwww", "草生える"])
+def test_content_with_laughter_marker_goes_to_llm(text):
+    assert classify_intent(text, "ja") is None
+
+
+def test_marker_does_not_block_other_intents():
+    result = classify_intent("ありがとう笑", "ja")
+    assert result["intent"] == "thanks"
+    # 笑い記号以外の定型表現は、従来通り短い本文の付いたリプライも定型返信とする
+    assert classify_intent("ありがとうございます！", "ja")["intent"] == "thanks"
+
+
+def test_greeting_matches_anywhere():
+    assert classify_intent("おはよう笑 今日もがんばろう", "ja")["intent"] == "morning"
+
+
+def test_long_greeting_from_nickname_user_goes_to_llm():
+    text = "おはよう！今日は試験だから頑張ってくるね、マヤちゃんも良い一日を"
+    assert classify_intent(text, "ja")["intent"] == "morning"
+    # ニックネーム登録済みのユーザーには、従来通り文中の挨拶だけで定型返信しない
+    assert classify_intent(text, "ja", has_nickname=True) is None
+    assert classify_intent("おはよう！", "ja", has_nickname=True)["intent"] == "morning"
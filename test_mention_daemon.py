@@ -0,0 +1,85 @@
+"""
+常駐モードのサイクルのテスト
+処理に失敗したランが新着のランで上書きされず、再試行の上限に達したランが記録に残ることを確認する
+"""
+
+import itertools
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import db, mention_daemon
+from reply_bot.mention_daemon import MentionDaemon
+
+
+@pytest.fixture
+def daemon_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    monkeypatch.setattr(mention_daemon, "STATE_FILE", tmp_path / "daemon_state.json")
+    monkeypatch.setattr(mention_daemon, "STOP_FILE", tmp_path / "daemon.stop")
+    run_ids = itertools.count(1)
+    monkeypatch.setattr(mention_daemon, "new_run_id", lambda: f"run{next(run_ids)}")
+    db.init_db()
+    env = {"polls": [], "results": [], "processed": [], "posted": []}
+
+    def poll_mentions(driver, known_ids, since):
+        rows = env["polls"].pop(0) if env["polls"] else []
+        known_ids.update(row["reply_id"] for row in rows)
+        return rows, None
+
+    def reply_processor_main(driver, run_id=None):
+        env["processed"].append(run_id)
+        return run_id if env["results"].pop(0) else None
+
+    def post_reply_main(driver, dry_run=True, interval=0, run_id=None):
+        env["posted"].append(run_id)
+
+    monkeypatch.setattr(mention_daemon, "poll_mentions", poll_mentions)
+    monkeypatch.setattr(mention_daemon, "reply_processor_main", reply_processor_main)
+    monkeypatch.setattr(mention_daemon, "post_reply_main", post_reply_main)
+    yield env
+    db.close_connection()
+
+
+def mentions(*reply_ids):
+    return [{"reply_id": reply_id, "UserID": "user_a", "contents": "おはよう"} for reply_id in reply_ids]
+
+
+def test_failed_run_is_retried_before_new_mentions(daemon_env):
+    daemon = MentionDaemon()
+    daemon_env["polls"] = [mentions("1", "2"), mentions("3")]
+
+    # 1回目: 新着のランの処理に失敗し、処理中のランとして残る
+    daemon_env["results"] = [False]
+    assert daemon.run_cycle() == 2
+    assert daemon.state["pending_run_id"] == "run1"
+
+    # 2回目: 再び失敗した場合はポーリングせず、新着でランを上書きしない
+    daemon_env["results"] = [False]
+    assert daemon.run_cycle() == 0
+    assert daemon.state["pending_run_id"] == "run1"
+    assert len(daemon_env["polls"]) == 1
+
+    # 3回目: 処理中のランが完了してから新着をポーリングする
+    daemon_env["results"] = [True, True]
+    assert daemon.run_cycle() == 1
+    assert daemon_env["processed"] == ["run1", "run1", "run1", "run2"]
+    assert daemon_env["posted"] == ["run1", "run2"]
+    assert daemon.state["pending_run_id"] is None
+    assert daemon.state["processed_runs"] == 2
+
+
+def test_run_is_abandoned_after_max_attempts(daemon_env, caplog):
+    daemon = MentionDaemon()
+    daemon_env["polls"] = [mentions("10", "11")]
+    daemon_env["results"] = [False] * mention_daemon._MAX_RUN_ATTEMPTS
+
+    for _ in range(mention_daemon._MAX_RUN_ATTEMPTS):
+        daemon.run_cycle()
+    assert daemon.state["pending_run_id"] is None
+    assert daemon.state["abandoned_runs"] == ["run1"]
+    assert mention_daemon.load_state()["abandoned_runs"] == ["run1"]
+    assert "10, 11" in caplog.text
@@ -0,0 +1,59 @@
+"""
+MinHashによる類似返信の検出のテスト
+表記揺れやニックネームの呼びかけ行の違いを吸収して類似と判定することと、
+投稿済みとして保存した署名を次回の読み込みで使うことを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import db
+from reply_bot.near_duplicate import NearDuplicateIndex, normalize_for_shingles
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    db.init_db()
+    yield
+    db.close_connection()
+
+
+REPLY = "今日も素敵な写真をありがとう！お花がとってもきれいで癒されました🩷"
+
+
+def test_normalize_drops_nickname_line_and_noise():
+    assert normalize_for_shingles(f"あっちゃん\n{REPLY}", nickname="あっちゃん") == normalize_for_shingles(REPLY)
+    assert normalize_for_shingles("すごーーーい！！ @someone https://t.co/x 🩷") == "すごーーい"
+
+
+def test_query_finds_near_duplicates_only():
+    index = NearDuplicateIndex()
+    index.add("1", f"あっちゃん\n{REPLY}", nickname="あっちゃん")
+    assert len(index) == 1
+
+    key, similarity = index.query("今日も素敵な写真ありがとう!! お花がとってもきれいで癒されました✨")
+    assert key == "1" and similarity >= index.threshold
+    assert index.query("週末の旅行、楽しんできてね。気をつけていってらっしゃい") is None
+    assert index.query("ありがとう") is None  # 短すぎる返信は対象外
+
+
+def test_persisted_signatures_are_loaded(temp_db):
+    db.mark_replied("100", "user_a", REPLY)
+    NearDuplicateIndex().add("100", REPLY, persist=True)
+
+    index = NearDuplicateIndex().load()
+    assert len(index) == 1
+    assert index.query(REPLY)[0] == "100"
+
+
+def test_load_computes_missing_signatures(temp_db):
+    db.add_user_preference("user_a", "あっちゃん", "ja", "")
+    db.mark_replied("200", "user_a", f"あっちゃん\n{REPLY}")
+
+    index = NearDuplicateIndex().load()
+    assert index.query(REPLY) == ("200", 1.0)
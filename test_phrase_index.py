@@ -0,0 +1,35 @@
+"""
+返信表現の繰り返し防止インデックスのテスト
+頻出表現と定番表現の禁止、ウィンドウから外れた返信の表現が禁止されなくなることを確認する
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot.phrase_index import PhraseIndex, match_phrases
+
+RECENT_REPLIES = [
+    "今日もお疲れさまでした🩷", "お疲れさまでした、ゆっくりね🩷", "本当にお疲れさまでした🩷", "お疲れさまでした！🩷",
+    "素敵な写真🩷",
+]
+
+
+def test_frequent_and_seed_phrases_are_banned():
+    index = PhraseIndex(window_size=10, persist=False)
+    for body in RECENT_REPLIES:
+        index.add(body)
+    assert index.banned_phrases() == {"お疲れさまでした", "素敵"}
+    assert index.find_banned("今日もお疲れさまでした") == ["お疲れさまでした"]
+    assert match_phrases("素敵な一日を", index.banned_phrases()) == ["素敵"]
+
+
+def test_bans_expire_with_the_window():
+    index = PhraseIndex(window_size=len(RECENT_REPLIES), persist=False)
+    for body in RECENT_REPLIES:
+        index.add(body)
+    for number in range(len(RECENT_REPLIES)):
+        index.add(f"またね{number}")
+    assert index.banned_phrases() == set()
+    assert len(index) == len(RECENT_REPLIES)
@@ -0,0 +1,65 @@
+"""
+返信投稿後の記録のテスト
+投稿を確認できた返信だけが、返信済み・類似チェック・禁止フレーズの履歴に記録されることを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import db, near_duplicate, phrase_index, post_reply
+from reply_bot.near_duplicate import NearDuplicateIndex
+from reply_bot.phrase_index import PhraseIndex
+
+REPLY = "あっちゃん\n今日もお疲れさま、ゆっくり休んでね🩷"
+
+
+class FakeComposer:
+    def send_keys(self, *keys):
+        pass
+
+
+class FakeWait:
+    def until(self, condition):
+        return FakeComposer()
+
+
+@pytest.fixture
+def post_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    db.init_db()
+    db.add_user_preference("user_a", "あっちゃん", "ja", "")
+    monkeypatch.setattr(near_duplicate, "_near_duplicate_index", NearDuplicateIndex().load())
+    monkeypatch.setattr(phrase_index, "_phrase_index", PhraseIndex().load())
+    monkeypatch.setattr("reply_bot.preference_store._store", None)
+    monkeypatch.setattr(post_reply, "insert_text", lambda driver, element, text: True)
+    monkeypatch.setattr(post_reply, "arm_confirmation", lambda driver: None)
+    yield monkeypatch
+    db.close_connection()
+
+
+def post(monkeypatch, confirmation):
+    monkeypatch.setattr(post_reply, "wait_for_reply_posted", lambda driver, tweet_id, composer: confirmation)
+    return post_reply.post_reply_on_current_page(None, "500", REPLY, False, FakeWait(), user_id="user_a")
+
+
+def test_confirmed_post_is_recorded(post_env):
+    assert post(post_env, {"confirmed": True, "source": "network", "tweet_id": "501", "error": None})
+    assert db.is_replied_many(["500"]) == {"500"}
+    assert db.get_recent_reply_history(10) == ["今日もお疲れさま、ゆっくり休んでね🩷"]
+    assert near_duplicate.find_near_duplicate("今日もお疲れさま、ゆっくり休んでね🩷")[0] == "500"
+
+
+def test_unconfirmed_post_is_not_recorded(post_env):
+    assert not post(post_env, {"confirmed": False, "source": "timeout", "tweet_id": None, "error": None})
+    assert db.is_replied_many(["500"]) == set()
+    assert db.get_recent_reply_history(10) == []
+    assert near_duplicate.find_near_duplicate("今日もお疲れさま、ゆっくり休んでね🩷") is None
+
+
+def test_dry_run_is_not_recorded(post_env):
+    assert post_reply.post_reply_on_current_page(None, "500", REPLY, True, FakeWait(), user_id="user_a")
+    assert db.get_recent_reply_history(10) == []
@@ -0,0 +1,87 @@
+"""
+投稿スケジューラのテスト
+「いいね」と返信をまたいだ最小間隔と、優先度順・実行可能なタスクの先取りを確認する
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot.post_scheduler import PostScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_scheduler(reply_interval=7, min_gap=7):
+    clock = FakeClock()
+    return PostScheduler(reply_interval=reply_interval, min_gap=min_gap, clock=clock, sleep=clock.sleep), clock
+
+
+def test_shared_gap_applies_across_action_kinds():
+    scheduler, clock = make_scheduler()
+    assert scheduler.wait_for("like") == 0
+    scheduler.record("like")
+    # 「いいね」の直後の返信も、種類をまたいだ最小間隔だけ待つ
+    assert scheduler.wait_for("reply") == 7
+    scheduler.record("reply")
+    clock.now += 3
+    assert scheduler.wait_for("like") == 4
+
+
+def test_reply_right_after_like_on_same_tweet_skips_shared_gap():
+    scheduler, clock = make_scheduler(reply_interval=30, min_gap=7)
+    scheduler.record("like", "1")
+    # 同じツイートへの「いいね」→返信は一連の操作のため待たない
+    assert scheduler.wait_for("reply", "1") == 0
+    scheduler.record("reply")
+    # 返信のバケットの間隔は引き続き守られる
+    scheduler.record("like", "2")
+    clock.now += 10
+    assert scheduler.wait_for("reply", "2") == 20
+
+
+def test_reply_after_like_on_other_tweet_keeps_shared_gap():
+    scheduler, clock = make_scheduler()
+    scheduler.record("like", "1")
+    assert scheduler.wait_for("reply", "2") == 7
+    scheduler.record("reply")
+    # 返信のあとの「いいね」は同じツイートでも間隔を空ける
+    assert scheduler.wait_for("like") == 7
+
+
+def test_per_kind_interval_still_applies():
+    scheduler, clock = make_scheduler(reply_interval=30, min_gap=7)
+    scheduler.record("reply")
+    clock.now += 10
+    assert scheduler.wait_for("like") == 0
+    assert scheduler.wait_for("reply") == 20
+
+
+def test_pop_order_and_lookahead():
+    scheduler, clock = make_scheduler(reply_interval=30, min_gap=0)
+    scheduler.push({"tweet_id": "like-old"}, needs_like=True, needs_reply=False, posted_at="2026-01-01T00:00:00")
+    scheduler.push({"tweet_id": "like-new"}, needs_like=True, needs_reply=False, posted_at="2026-01-02T00:00:00")
+    scheduler.push({"tweet_id": "reply"}, needs_like=False, needs_reply=True, posted_at="2026-01-01T00:00:00")
+    scheduler.push({"tweet_id": "mine"}, needs_like=False, needs_reply=True, is_my_thread=True,
+                   posted_at="2026-01-01T00:00:00")
+    scheduler.push({"tweet_id": "nothing"}, needs_like=False, needs_reply=False)
+    assert len(scheduler) == 4
+
+    assert scheduler.pop()["tweet_id"] == "mine"
+    scheduler.record("reply")
+    # 返信はまだ間隔待ちのため、すぐに実行できる「いいね」（新しい順）を先に返す
+    assert scheduler.pop()["tweet_id"] == "like-new"
+    clock.now += 30
+    assert scheduler.pop()["tweet_id"] == "reply"
+    assert scheduler.pop()["tweet_id"] == "like-old"
+    assert scheduler.pop() is None
@@ -0,0 +1,50 @@
+"""
+ユーザー設定のメモリ上のインデックスのテスト
+変更履歴の差分更新と、保持期間の処理で変更履歴が圧縮された後の全件読み直しを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import db
+from reply_bot.preference_store import PreferenceStore
+from reply_bot.retention import run_retention
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    db.init_db()
+    yield
+    db.close_connection()
+
+
+def test_refresh_reads_only_changed_users(temp_db):
+    db.add_user_preference("user_a", "あっちゃん", "ja", "")
+    store = PreferenceStore(refresh_seconds=0)
+    store.load()
+    db.add_user_preference("user_b", "びーちゃん", "ja", "")
+    assert store.refresh() == 1
+    assert store.get("user_b")[0] == "びーちゃん"
+    assert store.stats["loads"] == 1
+
+
+def test_retention_compacts_changes_and_store_reloads(temp_db, monkeypatch):
+    monkeypatch.setattr("reply_bot.retention.PREFERENCE_CHANGES_KEEP", 2)
+    store = PreferenceStore(refresh_seconds=0)
+    store.load()
+    for number in range(5):
+        db.add_user_preference(f"user_{number}", f"なまえ{number}", "ja", "")
+
+    result = run_retention(batch_size=2)
+    assert result["deleted_user_preference_changes"] == 3
+    assert db.get_db_stats()["tables"]["user_preference_changes"] == 2
+
+    # 未読の変更履歴が削除されているため、差分ではなく全件を読み直す
+    assert store.refresh() == 5
+    assert store.stats["loads"] == 2
+    assert store.get("user_0")[0] == "なまえ0"
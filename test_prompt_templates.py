@@ -0,0 +1,103 @@
+"""
+コンパイル済みプロンプトテンプレートのテスト
+偽の genai を使い、モデルを1回だけ用意して可変部分だけを送ることと、
+コンテキストキャッシュでの生成に失敗した場合に system_instruction のモデルで再送することを確認する
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import prompt_templates
+from reply_bot.prompt_templates import CompiledPrompt, estimate_tokens
+
+
+class FakeModel:
+    created = []
+
+    def __init__(self, model_name, system_instruction=None, cached_content=None, fail=False):
+        self.system_instruction = system_instruction
+        self.cached_content = cached_content
+        self.fail = fail
+        self.sent = []
+        FakeModel.created.append(self)
+
+    @classmethod
+    def from_cached_content(cls, cached_content):
+        return cls(cached_content.model, cached_content=cached_content, fail=cached_content.expired)
+
+    def generate_content(self, suffix):
+        if self.fail:
+            raise RuntimeError("cache expired")
+        self.sent.append(suffix)
+        return SimpleNamespace(text=f"返信: {suffix}")
+
+    def count_tokens(self, text):
+        return SimpleNamespace(total_tokens=estimate_tokens(text))
+
+
+@pytest.fixture
+def fake_genai(monkeypatch):
+    FakeModel.created = []
+    state = {"expired": False}
+
+    def create_cache(model, display_name, system_instruction, ttl):
+        return SimpleNamespace(model=model, system_instruction=system_instruction, expired=state["expired"])
+
+    genai = SimpleNamespace(GenerativeModel=FakeModel, caching=SimpleNamespace(CachedContent=SimpleNamespace(create=create_cache)))
+    monkeypatch.setattr(prompt_templates, "genai", genai)
+    monkeypatch.setattr(prompt_templates, "_prompt_stats", {"requests": 0, "sent_bytes": 0, "full_bytes": 0})
+    return state
+
+
+def make_prompt():
+    return CompiledPrompt("test", [("persona", "  あなたはマヤです。  "), ("rules", "絵文字を1つ付けてください。")], "fake-model")
+
+
+def test_prefix_is_compiled_once(fake_genai, monkeypatch):
+    monkeypatch.setattr(prompt_templates, "PROMPT_CONTEXT_CACHE_ENABLED", False)
+    prompt = make_prompt()
+    assert prompt.prefix == "あなたはマヤです。\n\n絵文字を1つ付けてください。"
+    assert prompt.render("会話", "", "回避ルール") == "会話\n回避ルール"
+    assert prompt.full_prompt("会話").startswith(prompt.prefix)
+
+    prompt.generate("1件目")
+    prompt.generate("2件目")
+    models = [model for model in FakeModel.created if model.sent]
+    assert len(models) == 1 and models[0].system_instruction == prompt.prefix
+    assert models[0].sent == ["1件目", "2件目"]
+    stats = prompt_templates.get_prompt_stats()
+    assert stats["requests"] == 2 and stats["sent_bytes"] == stats["full_bytes"]
+
+
+def test_cached_prefix_is_not_resent(fake_genai, monkeypatch):
+    monkeypatch.setattr(prompt_templates, "PROMPT_CONTEXT_CACHE_ENABLED", True)
+    monkeypatch.setattr(prompt_templates, "PROMPT_CONTEXT_CACHE_MIN_TOKENS", 1)
+    prompt = make_prompt()
+    prompt.generate("会話")
+    stats = prompt_templates.get_prompt_stats()
+    assert stats["sent_bytes"] == len("会話".encode("utf-8")) < stats["full_bytes"]
+    assert prompt.model().cached_content is not None
+
+
+def test_expired_cache_falls_back_to_system_instruction(fake_genai, monkeypatch):
+    monkeypatch.setattr(prompt_templates, "PROMPT_CONTEXT_CACHE_ENABLED", True)
+    monkeypatch.setattr(prompt_templates, "PROMPT_CONTEXT_CACHE_MIN_TOKENS", 1)
+    fake_genai["expired"] = True
+    prompt = make_prompt()
+    assert prompt.generate("会話").text == "返信: 会話"
+    assert prompt.model().cached_content is None
+    assert prompt.model().system_instruction == prompt.prefix
+
+
+def test_small_prefix_skips_context_cache(fake_genai, monkeypatch):
+    monkeypatch.setattr(prompt_templates, "PROMPT_CONTEXT_CACHE_ENABLED", True)
+    monkeypatch.setattr(prompt_templates, "PROMPT_CONTEXT_CACHE_MIN_TOKENS", 10_000)
+    prompt = make_prompt()
+    prompt.generate("会話")
+    assert prompt.model().cached_content is None
+    assert prompt.token_counts()["total"] == estimate_tokens("あなたはマヤです。") + estimate_tokens("絵文字を1つ付けてください。")
@@ -0,0 +1,80 @@
+"""
+返信キャッシュと過去の返信との類似チェックのテスト
+投稿済みの返信が類似チェックのインデックスに入っても、キャッシュの候補が使われ続けることを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import db, near_duplicate
+from reply_bot.near_duplicate import NearDuplicateIndex, normalize_for_shingles
+from reply_bot.reply_cache import lookup_cached_reply, store_cached_reply
+
+CACHE_KEY = "ja|1|00000000|おはよう"
+VARIANTS = ["今日もお疲れさま。\nゆっくり休んでね🩷", "いつもありがとう。\n素敵な一日になりますように🩷"]
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    db.init_db()
+    yield
+    db.close_connection()
+
+
+def test_cache_hit_survives_near_duplicate_index(temp_db, monkeypatch):
+    for body in VARIANTS:
+        store_cached_reply(CACHE_KEY, body)
+    # 2つの候補をどちらも投稿済み（ニックネーム付きで replied に記録）にして、類似チェックの索引に載せる
+    db.add_user_preference("user_a", "あっちゃん", "ja", "")
+    for number, body in enumerate(VARIANTS):
+        db.mark_replied(f"10{number}", "user_a", f"あっちゃん\n{body}")
+    index = NearDuplicateIndex().load()
+    monkeypatch.setattr(near_duplicate, "_near_duplicate_index", index)
+    assert len(index) == len(VARIANTS)
+    assert index.query(VARIANTS[0])  # 本文は索引に載っている
+
+    assert lookup_cached_reply(CACHE_KEY, set(), []) in VARIANTS
+
+
+def test_normalize_keeps_first_sentence_without_nickname():
+    assert normalize_for_shingles("今日もお疲れさま。\nゆっくり休んでね🩷") == "今日もお疲れさまゆっくり休んでね"
+    # ニックネームの呼びかけ行は、ニックネームが一致する場合だけ除く
+    assert normalize_for_shingles("あっちゃん\nゆっくり休んでね", "あっちゃん") == "ゆっくり休んでね"
+    assert normalize_for_shingles("あっちゃん\nゆっくり休んでね", "みーちゃん") == "あっちゃんゆっくり休んでね"
+
+
+def test_nickname_join_ignores_user_id_case(temp_db):
+    # 設定は元の大文字小文字のまま、返信済みの記録は小文字のIDでも、ニックネームを拾える
+    db.add_user_preference("f9r0MtEVKE60488", "まっくん", "ja", "")
+    db.mark_replied("300", "f9r0mtevke60488", "まっくん\nいつもありがとう")
+    rows = db.get_replies_without_signature("2000-01-01")
+    assert [(tweet_id, nickname) for tweet_id, _, nickname in rows] == [("300", "まっくん")]
+
+
+def test_remember_reply_indexes_posted_reply(temp_db, monkeypatch):
+    index = NearDuplicateIndex().load()
+    monkeypatch.setattr(near_duplicate, "_near_duplicate_index", index)
+    assert not index.query(VARIANTS[0])
+
+    db.mark_replied("400", "user_a", f"あっちゃん\n{VARIANTS[0]}")
+    near_duplicate.remember_reply("400", f"あっちゃん\n{VARIANTS[0]}", nickname="あっちゃん")
+    assert index.query(VARIANTS[0])[0] == "400"
+    # 署名はDBにも保存され、次回の読み込みで計算し直さない
+    assert db.get_replies_without_signature("2000-01-01") == []
+
+
+def test_cache_skips_bodies_in_recent_history(temp_db):
+    for body in VARIANTS + ["また明日ね。\n待ってるね🩷"]:
+        store_cached_reply(CACHE_KEY, body)
+    # 履歴には最終行だけのものも、ニックネーム付きの全文のものもある
+    history = [VARIANTS[0].split('\n')[-1], f"あっちゃん\n{VARIANTS[1]}"]
+    for _ in range(20):
+        assert lookup_cached_reply(CACHE_KEY, set(), history) is None
+    history = [VARIANTS[0].split('\n')[-1]]
+    for _ in range(20):
+        assert lookup_cached_reply(CACHE_KEY, set(), history) != VARIANTS[0]
@@ -0,0 +1,65 @@
+"""
+ステップ2の行ごとの処理のテスト
+未解析の行だけを収集順に処理して1行ずつ書き戻し、途中で中断しても再実行で続きから処理することを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import db, reply_processor
+from reply_bot.run_store import RowSink, add_rows, get_summary, iter_rows, start_run
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    db.init_db()
+    yield
+    db.close_connection()
+
+
+@pytest.fixture
+def fake_stage2(monkeypatch):
+    processed = []
+    failing = set()
+
+    def fake_process_row(driver, row, history, thread_data=None):
+        if row["reply_id"] in failing:
+            raise RuntimeError("browser crashed")
+        processed.append(row["reply_id"])
+        return {"analyzed": True, "generated_reply": f"返信 {row['reply_id']}"}
+
+    monkeypatch.setattr(reply_processor, "THREAD_TAB_POOL_SIZE", 1)
+    monkeypatch.setattr(reply_processor, "apply_policy", lambda driver, stage: None)
+    monkeypatch.setattr(reply_processor, "process_row", fake_process_row)
+    monkeypatch.setattr(reply_processor, "RowSink", lambda run_id: RowSink(run_id, export=False))
+    return processed, failing
+
+
+def test_stage2_writes_back_each_row_and_resumes(temp_db, fake_stage2):
+    processed, failing = fake_stage2
+    run_id = start_run("20260101_000000")
+    add_rows(run_id, [{"reply_id": str(number), "UserID": "user_a"} for number in range(4)]
+             + [{"reply_id": "like-only", "UserID": "user_b", "analyzed": True}])
+
+    failing.add("2")
+    assert reply_processor.main_process(driver=object(), run_id=run_id) is None
+    assert processed == ["0", "1"]
+    assert [row["reply_id"] for row in iter_rows(run_id, analyzed=False)] == ["2", "3"]
+
+    failing.clear()
+    assert reply_processor.main_process(driver=object(), run_id=run_id) == run_id
+    assert processed == ["0", "1", "2", "3"]
+    assert get_summary(run_id)["with_reply"] == 4
+
+
+def test_stage2_limit(temp_db, fake_stage2):
+    processed, _ = fake_stage2
+    run_id = start_run("20260101_000000")
+    add_rows(run_id, [{"reply_id": str(number), "UserID": "user_a"} for number in range(4)])
+    assert reply_processor.main_process(driver=object(), run_id=run_id, limit=3) == run_id
+    assert processed == ["0", "1", "2"]
@@ -0,0 +1,73 @@
+"""
+ステージごとのリソースのブロックのテスト
+ステージごとのパターンと、同じタブへの同じ設定の再送を省くこと、DevToolsが使えない場合に続行することを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import resource_policy
+from reply_bot.config import RESOURCE_BLOCK_PATTERNS
+from reply_bot.resource_policy import apply_policy, patterns_for
+
+
+class FakeDriver:
+    session_id = "session"
+
+    def __init__(self, fail=False):
+        self.current_window_handle = "tab-1"
+        self.commands = []
+        self.fail = fail
+
+    def execute_cdp_cmd(self, command, params):
+        if self.fail:
+            raise RuntimeError("CDP is not available")
+        self.commands.append((command, params))
+
+
+@pytest.fixture(autouse=True)
+def clear_applied(monkeypatch):
+    monkeypatch.setattr(resource_policy, "_applied", {})
+
+
+@pytest.mark.parametrize("stage, blocked, loaded", [
+    ("collect", ["media", "video", "font", "analytics"], []),
+    ("analyze", ["media", "video", "font", "analytics"], []),
+    ("post", ["video", "analytics"], ["media", "font"]),
+])
+def test_patterns_for_each_stage(stage, blocked, loaded):
+    patterns = patterns_for(stage)
+    for category in blocked:
+        assert set(RESOURCE_BLOCK_PATTERNS[category]) <= set(patterns)
+    for category in loaded:
+        assert not set(RESOURCE_BLOCK_PATTERNS[category]) & set(patterns)
+
+
+def test_unknown_stage_and_disabled_block_nothing(monkeypatch):
+    assert patterns_for("unknown") == []
+    monkeypatch.setattr(resource_policy, "RESOURCE_BLOCK_ENABLED", False)
+    assert patterns_for("collect") == []
+
+
+def test_apply_policy_skips_unchanged_settings_per_tab():
+    driver = FakeDriver()
+    assert apply_policy(driver, "collect")
+    assert apply_policy(driver, "analyze")  # パターンが同じため再送しない
+    assert [command for command, _ in driver.commands] == ["Network.enable", "Network.setBlockedURLs"]
+
+    assert apply_policy(driver, "post")
+    driver.current_window_handle = "tab-2"
+    assert apply_policy(driver, "post")
+    assert apply_policy(driver, None)
+    assert [command for command, _ in driver.commands[2:]] == [
+        "Network.setBlockedURLs", "Network.enable", "Network.setBlockedURLs", "Network.setBlockedURLs"
+    ]
+    assert driver.commands[-1][1] == {"urls": []}
+
+
+def test_apply_policy_continues_without_cdp():
+    assert not apply_policy(FakeDriver(fail=True), "collect")
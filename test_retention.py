@@ -0,0 +1,100 @@
+"""
+DBの保持期間の処理と圧縮のテスト
+古い返信済みツイートのアーカイブと期限切れの行の削除（未解決の行動ジャーナルは残す）、
+定期処理ではVACUUMを行わず、auto_vacuum の切り替えは明示的な呼び出しでだけ行うことと、
+ベンチマークが DB_PATH を書き換えないことを確認する
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import db
+from reply_bot.config import JOURNAL_RETENTION_DAYS, REPLIED_RETENTION_DAYS
+from reply_bot.retention import run_retention
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    db.init_db()
+    yield
+    db.close_connection()
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """auto_vacuum=NONE のまま作られた既存のDB"""
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE filler (data TEXT)")
+    conn.close()
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.init_db()
+    yield
+    db.close_connection()
+
+
+def _age(table: str, column: str, days: int):
+    with db.get_connection() as conn:
+        conn.execute(f"UPDATE {table} SET {column} = ?", ((datetime.now() - timedelta(days=days)).isoformat(),))
+
+
+def test_retention_archives_old_replies_and_keeps_open_intents(temp_db):
+    db.mark_replied("old", "user_a", "古い返信")
+    _age("replied", "timestamp", REPLIED_RETENTION_DAYS + 1)
+    db.mark_replied("new", "user_b", "新しい返信")
+    with db.get_connection() as conn:
+        conn.executemany("INSERT INTO reply_minhash (tweet_id, signature) VALUES (?, ?)", [("old", b""), ("gone", b"")])
+        conn.executemany(
+            "INSERT INTO action_journal (tweet_id, action, status) VALUES (?, ?, ?)",
+            [("1", "reply", "intent"), ("2", "reply", "done")]
+        )
+    _age("action_journal", "updated_at", JOURNAL_RETENTION_DAYS + 1)
+
+    result = run_retention(batch_size=1)
+    assert (result["archived_replied"], result["deleted_action_journal"], result["deleted_signatures"]) == (1, 1, 1)
+    assert not db.is_replied("old") and db.is_replied("new")
+    tables = db.get_db_stats()["tables"]
+    assert (tables["replied_archive"], tables["reply_minhash"], tables["action_journal"]) == (1, 1, 1)
+
+
+def _auto_vacuum() -> int:
+    return db.get_connection().execute("PRAGMA auto_vacuum").fetchone()[0]
+
+
+def test_new_db_starts_incremental(temp_db):
+    assert _auto_vacuum() == 2
+    assert not db.enable_incremental_vacuum()
+
+
+def test_scheduled_retention_never_runs_full_vacuum(legacy_db):
+    statements = []
+    db.get_connection().set_trace_callback(statements.append)
+    result = run_retention()
+    assert result["vacuumed_pages"] == 0
+    assert _auto_vacuum() == 0
+    assert not any(statement.strip().upper() == "VACUUM" for statement in statements)
+
+
+def test_explicit_switch_enables_incremental_vacuum(legacy_db):
+    assert db.enable_incremental_vacuum()
+    assert _auto_vacuum() == 2
+    with db.get_connection() as conn:
+        conn.executemany("INSERT INTO filler VALUES (?)", [("x" * 2000,) for _ in range(200)])
+    with db.get_connection() as conn:
+        conn.execute("DELETE FROM filler")
+    assert db.incremental_vacuum(1000) > 0
+
+
+def test_benchmark_keeps_db_path(temp_db):
+    original = db.DB_PATH
+    db.mark_replied("1", "user", "返信", False)
+    db.benchmark(rows=20)
+    assert db.DB_PATH == original
+    assert db.is_replied("1")
@@ -0,0 +1,72 @@
+"""
+ランストアのテスト
+CSVから読み込んだ文字列・NaN・空欄が列の型に揃うこと、条件付きの読み出しと
+processed_replies のCSVの取り込みを確認する
+"""
+
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import db
+from reply_bot.run_store import add_rows, import_csv, iter_rows, start_run, update_row
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    db.init_db()
+    yield
+    db.close_connection()
+
+
+def test_rows_are_typed(temp_db):
+    run_id = start_run("20260101_000000")
+    add_rows(run_id, [
+        {"reply_id": "1", "UserID": "user_a", "contents": "おはよう", "reply_num": "3.0", "like_num": float("nan"),
+         "is_my_thread": "True", "liked": "False"},
+        {"reply_id": 2, "UserID": "user_b", "contents": None, "reply_num": "", "like_num": 5,
+         "is_my_thread": 0, "liked": "1"},
+    ])
+    first, second = iter_rows(run_id)
+    assert (first["reply_id"], first["reply_num"], first["like_num"]) == ("1", 3, 0)
+    assert (first["is_my_thread"], first["liked"], first["analyzed"]) == (True, False, False)
+    assert (second["reply_id"], second["contents"], second["reply_num"], second["like_num"]) == ("2", "", 0, 5)
+    assert (second["is_my_thread"], second["liked"]) == (False, True)
+
+
+def test_conditions_and_updates_use_column_types(temp_db):
+    run_id = start_run("20260101_000000")
+    add_rows(run_id, [{"reply_id": str(number), "UserID": "user_a"} for number in range(5)])
+    update_row(run_id, 1, analyzed="true", generated_reply="ありがとう🩷")
+    update_row(run_id, "3", analyzed=True, selfcheck_failed="True")
+
+    assert [row["reply_id"] for row in iter_rows(run_id, analyzed=False)] == ["0", "2", "4"]
+    assert [row["reply_id"] for row in iter_rows(run_id, analyzed="True", selfcheck_failed=False)] == ["1"]
+    assert [row["reply_id"] for row in iter_rows(run_id, limit=2)] == ["0", "1"]
+
+
+def test_missing_columns_get_defaults_in_mixed_batches(temp_db):
+    run_id = start_run("20260101_000000")
+    add_rows(run_id, [{"reply_id": "1", "UserID": "user_a"}, {"reply_id": "2", "UserID": "user_b", "analyzed": True}])
+    assert [row["reply_id"] for row in iter_rows(run_id, analyzed=False)] == ["1"]
+    assert [row["reply_id"] for row in iter_rows(run_id, liked=False)] == ["1", "2"]
+
+
+def test_import_processed_csv(temp_db, tmp_path):
+    path = tmp_path / "processed_replies_20260101_000000.csv"
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=["UserID", "reply_id", "reply_num", "is_my_thread", "liked", "generated_reply"])
+        writer.writeheader()
+        writer.writerow({"UserID": "user_a", "reply_id": "100.0", "reply_num": "2", "is_my_thread": "True",
+                         "liked": "", "generated_reply": "おはよう🩷"})
+
+    run_id = import_csv(str(path))
+    assert run_id == "20260101_000000"
+    (row,) = iter_rows(run_id)
+    assert (row["reply_id"], row["reply_num"], row["is_my_thread"]) == ("100", 2, True)
+    assert (row["analyzed"], row["liked"], row["generated_reply"]) == (True, False, "おはよう🩷")
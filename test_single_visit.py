@@ -0,0 +1,50 @@
+"""
+1回訪問モードの投稿直前の再確認のテスト
+返信数は同じプローブで読んだもの同士を比べることを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import single_visit
+
+
+class FakeDriver:
+    def execute_script(self, script, *args):
+        return True
+
+
+@pytest.fixture
+def probe_after(monkeypatch):
+    monkeypatch.setattr(single_visit.time, "sleep", lambda seconds: None)
+
+    def set_probe(probe):
+        monkeypatch.setattr(single_visit, "probe_thread", lambda driver, tweet_id: probe)
+    return set_probe
+
+
+def probe(reply_count):
+    return {"target_index": 0, "following_count": 0, "target_reply_count": reply_count}
+
+
+@pytest.mark.parametrize("before, after, changed", [
+    (0, 0, False),
+    (1234, 1234, False),   # 「1,234」のような表記も同じスクリプトで読むため一致する
+    (1234, 1235, True),
+    (None, 5, False),      # 解析時に読めなかった場合は後続ツイートの有無だけで判定する
+])
+def test_reply_count_is_compared_with_the_analysis_probe(probe_after, before, after, changed):
+    probe_after(probe(after))
+    analysed = probe(before) if before is not None else None
+    assert single_visit._thread_changed_since_analysis(FakeDriver(), "1", analysed) is changed
+
+
+def test_missing_target_counts_as_changed(probe_after):
+    probe_after({"target_index": -1, "following_count": 0, "target_reply_count": None})
+    assert single_visit._thread_changed_since_analysis(FakeDriver(), "1", probe(0))
+    probe_after(None)
+    assert single_visit._thread_changed_since_analysis(FakeDriver(), "1", probe(0))
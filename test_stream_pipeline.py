@@ -0,0 +1,63 @@
+"""
+ステップ1と2の並行処理のテスト
+収集が終わったあと、解析スレッドがキューに残った行を新しい順に処理し、
+キューから溢れた行もランから読み直して全て処理することを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import db, stream_pipeline
+from reply_bot.run_store import RowSink, add_rows, iter_rows, start_run
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    db.init_db()
+    yield
+    db.close_connection()
+
+
+@pytest.fixture
+def fake_analysis(monkeypatch):
+    processed = []
+
+    def fake_process_row(driver, row, history):
+        processed.append(row["reply_id"])
+        return {"analyzed": True, "generated_reply": f"返信 {row['reply_id']}"}
+
+    monkeypatch.setattr(stream_pipeline, "apply_policy", lambda driver, stage: None)
+    monkeypatch.setattr(stream_pipeline, "process_row", fake_process_row)
+    monkeypatch.setattr(stream_pipeline, "RowSink", lambda run_id: RowSink(run_id, export=False))
+    return processed
+
+
+def test_worker_drains_queue_and_overflow_after_collection(temp_db, fake_analysis):
+    run_id = start_run("20260101_000000")
+    rows = [
+        {"reply_id": str(number), "UserID": f"user_{number}", "date_time": f"2026-01-01T00:0{number}:00"}
+        for number in range(5)
+    ]
+    rows.append({"reply_id": "like-only", "UserID": "user_x", "analyzed": True})
+    add_rows(run_id, rows)
+
+    worker = stream_pipeline.AnalysisWorker(driver=object(), run_id=run_id, queue_size=2)
+    worker.offer(rows)
+    assert (worker.stats["queued"], worker.stats["overflow"]) == (2, 3)
+
+    worker.collection_done.set()
+    worker.start()
+    worker.join(timeout=10)
+
+    assert not worker.is_alive() and worker.error is None
+    # キューの行は新しい順、溢れた行は収集順
+    assert fake_analysis == ["1", "0", "2", "3", "4"]
+    assert (worker.stats["streamed"], worker.stats["caught_up"]) == (2, 3)
+    assert worker.stats["first_reply_seconds"] is not None
+    assert list(iter_rows(run_id, analyzed=False)) == []
+    assert {row["reply_id"]: row["generated_reply"] for row in iter_rows(run_id)}["4"] == "返信 4"
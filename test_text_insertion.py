@@ -0,0 +1,73 @@
+"""
+返信欄へのテキスト入力のテスト
+偽のドライバーと返信欄で、Input.insertText による複数行の入力と内容の確認、
+入力に失敗した場合に返信欄を空に戻すことを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import text_insertion
+from reply_bot.text_insertion import insert_text
+
+
+class FakeComposer:
+    def __init__(self):
+        self.text = ""
+
+    def send_keys(self, *keys):
+        if text_insertion.Keys.BACKSPACE in keys:
+            self.text = ""
+
+
+class FakeDriver:
+    def __init__(self, composer, drop_text=False, fail_cdp=False):
+        self.composer = composer
+        self.drop_text = drop_text
+        self.fail_cdp = fail_cdp
+        self.commands = []
+
+    def execute_script(self, script, element):
+        if "innerText" in script:
+            return element.text
+        return True  # フォーカスとクリック
+
+    def execute_cdp_cmd(self, command, params):
+        if self.fail_cdp:
+            raise RuntimeError("CDP is not available")
+        self.commands.append(command)
+        if command == "Input.insertText" and not self.drop_text:
+            self.composer.text += params["text"]
+        elif command == "Input.dispatchKeyEvent" and params["type"] == "keyDown":
+            self.composer.text += "\n"
+
+
+@pytest.fixture(autouse=True)
+def short_timeouts(monkeypatch):
+    monkeypatch.setattr(text_insertion, "TEXT_INSERTION_TIMEOUT_SECONDS", 0.05)
+    monkeypatch.setattr(text_insertion, "TEXT_INSERTION_FALLBACK_TO_CLIPBOARD", False)
+    monkeypatch.setattr(text_insertion, "_POLL_SECONDS", 0.01)
+
+
+def test_cdp_inserts_lines_and_confirms_content():
+    composer = FakeComposer()
+    driver = FakeDriver(composer)
+    assert insert_text(driver, composer, "あっちゃん\n\nありがとう🩷", backend="cdp")
+    assert composer.text == "あっちゃん\n\nありがとう🩷"
+    assert driver.commands.count("Input.insertText") == 2
+
+
+def test_mismatched_content_is_cleared():
+    composer = FakeComposer()
+    composer.text = "前の下書き"
+    assert not insert_text(FakeDriver(composer, drop_text=True), composer, "ありがとう🩷", backend="cdp")
+    assert composer.text == ""
+
+
+def test_cdp_failure_without_fallback_returns_false():
+    composer = FakeComposer()
+    assert not insert_text(FakeDriver(composer, fail_cdp=True), composer, "ありがとう", backend="cdp")
@@ -0,0 +1,36 @@
+"""
+スレッドのプローブのテスト
+後続ツイートの投稿者の判定が大文字小文字を区別しないことと、スクリプトの文字列がエスケープ警告を出さないことを確認する
+"""
+
+import os
+import sys
+import warnings
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import thread_probe
+from reply_bot.config import TARGET_USER
+
+
+class FakeDriver:
+    def __init__(self, result):
+        self.result = result
+
+    def execute_script(self, script, *args):
+        return dict(self.result)
+
+
+def test_target_user_match_ignores_case():
+    result = {"target_index": 0, "following_count": 2, "following_authors": [None, TARGET_USER.upper()]}
+    assert thread_probe.probe_thread(FakeDriver(result), "1")["replied_by_target_user"]
+    result["following_authors"] = [None, "someone_else"]
+    assert not thread_probe.probe_thread(FakeDriver(result), "1")["replied_by_target_user"]
+
+
+def test_module_compiles_without_escape_warnings():
+    with open(thread_probe.__file__, encoding="utf-8") as f:
+        source = f.read()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        compile(source, thread_probe.__file__, "exec")
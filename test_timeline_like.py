@@ -0,0 +1,77 @@
+"""
+タイムライン上での「いいね」のテスト
+偽のドライバーで、表示中の記事だけに「いいね」し、「いいね」済み・見つからない記事では
+待機しないことと、押した「いいね」を行動ジャーナルに記録することを確認する
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot import db, timeline_like
+from reply_bot.action_journal import ACTION_LIKE, completed_actions
+from reply_bot.post_scheduler import PostScheduler
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "replies.db")
+    db.init_db()
+    yield
+    db.close_connection()
+
+
+class FakeTimeline:
+    """tweet_id -> 'liked' / 'not_liked' / 'no_button' の記事が表示されているタイムライン"""
+
+    def __init__(self, articles):
+        self.articles = dict(articles)
+        self.clicked = []
+
+    def execute_script(self, script, *args):
+        if script != timeline_like._LIKE_SCRIPT:
+            return []  # 完了確認のフックとネットワークの記録
+        tweet_id, click = args
+        state = self.articles.get(tweet_id, "not_found")
+        if click and state == "not_liked":
+            self.clicked.append(tweet_id)
+            self.articles[tweet_id] = "liked"
+            return "clicked"
+        return state
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.waits = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.waits.append(seconds)
+        self.now += seconds
+
+
+def test_like_visible_replies(temp_db):
+    driver = FakeTimeline({"1": "not_liked", "2": "liked", "3": "not_liked", "4": "no_button"})
+    clock = FakeClock()
+    scheduler = PostScheduler(min_gap=5, clock=clock, sleep=clock.sleep)
+
+    results = timeline_like.like_visible_replies(driver, ["1", "2", "3", "4", "5"], scheduler, dry_run=False)
+
+    assert results == {"1": True, "2": True, "3": True, "4": False, "5": False}
+    assert driver.clicked == ["1", "3"]
+    # 実際に押した2件の間だけ待つ
+    assert scheduler.stats["like"] == 2 and len(clock.waits) == 1
+    assert completed_actions(["1", "2", "3"]) == {("1", ACTION_LIKE), ("3", ACTION_LIKE)}
+
+
+def test_dry_run_does_not_click(temp_db):
+    driver = FakeTimeline({"1": "not_liked"})
+    results = timeline_like.like_visible_replies(driver, ["1"], PostScheduler(), dry_run=True)
+    assert results == {"1": False} and driver.clicked == []
+    assert completed_actions(["1"]) == set()
@@ -0,0 +1,64 @@
+"""
+ブラウザのワーカープールのテスト
+実際のプロセスの代わりに偽のプロセスとキューを使い、異常終了したワーカーの仕事が
+(item, None) として返り、残りの仕事が生きているワーカーに割り当てられることを確認する
+"""
+
+import os
+import queue
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from reply_bot.worker_pool import WorkerPool
+
+
+class FakeProcess:
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.exitcode = None if alive else -9
+
+    def is_alive(self):
+        return self.alive
+
+
+class AnsweringJobs:
+    """割り当てられた tweet_id にすぐ結果を返す、生きているワーカーのジョブキュー"""
+
+    def __init__(self, worker_no, results):
+        self.worker_no = worker_no
+        self.results = results
+
+    def put(self, tweet_id):
+        if tweet_id is not None:
+            self.results.put(("result", self.worker_no, tweet_id, {"tweet_id": tweet_id}))
+
+
+def make_pool(dead_workers=()):
+    pool = WorkerPool(workers=2)
+    pool.results = queue.Queue()
+    pool.jobs = [queue.Queue() if n in dead_workers else AnsweringJobs(n, pool.results) for n in range(2)]
+    pool.processes = [FakeProcess(alive=n not in dead_workers) for n in range(2)]
+    pool.alive = {0, 1}
+    return pool
+
+
+def test_dead_worker_jobs_come_back_as_none():
+    pool = make_pool(dead_workers={1})
+    results = dict(pool.imap(["a", "b", "c", "d", "e"]))
+
+    assert set(results) == {"a", "b", "c", "d", "e"}
+    # 終了したワーカーに先に割り当てた仕事だけが失われ、残りは生きているワーカーが処理する
+    assert sorted(item for item, thread_data in results.items() if thread_data is None) == ["b", "d"]
+    assert all(results[item] == {"tweet_id": item} for item in ("a", "c", "e"))
+    assert pool.stats["lost"] == 2
+    assert pool.alive == {0}
+
+
+def test_all_workers_dead_returns_everything_in_flight():
+    pool = make_pool(dead_workers={0, 1})
+    results = list(pool.imap(["a", "b", "c"]))
+
+    assert sorted(item for item, _ in results) == ["a", "b", "c"]
+    assert all(thread_data is None for _, thread_data in results)
+    assert pool.alive == set()